@@ -0,0 +1,5 @@
+import sys
+
+from scaflow.cli import main
+
+sys.exit(main())
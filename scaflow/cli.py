@@ -0,0 +1,229 @@
+"""Command line interface for running graphs without the editor
+
+Nothing here may import Qt, so graphs can be run on headless machines::
+
+    python -m scaflow run graph.json --set 3.file_control.filename=traces.npy
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+import pickle
+import sys
+from typing import Any, List, Optional
+
+from estraces import TraceHeaderSet
+import numpy as np
+from rich.console import Console
+
+from scaflow import engine, model
+from scaflow.graph_nodes import controls, nodes  # Registers node classes
+from scaflow.model import dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def load_graph(filename) -> model.Graph:
+    with open(filename, "r") as file:
+        graph = json.load(file, object_hook=dispatcher.decoder_hook)
+    if not isinstance(graph, model.Graph):
+        raise ValueError(f"'{filename}' does not contain a scaflow graph")
+    return graph
+
+
+def find_node(graph: model.Graph, name: str) -> model.Node:
+    """Looks up a node by ID, or by display name if it is unique"""
+    if name.isdigit() and int(name) in graph:
+        return graph[int(name)]
+    matches = [graph[n] for n in graph if graph[n].display_name == name]
+    if len(matches) != 1:
+        raise KeyError(f"No unique node with ID or name '{name}'")
+    return matches[0]
+
+
+def apply_override(graph: model.Graph, override: str):
+    """Sets control data from a ``NODE.CONTROL.KEY=VALUE`` string.
+
+    ``VALUE`` is parsed as JSON, falling back to a plain string.
+    """
+    target, _, value = override.partition("=")
+    try:
+        node_name, control_key, data_key = target.rsplit(".", 2)
+    except ValueError:
+        raise ValueError(f"Override '{override}' is not NODE.CONTROL.KEY=VALUE")
+    node = find_node(graph, node_name)
+    if control_key not in node.controls:
+        raise KeyError(f"Node '{node_name}' has no control '{control_key}'")
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = value
+    logger.info("Setting %s.%s of %s to %r", control_key, data_key, node, parsed)
+    node.controls[control_key].update_data(data_key, parsed)
+
+
+def parse_target(graph: model.Graph, target: str) -> engine.Target:
+    """Resolves a ``NODE`` or ``NODE:OUTPUT`` string to an engine target"""
+    node_name, _, socket_key = target.partition(":")
+    node = find_node(graph, node_name)
+    if not socket_key:
+        return node.id
+    if socket_key not in node.outputs:
+        raise KeyError(f"Node '{node_name}' has no output '{socket_key}'")
+    return node.id, socket_key
+
+
+def write_output(
+    directory: Path, node: model.Node, value: Any, socket_key: Optional[str] = None
+) -> Optional[Path]:
+    """Saves a node output, choosing a file format from its type.
+
+    Returns: Path written to, or None if the output was empty
+    """
+    stem = directory / f"node_{node.id}"
+    if socket_key is not None:
+        stem = directory / f"node_{node.id}_{socket_key}"
+    if value is None or (isinstance(value, dict) and not value):
+        return None
+    if isinstance(value, np.ndarray):
+        path = stem.with_suffix(".npy")
+        np.save(path, value)
+    elif isinstance(value, TraceHeaderSet):
+        path = stem.with_suffix(".npz")
+        metadatas = {k: np.asarray(value.metadatas[k]) for k in value.metadatas.keys()}
+        np.savez(path, samples=value.samples[:], **metadatas)
+    elif isinstance(value, dict) and all(
+        isinstance(v, np.ndarray) for v in value.values()
+    ):
+        path = stem.with_suffix(".npz")
+        np.savez(path, **value)
+    else:
+        try:
+            data = json.dumps(value)
+            path = stem.with_suffix(".json")
+            path.write_text(data)
+        except TypeError:
+            path = stem.with_suffix(".pickle")
+            with open(path, "wb") as file:
+                pickle.dump(value, file)
+    logger.info("Wrote output of %s to '%s'", node, path)
+    return path
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="scaflow")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Execute a graph without the editor")
+    run.add_argument("graph", help="Graph JSON file saved by the editor")
+    run.add_argument(
+        "-s",
+        "--set",
+        action="append",
+        default=[],
+        metavar="NODE.CONTROL.KEY=VALUE",
+        help="Override control data, NODE is a node ID or unique name",
+    )
+    run.add_argument(
+        "-t",
+        "--target",
+        action="append",
+        metavar="NODE[:OUTPUT]",
+        help="Only compute and write these nodes, and the nodes they depend on",
+    )
+    run.add_argument("-o", "--output-dir", help="Directory to write outputs to")
+    run.add_argument(
+        "--all-outputs",
+        action="store_true",
+        help="Write the outputs of every node, not only unconnected ones",
+    )
+    run.add_argument("-j", "--workers", type=int, help="Run nodes on a thread pool")
+    run.add_argument(
+        "--process-workers",
+        type=int,
+        help="Run process-safe nodes on a pool of this many processes",
+    )
+    run.add_argument("--batch-size", type=int, help="Stream traces in batches")
+    run.add_argument("--cache", help="Directory of the persistent result cache")
+    run.add_argument("--cache-size", type=int, help="Cache size limit in bytes")
+    run.add_argument(
+        "--profile",
+        metavar="TRACE_JSON",
+        help="Write a Chrome trace of node timings and print a summary",
+    )
+    run.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also measure peak memory of nodes (Python 3.9+), which is slow",
+    )
+    return parser
+
+
+def run(args) -> int:
+    graph = load_graph(args.graph)
+    for override in args.set:
+        apply_override(graph, override)
+
+    cache = None
+    if args.cache:
+        cache = engine.ResultCache(args.cache)
+        if args.cache_size is not None:
+            cache.max_size = args.cache_size
+
+    profiler = None
+    if args.profile:
+        profiler = engine.Profiler(trace_memory=args.profile_memory)
+
+    targets = None
+    if args.target:
+        targets = [parse_target(graph, target) for target in args.target]
+
+    runner = engine.Engine(
+        graph,
+        parallel=args.workers is not None,
+        max_workers=args.workers,
+        process_workers=args.process_workers,
+        cache=cache,
+        batch_size=args.batch_size,
+        profiler=profiler,
+        release_outputs=not args.all_outputs,
+    )
+    try:
+        outputs = runner(targets)
+    finally:
+        runner.close()
+
+    if profiler is not None:
+        profiler.export_chrome_trace(args.profile)
+        Console(stderr=True).print(profiler.summary())
+
+    if args.output_dir:
+        directory = Path(args.output_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        if targets is not None:
+            for target, value in outputs.items():
+                if isinstance(target, tuple):
+                    write_output(directory, graph[target[0]], value, target[1])
+                else:
+                    write_output(directory, graph[target], value)
+            return 0
+        for node_id, value in outputs.items():
+            node = graph[node_id]
+            is_sink = not any(o.connections for o in node.outputs.values())
+            if args.all_outputs or is_sink:
+                write_output(directory, node, value)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=[logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)],
+        format="%(name)s: %(message)s",
+    )
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from .scaflow_ui import ScaflowUI
 from .about_ui import AboutUI
+from .execution_thread import ExecutionThread
 
 from .graphics_view import GraphicsView
 from .graphics_scene import GraphicsScene
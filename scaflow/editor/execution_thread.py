@@ -0,0 +1,68 @@
+import functools
+import logging
+
+from PySide6 import QtCore
+
+from scaflow import engine
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionThread(QtCore.QThread):
+    """Runs an engine off the GUI thread, reporting progress through signals.
+
+    Engine events are called from the executing thread, and Qt queues the
+    signals emitted from them to the receivers living on the GUI thread. So
+    are the ``progressEvent`` of nodes that have one, reported by
+    ``nodeProgress`` with the node ID, the traces processed and the total.
+    """
+
+    nodeStarted = QtCore.Signal(int)
+    nodeFinished = QtCore.Signal(int)
+    batchFinished = QtCore.Signal(int)
+    executionFinished = QtCore.Signal(object)
+    executionFailed = QtCore.Signal(str)
+    executionCancelled = QtCore.Signal()
+    nodeProgress = QtCore.Signal(int, int, object)
+
+    def __init__(self, graph_engine: engine.Engine, parent=None):
+        super().__init__(parent)
+        self._engine = graph_engine
+        graph_engine.nodeStartedEvent.add(self.nodeStarted.emit)
+        graph_engine.nodeFinishedEvent.add(self.nodeFinished.emit)
+        graph_engine.batchEvent.add(self.batchFinished.emit)
+        #: Callbacks added to the ``progressEvent`` of nodes, by node
+        self._progress = {}
+
+    def start(self, *args):
+        # Subscribed from the GUI thread, which owns the graph
+        for node_id in self._engine.graph:
+            node = self._engine.graph[node_id]
+            if hasattr(node, "progressEvent"):
+                self._progress[node] = functools.partial(
+                    self.nodeProgress.emit, node_id
+                )
+                node.progressEvent.add(self._progress[node])
+        super().start(*args)
+
+    def run(self):
+        try:
+            outputs = self._engine()
+        except engine.ExecutionCancelled:
+            logger.info("Graph execution cancelled")
+            self.executionCancelled.emit()
+        except Exception as e:
+            logger.exception("Graph execution failed")
+            self.executionFailed.emit(str(e))
+        else:
+            self.executionFinished.emit(outputs)
+        finally:
+            for node, callback in self._progress.items():
+                node.progressEvent.remove(callback)
+            self._progress = {}
+
+    def cancel(self):
+        """Asks the engine to stop before its next node or batch, and the
+        running nodes to end early
+        """
+        self._engine.cancel()
@@ -0,0 +1,36 @@
+import logging
+
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsSceneMouseEvent
+
+from scaflow import editor
+from scaflow.model import Control
+from ..node_control import NodeControl
+
+logger = logging.getLogger(__name__)
+
+
+class CheckboxControl(NodeControl):
+    def __init__(
+        self,
+        parent: "editor.NodeWidget",
+        width: int,
+        height: int,
+        control: "Control",
+    ):
+        super(CheckboxControl, self).__init__(parent, width, height, control)
+
+        self.setFlag(
+            QGraphicsItem.ItemIsSelectable
+        )  # Needed in order to receive click events
+        self._set_checked(bool(self._control._data.get("value", False)))
+
+    def _set_checked(self, checked: bool):
+        self._value = "yes" if checked else "no"
+        self._value_text.setPlainText(f"{self._control._display_name}: {self._value}")
+
+    def mouseDoubleClickEvent(self, event: QGraphicsSceneMouseEvent) -> None:
+        checked = not self._control._data.get("value", False)
+        logger.info("%s set to %s", self._control._display_name, checked)
+        self._control.update_data("value", checked)
+        self._set_checked(checked)
+        QGraphicsItem.mouseDoubleClickEvent(self, event)
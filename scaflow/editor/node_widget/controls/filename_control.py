@@ -6,7 +6,7 @@ from PySide6.QtGui import QFontMetrics
 from PySide6.QtWidgets import QFileDialog, QGraphicsItem, QGraphicsSceneMouseEvent
 
 from scaflow import editor
-from scaflow.model import Control
+from scaflow.model import Control, ControlType
 from ..node_control import NodeControl
 
 logger = logging.getLogger(__name__)
@@ -38,12 +38,17 @@ class FilenameControl(NodeControl):
         self._value_text.setPlainText(elided)
 
     def mouseDoubleClickEvent(self, event: QGraphicsSceneMouseEvent) -> None:
-        filename, _ = QFileDialog.getOpenFileName(
-            self.parentWidget(),
-            caption="Select trace file",
-            dir=os.getcwd(),
-            filter="Trace Files (*.ets *.npy)",
-        )
+        if self._control._type == ControlType.DirectoryPath:
+            filename = QFileDialog.getExistingDirectory(
+                self.parentWidget(), caption="Select trace directory", dir=os.getcwd()
+            )
+        else:
+            filename, _ = QFileDialog.getOpenFileName(
+                self.parentWidget(),
+                caption="Select trace file",
+                dir=os.getcwd(),
+                filter="Trace Files (*.ets *.npy *.sct)",
+            )
         if not filename:
             return
         # TODO(fergus): Make relpath relative to saved graph file
@@ -0,0 +1,55 @@
+import logging
+
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsSceneMouseEvent, QInputDialog
+
+from scaflow import editor
+from scaflow.model import Control
+from ..node_control import NodeControl
+
+logger = logging.getLogger(__name__)
+
+
+class NumberInputControl(NodeControl):
+    def __init__(
+        self,
+        parent: "editor.NodeWidget",
+        width: int,
+        height: int,
+        control: "Control",
+    ):
+        super(NumberInputControl, self).__init__(parent, width, height, control)
+
+        self.setFlag(
+            QGraphicsItem.ItemIsSelectable
+        )  # Needed in order to receive click events
+        self._set_number(self._control._data.get("value", 0))
+
+    def _set_number(self, value):
+        self._value = str(value)
+        self._value_text.setPlainText(f"{self._control._display_name}: {value}")
+
+    def mouseDoubleClickEvent(self, event: QGraphicsSceneMouseEvent) -> None:
+        current = self._control._data.get("value", 0)
+        if isinstance(current, int):
+            value, ok = QInputDialog.getInt(
+                self.parentWidget(),
+                self._control._display_name,
+                self._control._display_name,
+                current,
+                -(2**31),
+                2**31 - 1,
+            )
+        else:
+            value, ok = QInputDialog.getDouble(
+                self.parentWidget(),
+                self._control._display_name,
+                self._control._display_name,
+                current,
+                decimals=6,
+            )
+        if not ok:
+            return
+        logger.info("%s set to %s", self._control._display_name, value)
+        self._control.update_data("value", value)
+        self._set_number(value)
+        QGraphicsItem.mouseDoubleClickEvent(self, event)
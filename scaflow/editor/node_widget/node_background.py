@@ -1,10 +1,17 @@
-from typing import Optional
+from typing import Dict, Optional
 
 from PySide6 import QtCore, QtGui, QtWidgets
 
 from scaflow import editor
 from scaflow.editor.editor_widget import EditorWidget
 
+#: Outline colours of nodes by execution status
+status_colors: Dict[str, QtGui.QColor] = {
+    "running": QtGui.QColor(252, 233, 79),
+    "done": QtGui.QColor(138, 226, 52),
+    "failed": QtGui.QColor(239, 41, 41),
+}
+
 
 class NodeBackground(EditorWidget):
     def __init__(self, parent=None, scene=None):
@@ -26,7 +33,11 @@ class NodeBackground(EditorWidget):
     ) -> None:
         brush = QtGui.QBrush(self.node_widget.bg_color)
         painter.setBrush(brush)
-        painter.setPen(QtCore.Qt.NoPen)
+        status = self.node_widget.status
+        if status is None:
+            painter.setPen(QtCore.Qt.NoPen)
+        else:
+            painter.setPen(QtGui.QPen(status_colors[status], 2))
         painter.drawRoundedRect(
             QtCore.QRectF(0, 0, self.node_widget.width, self.node_widget.height), 10, 10
         )
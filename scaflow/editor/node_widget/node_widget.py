@@ -5,14 +5,19 @@ from PySide6 import QtCore, QtGui, QtWidgets
 
 from scaflow.editor.editor_widget import EditorWidget
 from scaflow.model import ControlType, Node
+from .controls.boolean_control import CheckboxControl
 from .controls.filename_control import FilenameControl
+from .controls.number_control import NumberInputControl
 from .node_background import NodeBackground
 from .node_control import NodeControl
 from .node_text import NodeText
 from .socket_widget import SocketWidget
 
 control_widget_map: Dict[ControlType, Type[NodeControl]] = {
-    ControlType.FilePath: FilenameControl
+    ControlType.FilePath: FilenameControl,
+    ControlType.DirectoryPath: FilenameControl,
+    ControlType.Boolean: CheckboxControl,
+    ControlType.Number: NumberInputControl,
 }
 
 logger = logging.getLogger(__name__)
@@ -35,6 +40,7 @@ class NodeWidget(EditorWidget):
 
         self._debug: bool = debug_mode
         self._hovering = False
+        self._status: Optional[str] = None
 
         self.setHandlesChildEvents(False)
         self.setFlag(QtWidgets.QGraphicsItem.ItemIsMovable)
@@ -62,9 +68,20 @@ class NodeWidget(EditorWidget):
         Returns:
             A QColor of the current background color
         """
+        color = QtGui.QColor(*self._node.color)
         if self._hovering:
-            return self._node.color.lighter(114)
-        return self._node.color
+            return color.lighter(114)
+        return color
+
+    @property
+    def status(self) -> Optional[str]:
+        """Execution status: "running", "done", "failed" or None if not run"""
+        return self._status
+
+    @status.setter
+    def status(self, status: Optional[str]):
+        self._status = status
+        self.update()
 
     @property
     def width(self):
@@ -39,6 +39,18 @@ class ScaflowUI(
         self.view: Optional[editor.GraphicsView] = None
 
         self._engine = engine.Engine(self.graph)
+        self._execution = editor.ExecutionThread(self._engine, parent=self)
+        self._execution.nodeStarted.connect(
+            functools.partial(self._set_node_status, status="running")
+        )
+        self._execution.nodeFinished.connect(
+            functools.partial(self._set_node_status, status="done")
+        )
+        self._execution.batchFinished.connect(self._batch_finished)
+        self._execution.nodeProgress.connect(self._node_progress)
+        self._execution.executionFinished.connect(self._execution_finished)
+        self._execution.executionFailed.connect(self._execution_failed)
+        self._execution.executionCancelled.connect(self._execution_cancelled)
 
         self.debug_mode = False
 
@@ -49,7 +61,9 @@ class ScaflowUI(
         self.ui_model.actionDraw_debug_lines.triggered.connect(self.toggle_draw_debug)
         self.ui_model.actionSave_Graph.triggered.connect(self.save_graph)
         self.ui_model.actionOpen_Graph.triggered.connect(self.read_graph)
-        self.ui_model.actionExecute_Graph.triggered.connect(self._engine)
+        self.ui_model.actionExecute_Graph.triggered.connect(self.execute_graph)
+        self.ui_model.actionStop_Execution.triggered.connect(self.cancel_execution)
+        self.ui_model.actionStop_Execution.setEnabled(False)
 
         self.ui_model.actionAbout.triggered.connect(self._show_about)
 
@@ -81,16 +95,30 @@ class ScaflowUI(
         return {
             "Constants": [
                 nodes.TraceFileNode,
+                nodes.TraceDirectoryNode,
                 nodes.PlaintextFileNode,
                 nodes.CiphertextFileNode,
             ],
-            "Input": [nodes.ETSTraceNode, nodes.NpyTraceNode],
-            "Output": [],
+            "Input": [
+                nodes.ETSTraceNode,
+                nodes.NpyTraceNode,
+                nodes.StoreTraceNode,
+                nodes.ShardedTraceNode,
+                nodes.SelectTracesNode,
+            ],
+            "Output": [nodes.StoreWriterNode],
             "Selection": [nodes.FirstSubBytesNode],
             "Model": [nodes.HammingWeightNode],
             "Discriminants": [nodes.MaxAbsNode],
             "Attack": [nodes.CPAAttackNode],
-            "Preprocessing": [nodes.FindPeaksNode]
+            "Leakage Assessment": [nodes.FixedVsRandomNode, nodes.TTestNode],
+            "Preprocessing": [
+                nodes.FindPeaksNode,
+                nodes.CorrelationAlignNode,
+                nodes.MovingAverageNode,
+                nodes.FrequencyFilterNode,
+                nodes.DecimateNode,
+            ]
             # "Processing": [nodes.SplitNode, nodes.ConcatNode],
         }
 
@@ -101,6 +129,54 @@ class ScaflowUI(
 
         self.graph.add_node(node)
 
+    def execute_graph(self):
+        """Starts executing the graph in the background"""
+        if self._execution.isRunning():
+            return
+        for widget in self.view.scene().node_widgets.values():
+            widget.status = None
+        self.ui_model.actionExecute_Graph.setEnabled(False)
+        self.ui_model.actionStop_Execution.setEnabled(True)
+        self.ui_model.statusbar.showMessage("Executing graph...")
+        self._execution.start()
+
+    def cancel_execution(self):
+        self.ui_model.statusbar.showMessage("Cancelling...")
+        self._execution.cancel()
+
+    def _set_node_status(self, node_id, status):
+        widget = self.view.scene().node_widgets.get(node_id)
+        if widget is not None:
+            widget.status = status
+
+    def _batch_finished(self, batch_number):
+        self.ui_model.statusbar.showMessage(f"Streamed batch {batch_number + 1}")
+
+    def _node_progress(self, node_id, processed, total):
+        node = self.graph[node_id] if node_id in self.graph else node_id
+        of_total = f" of {total}" if total is not None else ""
+        self.ui_model.statusbar.showMessage(
+            f"{node}: processed {processed}{of_total} traces"
+        )
+
+    def _execution_stopped(self, message):
+        for widget in self.view.scene().node_widgets.values():
+            if widget.status == "running":
+                widget.status = "failed"
+        self.ui_model.actionExecute_Graph.setEnabled(True)
+        self.ui_model.actionStop_Execution.setEnabled(False)
+        self.ui_model.statusbar.showMessage(message)
+
+    def _execution_finished(self, outputs):
+        logger.debug("Graph outputs: %s", outputs)
+        self._execution_stopped("Execution finished")
+
+    def _execution_failed(self, message):
+        self._execution_stopped(f"Execution failed: {message}")
+
+    def _execution_cancelled(self):
+        self._execution_stopped("Execution cancelled")
+
     def toggle_draw_debug(self):
         logger.info("Toggle draw debug lines: %s", self.ui_model.actionDraw_debug_lines)
         self.debug_mode = self.ui_model.actionDraw_debug_lines.isChecked()
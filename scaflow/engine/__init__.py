@@ -1,4 +1,6 @@
-from .engine import Engine
+from .engine import Engine, ExecutionCancelled, Target
+from .cache import ResultCache
+from .profiler import Profiler
 
 if __name__ == "__main__":
     import numpy as np
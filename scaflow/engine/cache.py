@@ -0,0 +1,202 @@
+"""On-disk cache of node outputs, addressed by a hash of everything they depend on
+
+Arrays and trace header sets are stored as ``.npy`` files and memory-mapped
+when read back, anything else is pickled. Entries are evicted least recently
+used first once the cache grows past its size limit.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import pickle
+import shutil
+import tempfile
+import threading
+from typing import Any, Iterable, Optional, Tuple, Union
+
+import estraces
+from estraces import TraceHeaderSet
+import numpy as np
+
+from scaflow.model import Node
+
+logger = logging.getLogger(__name__)
+
+_MANIFEST = "manifest.json"
+
+
+def node_key(node: Node, input_keys: Iterable[Tuple[str, str]]) -> str:
+    """Content hash identifying the output of a node.
+
+    Args:
+        node: Node being executed
+        input_keys: Pairs of input socket key and the key of the node output
+            connected to it
+
+    Returns: Hex digest
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{type(node).__module__}.{type(node).__qualname__}".encode())
+    digest.update(json.dumps(node.fingerprint(), sort_keys=True, default=str).encode())
+    for socket_key, upstream_key in sorted(input_keys):
+        digest.update(f"{socket_key}={upstream_key}".encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed store of node outputs.
+
+    Args:
+        directory: Directory holding the cache, created if it does not exist
+        max_size: Size in bytes above which old entries are evicted
+    """
+
+    def __init__(self, directory: Union[str, Path], max_size: int = 10 * 2**30):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+        #: Total size of the entries, None until the cache is scanned. Other
+        #: processes may share the directory, so it is rescanned when over the
+        #: size limit.
+        self._total: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def __contains__(self, key: str):
+        return (self._entry(key) / _MANIFEST).exists()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Reads an entry, marking it as recently used.
+
+        Returns: Whether the key was found, and its value
+        """
+        entry = self._entry(key)
+        manifest_path = entry / _MANIFEST
+        try:
+            file = open(manifest_path, "r")
+        except OSError:
+            return False, None
+        try:
+            with file:
+                manifest = json.load(file)
+            value = self._load(entry, manifest)
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+            # Unreadable, so removed to be stored again
+            logger.warning("Removing broken cache entry: %s", key)
+            shutil.rmtree(entry, ignore_errors=True)
+            return False, None
+        os.utime(manifest_path)
+        logger.debug("Cache hit: %s", key)
+        return True, value
+
+    def put(self, key: str, value: Any):
+        """Stores a value, then evicts old entries if over the size limit.
+
+        Entries are written to a temporary directory and renamed into place, so
+        when several threads or processes store the same key, the first one wins
+        and the others drop their copy.
+        """
+        entry = self._entry(key)
+        entry.parent.mkdir(exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=entry.parent, prefix=".tmp-"))
+        try:
+            manifest = self._save(tmp, value)
+            manifest["size"] = sum(f.stat().st_size for f in tmp.iterdir())
+            with open(tmp / _MANIFEST, "w") as file:
+                json.dump(manifest, file)
+            stored = self._rename(tmp, entry)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if not stored:
+            logger.debug("Already cached: %s", key)
+            return
+        logger.debug("Cached %d bytes: %s", manifest["size"], key)
+        with self._lock:
+            if self._total is not None:
+                self._total += manifest["size"]
+            if self._total is None or self._total > self.max_size:
+                self._evict(self.max_size)
+
+    def _rename(self, tmp: Path, entry: Path) -> bool:
+        """Moves a written entry into place, replacing an incomplete one.
+
+        Returns: False if a complete entry is already there
+        """
+        for _ in range(2):
+            if (entry / _MANIFEST).exists():
+                return False
+            try:
+                os.rename(tmp, entry)
+                return True
+            except OSError:
+                if (entry / _MANIFEST).exists():
+                    return False
+                # Left behind by an interrupted write, without a manifest
+                shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)
+        return True
+
+    def evict(self, max_size: Optional[int] = None):
+        """Removes least recently used entries until the cache fits in ``max_size``"""
+        max_size = self.max_size if max_size is None else max_size
+        with self._lock:
+            self._evict(max_size)
+
+    def _evict(self, max_size: int):
+        entries = []
+        for manifest_path in self.directory.glob(f"*/*/{_MANIFEST}"):
+            try:
+                with open(manifest_path, "r") as file:
+                    size = json.load(file)["size"]
+                entries.append((manifest_path.stat().st_mtime, size, manifest_path))
+            except (OSError, ValueError, KeyError):
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, manifest_path in sorted(entries, key=lambda e: e[0]):
+            if total <= max_size:
+                break
+            logger.debug("Evicting cache entry: %s", manifest_path.parent.name)
+            shutil.rmtree(manifest_path.parent, ignore_errors=True)
+            total -= size
+        self._total = total
+
+    def clear(self):
+        self.evict(max_size=0)
+
+    @staticmethod
+    def _save(entry: Path, value: Any) -> dict:
+        if isinstance(value, np.ndarray):
+            np.save(entry / "array.npy", value)
+            return {"kind": "ndarray"}
+        if isinstance(value, TraceHeaderSet):
+            np.save(entry / "samples.npy", value.samples[:])
+            metadatas = list(value.metadatas.keys())
+            for i, name in enumerate(metadatas):
+                np.save(entry / f"metadata_{i}.npy", np.asarray(value.metadatas[name]))
+            with open(entry / "headers.pickle", "wb") as file:
+                pickle.dump(dict(value.headers), file)
+            return {"kind": "TraceHeaderSet", "metadatas": metadatas}
+        with open(entry / "value.pickle", "wb") as file:
+            pickle.dump(value, file)
+        return {"kind": "pickle"}
+
+    @staticmethod
+    def _load(entry: Path, manifest: dict) -> Any:
+        if manifest["kind"] == "ndarray":
+            return np.load(entry / "array.npy", mmap_mode="r")
+        if manifest["kind"] == "TraceHeaderSet":
+            with open(entry / "headers.pickle", "rb") as file:
+                headers = pickle.load(file)
+            return estraces.read_ths_from_ram(
+                samples=np.load(entry / "samples.npy", mmap_mode="r"),
+                headers=headers,
+                **{
+                    name: np.load(entry / f"metadata_{i}.npy", mmap_mode="r")
+                    for i, name in enumerate(manifest["metadatas"])
+                },
+            )
+        with open(entry / "value.pickle", "rb") as file:
+            return pickle.load(file)
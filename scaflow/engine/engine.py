@@ -1,16 +1,49 @@
 import logging
-from typing import Dict
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
+from itertools import zip_longest
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from scaflow import model
-from scaflow.model import Connection, Input, Node
+from scaflow.model import Connection, GraphEvent, Input, Node
+from . import shared_memory
+from .cache import ResultCache, node_key
+from .plan import ExecutionPlan
+from .profiler import Profiler, output_size
 
 logger = logging.getLogger(__name__)
 
+#: Node ID, or pair of node ID and output socket key
+Target = Union[int, Tuple[int, str]]
+
+_END = object()  #: Stands for the batches of a stream source that has ended
+
+
+def _execute_in_process(node: Node, shared_inputs, min_shared_bytes: int):
+    """Entry point of worker processes, see :attr:`Node.process_safe`"""
+    output = node.execute(shared_memory.restore(shared_inputs))
+    return shared_memory.share(output, min_shared_bytes)
+
+
+class ExecutionCancelled(Exception):
+    """Raised by :class:`Engine` when :meth:`Engine.cancel` stops an execution"""
+
 
 class EngineNode:
     def __init__(self, node):
         self._node = node
         self.output_data = None
+        self.dirty = True  #: Whether output_data is missing or out of date
+        self.cache_key: Optional[str] = None
+        self.released = False  #: Whether output_data was dropped after use
 
     @property
     def node(self) -> Node:
@@ -18,44 +51,632 @@ class EngineNode:
 
 
 class Engine:
-    def __init__(self, graph: model.Graph):
+    """Executes the nodes of a graph, passing outputs along the connections.
+
+    Outputs are kept between calls. The engine listens to the graph and node
+    control events, so only nodes affected by a change are executed again.
+
+    Progress is reported through ``nodeStartedEvent`` and ``nodeFinishedEvent``,
+    called with the node ID, and ``batchEvent``, called with the number of each
+    batch streamed. These are called from the thread executing the node.
+
+    Args:
+        graph: Graph to execute
+        parallel: Dispatch independent nodes to a thread pool instead of
+            executing them one at a time
+        max_workers: Size of the thread pool used when ``parallel`` is set,
+            defaults to the :class:`ThreadPoolExecutor` default
+        process_workers: If set, nodes marked as :attr:`Node.process_safe`
+            are executed in a pool of this many worker processes
+        min_shared_bytes: Arrays passed to and from worker processes of at
+            least this size are moved through shared memory
+        cache: Persistent cache consulted before executing nodes marked as
+            :attr:`Node.cacheable`
+        batch_size: If set, stream batches of this many traces from source
+            nodes through to sink nodes instead of passing whole trace sets
+        profiler: Records timings of every node execution
+        release_outputs: Drop the output of a node as soon as every node
+            consuming it has executed, unless it is pinned with :meth:`pin`.
+            Released outputs are returned as ``None`` and recomputed, or read
+            from the cache, when needed again
+
+    Selection nodes fed only by a :attr:`Node.selectable` trace loader have the
+    loader read just their window, see :meth:`Node.execute_selection`. Unless
+    it is pinned or a target, the loader does not execute and its output is
+    ``None``. Selections are not pushed down when streaming batches.
+    """
+
+    def __init__(
+        self,
+        graph: model.Graph,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        min_shared_bytes: int = shared_memory.MIN_SHARED_BYTES,
+        cache: Optional[ResultCache] = None,
+        batch_size: Optional[int] = None,
+        profiler: Optional[Profiler] = None,
+        release_outputs: bool = False,
+    ):
         self._graph = graph
-        self._engine_graph = {}
-        self._visited = []
-
-    def __call__(self, *args, **kwargs):
-        self._visited = []
-        for node_id in self._graph:
-            if node_id not in self._visited:
-                self._process_node(node_id)
-
-    def _get_input_data(self, engine_node: EngineNode) -> Dict[str, any]:
-        logger.debug("Getting inputs for node: %s", engine_node.node)
-        input_data: Dict[str, any] = {}
-        i: Input
-        for i in engine_node.node.inputs.values():
-            conn: Connection
-            for conn in i.connections:
-                logger.debug("Connection: %s", conn)
-                outputs = self._process_node(conn.output_node)
-
-                input_data[conn.output_socket_key] = outputs
-        return input_data
-
-    def _process_node(self, node_id) -> Dict[str, any]:
-        if node_id in self._engine_graph:
-            engine_node = self._engine_graph[node_id]
+        self._engine_graph: Dict[int, EngineNode] = {}
+        #: Plan of the running or last execution, kept valid while running even
+        #: if the graph is edited meanwhile
+        self._plan: Optional[ExecutionPlan] = None
+        self._plan_stale = True
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.process_workers = process_workers
+        self.min_shared_bytes = min_shared_bytes
+        self.cache = cache
+        self.batch_size = batch_size
+        self.profiler = profiler
+        self.release_outputs = release_outputs
+        self._pinned: Set[int] = set()
+        #: Nodes whose outputs the running execution keeps: the pinned ones and
+        #: its targets
+        self._kept: Set[int] = set()
+        self._consumers: Dict[int, int] = {}
+        #: Selection nodes of this execution reading from their source node
+        self._pushdown: Dict[int, int] = {}
+        self._pushed_sources: Set[int] = set()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._cancelled = threading.Event()
+        #: Nodes of the running or last execution, in order
+        self._order: List[int] = []
+        #: Guards the changes of the graph against an execution starting or ending
+        self._lock = threading.RLock()
+        self._running = False
+        #: Changes of the graph made while executing, applied once it ends
+        self._deferred: List[Callable[[], None]] = []
+
+        self.nodeStartedEvent = GraphEvent(self)
+        self.nodeFinishedEvent = GraphEvent(self)
+        self.batchEvent = GraphEvent(self)
+
+        graph.nodeAddedEvent.add(self._node_added)
+        graph.nodeRemovedEvent.add(self._node_removed)
+        graph.edgeAddedEvent.add(self._edge_changed)
+        graph.edgeRemovedEvent.add(self._edge_changed)
+        for node_id in graph:
+            graph[node_id].controlChangedEvent.add(self._control_changed)
+
+    def __call__(self, targets: Optional[Iterable[Target]] = None) -> Dict[Any, Any]:
+        """Executes the graph, or only the nodes needed to compute ``targets``.
+
+        Args:
+            targets: Node IDs, or pairs of node ID and output socket key, to
+                compute. Nodes they do not depend on are skipped. If not given,
+                every node of the graph is executed
+
+        Returns: Outputs of every node by ID, or of each target if given
+        """
+        self._cancelled.clear()
+        with self._lock:
+            self._running = True
+        try:
+            return self._execute(targets)
+        finally:
+            with self._lock:
+                self._running = False
+                deferred, self._deferred = self._deferred, []
+                for change in deferred:
+                    change()
+
+    def _execute(self, targets: Optional[Iterable[Target]]) -> Dict[Any, Any]:
+        plan = self._get_plan()
+        if targets is None:
+            order = plan.order
+            target_ids = set()
         else:
-            engine_node = EngineNode(self._graph[node_id])
-            self._engine_graph[node_id] = engine_node
-        if engine_node.output_data is None:
-            logger.debug("Processing node: %s", engine_node.node)
-
-            input_data = self._get_input_data(engine_node)
-            logger.debug(
-                "Executing node: %s, with input data: %s", engine_node.node, input_data
+            targets = list(targets)
+            target_ids = {t[0] if isinstance(t, tuple) else t for t in targets}
+            order = plan.upstream_closure(target_ids)
+        for node_id in order:
+            self._get_engine_node(node_id)
+        self._order = order
+        self._kept = self._pinned | target_ids
+        self._plan_pushdown(order)
+        self._consumers = (
+            self._count_consumers(order, target_ids) if self.release_outputs else {}
+        )
+        if self.process_workers:
+            # Forking a process that runs threads (ours, or NumPy's and Numba's)
+            # can deadlock the workers, so always start them fresh
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        try:
+            if self.batch_size:
+                self._execute_streaming(order)
+            elif self.parallel:
+                self._execute_parallel(order)
+            else:
+                self._execute_serial(order)
+        finally:
+            if self._process_pool is not None:
+                self._process_pool.shutdown()
+                self._process_pool = None
+
+        if targets is None:
+            # Nodes added to the graph while executing are not part of this run
+            return {
+                node_id: self._engine_graph[node_id].output_data for node_id in order
+            }
+        return {target: self._target_output(target) for target in targets}
+
+    def _plan_pushdown(self, order: List[int]):
+        """Chooses the selections pushed down into their source in this execution"""
+        self._pushdown = {}
+        if not self.batch_size:
+            executing = set(order)
+            self._pushdown = {
+                node_id: source_id
+                for node_id, source_id in self._plan.pushdown.items()
+                if node_id in executing and source_id not in self._kept
+            }
+        self._pushed_sources = set(self._pushdown.values())
+
+    def _target_output(self, target: Target) -> Any:
+        if not isinstance(target, tuple):
+            return self._engine_graph[target].output_data
+        node_id, socket_key = target
+        node = self._graph[node_id]
+        if socket_key not in node.outputs:
+            raise KeyError(f"Node {node} has no output '{socket_key}'")
+        return self._socket_output(
+            node, self._engine_graph[node_id].output_data, socket_key
+        )
+
+    @staticmethod
+    def _socket_output(node: Node, output_data: Any, socket_key: str) -> Any:
+        """Value of an output socket, indexing the dict of nodes with several outputs"""
+        if len(node.outputs) > 1 and isinstance(output_data, dict):
+            return output_data[socket_key]
+        return output_data
+
+    @property
+    def graph(self) -> model.Graph:
+        return self._graph
+
+    def _when_idle(self, change: Callable[[], None]):
+        """Applies a change of the graph now, or once the running execution
+        ends, as nodes finishing meanwhile would overwrite it
+        """
+        with self._lock:
+            if self._running:
+                self._deferred.append(change)
+            else:
+                change()
+
+    def invalidate(self, node_id):
+        """Marks a node and all nodes downstream of it for re-execution.
+
+        Can be called from any thread. While executing, nodes are marked once
+        the execution ends.
+
+        Args:
+            node_id: ID of the changed node
+        """
+        self._when_idle(lambda: self._invalidate(node_id))
+
+    def _invalidate(self, node_id):
+        stack = [node_id]
+        seen = set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            if current in self._engine_graph:
+                node = self._engine_graph[current].node
+                self._engine_graph[current].dirty = True
+            elif current in self._graph:
+                node = self._graph[current]
+            else:
+                continue
+            logger.debug("Invalidating node: %s", node)
+            stack.extend(self._downstream_nodes(node))
+
+    def cancel(self):
+        """Stops a running execution before the next node or batch.
+
+        Can be called from any thread, the execution then raises
+        :class:`ExecutionCancelled`. Nodes that did not finish stay dirty.
+        Running nodes are asked to end early with :meth:`Node.stop`.
+        """
+        self._cancelled.set()
+        for node_id in self._order:
+            engine_node = self._engine_graph.get(node_id)
+            if engine_node is not None:
+                engine_node.node.stop()
+
+    def close(self):
+        """Stops following the changes of the graph, so that an engine no
+        longer used can be dropped while the graph is kept.
+        """
+        graph = self._graph
+        graph.nodeAddedEvent.remove(self._node_added)
+        graph.nodeRemovedEvent.remove(self._node_removed)
+        graph.edgeAddedEvent.remove(self._edge_changed)
+        graph.edgeRemovedEvent.remove(self._edge_changed)
+        for node_id in graph:
+            graph[node_id].controlChangedEvent.remove(self._control_changed)
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise ExecutionCancelled("Execution cancelled")
+
+    def pin(self, node_id):
+        """Keeps the output of a node when ``release_outputs`` is set"""
+        self._pinned.add(node_id)
+
+    def unpin(self, node_id):
+        self._pinned.discard(node_id)
+
+    def _node_added(self, node_id):
+        def add():
+            self._plan_stale = True
+
+        self._graph[node_id].controlChangedEvent.add(self._control_changed)
+        self._when_idle(add)
+
+    def _node_removed(self, node: Node):
+        def remove():
+            self._plan_stale = True
+            self._invalidate(node.id)
+            self._engine_graph.pop(node.id, None)
+            self._pinned.discard(node.id)
+
+        node.controlChangedEvent.remove(self._control_changed)
+        self._when_idle(remove)
+
+    def _edge_changed(self, connection: Connection):
+        def change():
+            self._plan_stale = True
+            self._invalidate(connection.input_node)
+
+        self._when_idle(change)
+
+    def _control_changed(self, control: model.Control):
+        self.invalidate(control.parent.id)
+
+    def _get_engine_node(self, node_id) -> EngineNode:
+        if node_id not in self._engine_graph:
+            self._engine_graph[node_id] = EngineNode(self._graph[node_id])
+        return self._engine_graph[node_id]
+
+    @staticmethod
+    def _downstream_nodes(node: Node) -> Set[int]:
+        return {
+            conn.input_node for o in node.outputs.values() for conn in o.connections
+        }
+
+    def _get_plan(self) -> ExecutionPlan:
+        """Plan of the current graph, compiled again after structural changes"""
+        if self._plan_stale:
+            self._plan = ExecutionPlan(self._graph)
+            self._plan_stale = False
+        return self._plan
+
+    def _topological_order(self) -> List[int]:
+        """Orders the graph so every node comes after all of its inputs.
+
+        Returns: List of node IDs
+        """
+        return self._get_plan().order
+
+    def _count_consumers(self, order: List[int], targets: Set[int]) -> Dict[int, int]:
+        """Counts the nodes executing in this call that consume each output.
+
+        A node executes if it is dirty, or if its output was released and a
+        consumer executes. The caller counts as a consumer of the targets.
+        """
+        plan = self._plan
+        consumers: Dict[int, int] = {node_id: 1 for node_id in targets}
+        for node_id in reversed(order):
+            engine_node = self._engine_graph[node_id]
+            if engine_node.dirty or (
+                engine_node.released and consumers.get(node_id, 0)
+            ):
+                for upstream_id in plan.upstream[node_id]:
+                    consumers[upstream_id] = consumers.get(upstream_id, 0) + 1
+        return consumers
+
+    def _must_execute(self, node_id) -> bool:
+        engine_node = self._engine_graph[node_id]
+        return engine_node.dirty or (
+            engine_node.released and self._consumers.get(node_id, 0) > 0
+        )
+
+    def _release_inputs(self, node_id):
+        """Drops upstream outputs that no other node executing will consume"""
+        for upstream_id in self._plan.upstream[node_id]:
+            if upstream_id not in self._consumers:
+                continue
+            self._consumers[upstream_id] -= 1
+            if self._consumers[upstream_id] == 0 and upstream_id not in self._kept:
+                upstream = self._engine_graph[upstream_id]
+                logger.debug("Releasing output of node: %s", upstream.node)
+                upstream.output_data = None
+                upstream.released = True
+                if upstream_id in self._pushed_sources:
+                    # Its selections, which read its inputs, have all run
+                    self._release_inputs(upstream_id)
+
+    def _collect_input_data(self, node_id) -> Dict[str, any]:
+        """Gathers inputs of a node whose upstream nodes have already executed"""
+        return {
+            link.output_socket_key: self._socket_output(
+                self._engine_graph[link.output_node].node,
+                self._engine_graph[link.output_node].output_data,
+                link.output_socket_key,
+            )
+            for link in self._plan.inputs[node_id]
+        }
+
+    def _input_keys(self, node_id) -> List[Tuple[str, str]]:
+        return [
+            (
+                f"{link.input_key}:{link.output_socket_key}",
+                self._engine_graph[link.output_node].cache_key,
+            )
+            for link in self._plan.inputs[node_id]
+        ]
+
+    def _execute_node(
+        self,
+        engine_node: EngineNode,
+        input_data: Dict[str, any],
+        execute: Optional[Callable[[Dict[str, any]], Any]] = None,
+    ):
+        """Computes the output of a node, or reads it from the cache.
+
+        Args:
+            engine_node: Node to execute
+            input_data: Inputs by output socket key
+            execute: Called with ``input_data`` instead of :meth:`Node.execute`
+        """
+        node = engine_node.node
+        self._check_cancelled()
+        self.nodeStartedEvent(node.id)
+        if self.cache is not None:
+            engine_node.cache_key = node_key(node, self._input_keys(node.id))
+            if node.cacheable:
+                hit, value = self.cache.get(engine_node.cache_key)
+                if hit:
+                    logger.debug("Using cached result for node: %s", node)
+                    engine_node.output_data = value
+                    engine_node.dirty = False
+                    engine_node.released = False
+                    self.nodeFinishedEvent(node.id)
+                    return
+
+        logger.debug("Executing node: %s, with input data: %s", node, input_data)
+        with self._profile(node) as profile:
+            if execute is not None:
+                output = execute(input_data)
+            elif self._process_pool is not None and node.process_safe:
+                shared_inputs = shared_memory.share(input_data, self.min_shared_bytes)
+                future = self._process_pool.submit(
+                    _execute_in_process, node, shared_inputs, self.min_shared_bytes
+                )
+                output = shared_memory.restore(future.result())
+            else:
+                output = node.execute(input_data)
+            if profile is not None:
+                profile.output_bytes = output_size(output)
+        # A node asked to stop returns what it has so far, which is not its output
+        self._check_cancelled()
+        engine_node.output_data = output
+        engine_node.dirty = False
+        engine_node.released = False
+        logger.debug("Result: %s", engine_node.output_data)
+        if self.cache is not None and node.cacheable:
+            self.cache.put(engine_node.cache_key, engine_node.output_data)
+        self.nodeFinishedEvent(node.id)
+
+    def _profile(self, node: Node, label: str = "execute"):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.record(node, label)
+
+    def _run_node(self, node_id) -> bool:
+        """Executes a node if needed, once its upstream nodes have run.
+
+        Returns: Whether the node was executed
+        """
+        if not self._must_execute(node_id):
+            return False
+        engine_node = self._engine_graph[node_id]
+        if node_id in self._pushed_sources:
+            # Read by its selection nodes instead, so its output stays missing
+            if self.cache is not None:
+                engine_node.cache_key = node_key(
+                    engine_node.node, self._input_keys(node_id)
+                )
+            return False
+        logger.debug("Processing node: %s", engine_node.node)
+        source_id = self._pushdown.get(node_id)
+        if source_id is None:
+            self._execute_node(engine_node, self._collect_input_data(node_id))
+            return True
+
+        source = self._graph[source_id]
+        traces, samples = engine_node.node.selection()
+        logger.debug("Pushing selection down into node: %s", source)
+        self._execute_node(
+            engine_node,
+            self._collect_input_data(source_id),
+            lambda input_data: source.execute_selection(input_data, traces, samples),
+        )
+        return True
+
+    def _execute_serial(self, order: List[int]):
+        for node_id in order:
+            if self._run_node(node_id):
+                self._release_inputs(node_id)
+
+    def _execute_parallel(self, order: List[int]):
+        """Runs every node on a thread pool as soon as all of its inputs are ready"""
+        plan = self._plan
+        remaining = {node_id: len(plan.upstream[node_id]) for node_id in order}
+        downstream = plan.downstream
+        run = self._run_node
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending: Dict[Future, int] = {
+                pool.submit(run, node_id): node_id
+                for node_id in order
+                if remaining[node_id] == 0
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = pending.pop(future)
+                    if future.result():
+                        self._release_inputs(node_id)
+                    for downstream_id in downstream[node_id]:
+                        if downstream_id not in remaining:
+                            continue  # Not needed for the targets
+                        remaining[downstream_id] -= 1
+                        if remaining[downstream_id] == 0:
+                            pending[pool.submit(run, downstream_id)] = downstream_id
+
+    def _execute_streaming(self, order: List[int]):
+        """Pushes batches from stream sources through transforms into sinks.
+
+        Nodes feeding the stream are executed first, and nodes using the
+        outputs of sinks once every batch has been consumed. Stream sources
+        that no node executing consumes run as other nodes.
+        """
+        plan = self._plan
+        executing = set(order)
+        sources: List[int] = []
+        streamed: List[int] = []
+        sinks: List[int] = []
+        after: Set[int] = set()
+        for node_id in order:
+            node = self._graph[node_id]
+            upstream = plan.upstream[node_id]
+            if upstream & after or upstream & set(sinks):
+                after.add(node_id)
+            elif upstream & set(streamed):
+                if node.stream_sink:
+                    sinks.append(node_id)
+                elif node.stream_transform:
+                    streamed.append(node_id)
+                else:
+                    raise TypeError(f"Node {node} cannot process batches of traces")
+            elif node.stream_source and plan.downstream[node_id] & executing:
+                sources.append(node_id)
+                streamed.append(node_id)
+
+        def run(node_id):
+            if self._run_node(node_id):
+                self._release_inputs(node_id)
+
+        for node_id in order:
+            if (
+                node_id not in streamed
+                and node_id not in sinks
+                and node_id not in after
+            ):
+                run(node_id)
+        if any(self._must_execute(node_id) for node_id in sinks):
+            executing = [n for n in streamed + sinks if self._must_execute(n)]
+            self._stream_batches(sources, streamed, sinks)
+            for node_id in streamed:
+                # Batches are not kept, so streamed nodes behave as released
+                self._engine_graph[node_id].dirty = False
+                self._engine_graph[node_id].released = True
+            for node_id in executing:
+                self._release_inputs(node_id)
+        for node_id in order:
+            if node_id in after:
+                run(node_id)
+
+    def _stream_batches(
+        self, sources: List[int], streamed: List[int], sinks: List[int]
+    ):
+        def batch_input_data(node_id, batch_outputs: Dict[int, any]):
+            input_data: Dict[str, any] = {}
+            for link in self._plan.inputs[node_id]:
+                if link.output_node in batch_outputs:
+                    value = batch_outputs[link.output_node]
+                else:
+                    value = self._engine_graph[link.output_node].output_data
+                input_data[link.output_socket_key] = self._socket_output(
+                    self._engine_graph[link.output_node].node,
+                    value,
+                    link.output_socket_key,
+                )
+            return input_data
+
+        iterators = [
+            self._graph[node_id].iter_batches(
+                self._collect_input_data(node_id), self.batch_size
             )
-            engine_node.output_data = engine_node.node.execute(input_data)
-            logger.debug("Result: %s", engine_node.output_data)
-            self._visited.append(node_id)
-        return engine_node.output_data
+            for node_id in sources
+        ]
+        transforms = [node_id for node_id in streamed if node_id not in sources]
+        if self.cache is not None:
+            # Addresses the results of nodes downstream of the stream
+            for node_id in streamed + sinks:
+                self._engine_graph[node_id].cache_key = node_key(
+                    self._graph[node_id], self._input_keys(node_id)
+                )
+        for node_id in streamed + sinks:
+            self.nodeStartedEvent(node_id)
+        for node_id in transforms + sinks:
+            self._graph[node_id].begin_stream()
+
+        finished = False
+        try:
+            for batch_number, batches in enumerate(
+                zip_longest(*iterators, fillvalue=_END)
+            ):
+                if any(batch is _END for batch in batches):
+                    raise ValueError(
+                        "Stream sources differ in their number of batches, so "
+                        "in their number of traces"
+                    )
+                self._check_cancelled()
+                logger.debug("Streaming batch %d", batch_number)
+                batch_outputs = dict(zip(sources, batches))
+                for node_id in streamed:
+                    node = self._graph[node_id]
+                    if node_id not in batch_outputs:
+                        with self._profile(node) as profile:
+                            output = node.execute(
+                                batch_input_data(node_id, batch_outputs)
+                            )
+                            if profile is not None:
+                                profile.output_bytes = output_size(output)
+                        batch_outputs[node_id] = output
+                for node_id in sinks:
+                    node = self._graph[node_id]
+                    with self._profile(node, "consume_batch"):
+                        node.consume_batch(batch_input_data(node_id, batch_outputs))
+                self.batchEvent(batch_number)
+            finished = True
+        finally:
+            # Lets sources stop background readers if the stream is cut short
+            for iterator in iterators:
+                if hasattr(iterator, "close"):
+                    iterator.close()
+            for node_id in transforms:
+                self._graph[node_id].end_stream()
+            if not finished:
+                for node_id in sinks:
+                    self._graph[node_id].abort_stream()
+
+        for node_id in sinks:
+            engine_node = self._engine_graph[node_id]
+            with self._profile(engine_node.node, "end_stream"):
+                engine_node.output_data = engine_node.node.end_stream()
+            engine_node.dirty = False
+            engine_node.released = False
+        for node_id in streamed + sinks:
+            self.nodeFinishedEvent(node_id)
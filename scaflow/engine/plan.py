@@ -0,0 +1,105 @@
+"""Flat execution plan compiled from the structure of a graph
+
+The engine builds a plan once and reuses it between executions, only
+compiling a new one after nodes or edges are added or removed.
+"""
+from collections import deque
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+from scaflow import model
+
+logger = logging.getLogger(__name__)
+
+
+class InputLink(NamedTuple):
+    """Connection feeding an input socket of a planned node"""
+
+    input_key: str
+    output_node: int
+    output_socket_key: str
+
+
+class ExecutionPlan:
+    """Topological order and adjacency of every node in a graph.
+
+    Args:
+        graph: Graph to compile
+
+    Raises:
+        ValueError: If the graph contains a cycle
+    """
+
+    def __init__(self, graph: model.Graph):
+        #: Connections into each node, in the order of its input sockets
+        self.inputs: Dict[int, List[InputLink]] = {}
+        self.upstream: Dict[int, Set[int]] = {}
+        self.downstream: Dict[int, Set[int]] = {node_id: set() for node_id in graph}
+        for node_id in graph:
+            links = [
+                InputLink(i.key, conn.output_node, conn.output_socket_key)
+                for i in graph[node_id].inputs.values()
+                for conn in i.connections
+            ]
+            self.inputs[node_id] = links
+            self.upstream[node_id] = {link.output_node for link in links}
+            for link in links:
+                self.downstream[link.output_node].add(node_id)
+
+        #: Node IDs, every node coming after all of its inputs
+        self.order: List[int] = self._sort()
+        #: Position of each node in :attr:`order`
+        self.index: Dict[int, int] = {
+            node_id: i for i, node_id in enumerate(self.order)
+        }
+        #: Selection nodes, see :meth:`Node.selection`, mapped to the
+        #: :attr:`Node.selectable` node feeding them. That node then reads only
+        #: their windows instead of executing itself
+        self.pushdown: Dict[int, int] = {}
+        for node_id in graph:
+            consumers = self.downstream[node_id]
+            if not graph[node_id].selectable or not consumers:
+                continue
+            if all(
+                len(self.inputs[c]) == 1 and graph[c].selection() is not None
+                for c in consumers
+            ):
+                self.pushdown.update((c, node_id) for c in consumers)
+        logger.debug("Compiled execution plan: %s", self.order)
+
+    def _sort(self) -> List[int]:
+        remaining = {node_id: len(up) for node_id, up in self.upstream.items()}
+        ready = deque(node_id for node_id, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            node_id = ready.popleft()
+            order.append(node_id)
+            for downstream_id in self.downstream[node_id]:
+                remaining[downstream_id] -= 1
+                if remaining[downstream_id] == 0:
+                    ready.append(downstream_id)
+
+        if len(order) != len(remaining):
+            cycle = sorted(node_id for node_id, count in remaining.items() if count)
+            raise ValueError(f"Graph contains a cycle, cannot order nodes {cycle}")
+        return order
+
+    def upstream_closure(self, node_ids: Iterable[int]) -> List[int]:
+        """Nodes that ``node_ids`` depend on, including themselves.
+
+        Returns: Node IDs in execution order
+        """
+        stack = list(node_ids)
+        closure: Set[int] = set()
+        while stack:
+            node_id = stack.pop()
+            if node_id in closure:
+                continue
+            if node_id not in self.index:
+                raise KeyError(f"Node {node_id} is not in the graph")
+            closure.add(node_id)
+            stack.extend(self.upstream[node_id])
+        return sorted(closure, key=self.index.__getitem__)
+
+    def __len__(self):
+        return len(self.order)
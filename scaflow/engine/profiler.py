@@ -0,0 +1,167 @@
+"""Per-node execution profiling
+
+Records wall time, CPU time, output size and optionally peak traced memory of
+every node executed by the engine. Results can be exported as a Chrome
+trace-event file, which opens in ``chrome://tracing`` and Perfetto.
+"""
+from contextlib import contextmanager
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+from estraces import TraceHeaderSet
+import numpy as np
+from rich.table import Table
+
+from scaflow.model import Node
+
+logger = logging.getLogger(__name__)
+
+#: Whether the peak of traced memory can be reset, so measured node by node
+CAN_TRACE_PEAK = hasattr(tracemalloc, "reset_peak")  # Python 3.9+
+
+
+def output_size(value: Any) -> int:
+    """Approximate size in bytes of a node output, without loading lazy data"""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, TraceHeaderSet):
+        size = int(value.samples.size) * value.samples.dtype.itemsize
+        for key in value.metadatas.keys():
+            size += output_size(value.metadatas[key])
+        return size
+    if isinstance(value, dict):
+        return sum(output_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(output_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class NodeProfile:
+    """Measurements of a single node execution"""
+
+    def __init__(self, node: Node, label: str, start: float):
+        self.node_id: int = node.id
+        self.name: str = f"{node.display_name} ({node.id})"
+        self.label = label  #: Which method of the node was called
+        self.thread: int = threading.get_ident()
+        self.start = start  #: Seconds since the profiler was created
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory: Optional[int] = None
+        self.output_bytes = 0
+
+
+class Profiler:
+    """Collects :class:`NodeProfile` records from an :class:`Engine`.
+
+    Nodes run in the engine's process pool are timed and measured from the
+    process waiting on them, so their CPU time and memory are close to zero.
+
+    Args:
+        trace_memory: Measure peak memory with :mod:`tracemalloc`. This slows
+            down allocations, and peaks of nodes running concurrently are mixed.
+            Before Python 3.9, the peak cannot be reset between nodes, so no
+            memory is measured
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        if trace_memory and not CAN_TRACE_PEAK:
+            logger.warning("Peak memory of nodes can only be measured from Python 3.9")
+            trace_memory = False
+        self.trace_memory = trace_memory
+        self.records: List[NodeProfile] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def record(self, node: Node, label: str = "execute") -> Iterator[NodeProfile]:
+        """Times the enclosed block, the caller sets ``output_bytes``"""
+        profile = NodeProfile(node, label, time.perf_counter() - self._origin)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield profile
+        finally:
+            profile.cpu_time = time.thread_time() - cpu_start
+            profile.wall_time = time.perf_counter() - wall_start
+            if self.trace_memory:
+                profile.peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+            with self._lock:
+                self.records.append(profile)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": r.name,
+                    "cat": r.label,
+                    "ph": "X",
+                    "ts": r.start * 1e6,
+                    "dur": r.wall_time * 1e6,
+                    "pid": pid,
+                    "tid": r.thread,
+                    "args": {
+                        "node_id": r.node_id,
+                        "cpu_time": r.cpu_time,
+                        "peak_memory": r.peak_memory,
+                        "output_bytes": r.output_bytes,
+                    },
+                }
+                for r in self.records
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def export_chrome_trace(self, filename):
+        with open(filename, "w") as file:
+            json.dump(self.to_chrome_trace(), file)
+        logger.info("Wrote profile of %d calls to '%s'", len(self.records), filename)
+
+    def summary(self) -> Table:
+        """Table of the totals for each node, slowest first"""
+        totals: Dict[int, Dict[str, Any]] = {}
+        for r in self.records:
+            total = totals.setdefault(
+                r.node_id,
+                {"name": r.name, "calls": 0, "wall": 0.0, "cpu": 0.0, "peak": None},
+            )
+            total["calls"] += 1
+            total["wall"] += r.wall_time
+            total["cpu"] += r.cpu_time
+            total["output"] = r.output_bytes
+            if r.peak_memory is not None:
+                total["peak"] = max(total["peak"] or 0, r.peak_memory)
+
+        table = Table(title="Node execution profile")
+        for column in (
+            "Node",
+            "Calls",
+            "Wall (s)",
+            "CPU (s)",
+            "Peak (MB)",
+            "Output (MB)",
+        ):
+            table.add_column(column, justify="left" if column == "Node" else "right")
+        for total in sorted(totals.values(), key=lambda t: t["wall"], reverse=True):
+            peak = "-" if total["peak"] is None else f"{total['peak'] / 2 ** 20:.1f}"
+            table.add_row(
+                total["name"],
+                str(total["calls"]),
+                f"{total['wall']:.3f}",
+                f"{total['cpu']:.3f}",
+                peak,
+                f"{total['output'] / 2 ** 20:.1f}",
+            )
+        return table
@@ -0,0 +1,125 @@
+"""Moves node inputs and outputs between processes through shared memory
+
+Large NumPy arrays are copied into a :class:`SharedMemory` block and only a
+small handle is pickled. Trace header sets are split into their samples and
+metadata arrays and rebuilt in RAM on the other side.
+"""
+import logging
+from multiprocessing import shared_memory
+from typing import Any, Dict, Tuple
+
+import estraces
+from estraces import TraceHeaderSet
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MIN_SHARED_BYTES = 1 << 20  #: Arrays smaller than this are pickled as usual
+
+
+class SharedArray:
+    """Picklable handle to an array stored in a shared memory block"""
+
+    def __init__(self, array: np.ndarray):
+        self.shape: Tuple[int, ...] = array.shape
+        self.dtype = array.dtype
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.name: str = block.name
+        block.close()
+
+    def restore(self) -> np.ndarray:
+        """Copies the array out of shared memory and frees the block"""
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            shared = np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+            array = np.array(shared, copy=True)
+            del shared
+        finally:
+            block.close()
+            block.unlink()
+        return array
+
+    def release(self):
+        """Frees the block without reading it"""
+        block = shared_memory.SharedMemory(name=self.name)
+        block.close()
+        block.unlink()
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Copies rows of the array out of shared memory, for one of several
+        readers of the block. The block stays until :meth:`release`.
+        """
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            shared = np.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+            rows = np.array(shared[start:stop], copy=True)
+            del shared
+        finally:
+            block.close()
+        return rows
+
+
+class SharedTraceHeaderSet:
+    """Picklable handle to the samples and metadata of a trace header set"""
+
+    def __init__(self, ths: TraceHeaderSet, min_bytes: int):
+        self.samples = share(ths.samples[:], min_bytes)
+        self.metadatas: Dict[str, Any] = {
+            key: share(np.asarray(ths.metadatas[key]), min_bytes)
+            for key in ths.metadatas.keys()
+        }
+
+    def restore(self) -> TraceHeaderSet:
+        return estraces.read_ths_from_ram(
+            samples=restore(self.samples),
+            **{key: restore(value) for key, value in self.metadatas.items()}
+        )
+
+    def release(self):
+        release(self.samples)
+        for value in self.metadatas.values():
+            release(value)
+
+
+def share(value, min_bytes: int = MIN_SHARED_BYTES):
+    """Replaces large arrays within ``value`` by shared memory handles.
+
+    Args:
+        value: Node input or output, containers are searched recursively
+        min_bytes: Arrays of at least this size are placed in shared memory
+
+    Returns: Picklable copy of ``value``
+    """
+    if isinstance(value, np.ndarray) and value.nbytes >= min_bytes:
+        return SharedArray(value)
+    if isinstance(value, TraceHeaderSet):
+        return SharedTraceHeaderSet(value, min_bytes)
+    if isinstance(value, dict):
+        return {k: share(v, min_bytes) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(share(v, min_bytes) for v in value)
+    return value
+
+
+def restore(value):
+    """Inverse of :func:`share`, freeing the shared memory blocks used"""
+    if isinstance(value, (SharedArray, SharedTraceHeaderSet)):
+        return value.restore()
+    if isinstance(value, dict):
+        return {k: restore(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(restore(v) for v in value)
+    return value
+
+
+def release(value):
+    """Frees the shared memory blocks in ``value`` when it will not be restored"""
+    if isinstance(value, (SharedArray, SharedTraceHeaderSet)):
+        value.release()
+    elif isinstance(value, dict):
+        for v in value.values():
+            release(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            release(v)
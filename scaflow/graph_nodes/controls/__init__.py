@@ -1 +1,2 @@
 from .file_control import FileControl
+from .value_control import BooleanControl, NumberControl
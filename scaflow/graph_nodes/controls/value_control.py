@@ -0,0 +1,30 @@
+from typing import Union
+
+from scaflow.model import Control, ControlType
+from scaflow.model.dispatcher import dispatcher
+
+
+@dispatcher
+class BooleanControl(Control):
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        value: bool = False,
+        control_type=ControlType.Boolean,
+    ):
+        super().__init__(key=key, name=name, control_type=control_type)
+        self._data["value"] = value
+
+
+@dispatcher
+class NumberControl(Control):
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        value: Union[int, float] = 0,
+        control_type=ControlType.Number,
+    ):
+        super().__init__(key=key, name=name, control_type=control_type)
+        self._data["value"] = value
@@ -1,4 +1,5 @@
 from .cpa_attack import CPAAttackNode
+from .ttest import FixedVsRandomNode, TTestNode
 from .selection import *
 from .model import *
 from .discriminants import *
@@ -0,0 +1,51 @@
+"""Processing trace sets block by block
+
+Nodes working on whole trace sets read and process their samples in blocks of
+traces, so the temporary arrays of a block bound their memory rather than
+those of every trace. Blocks are sized in bytes, as traces may hold a few
+samples or millions. Blocks may run on a thread pool, as NumPy releases the
+GIL within its kernels, with at most one block in flight per thread.
+"""
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import os
+from typing import Callable, Iterable, Iterator, Set, TypeVar
+
+T = TypeVar("T")
+
+#: Size of the samples of a block, in double precision as nodes compute in it
+BLOCK_BYTES = 32 << 20
+
+
+def block_size(n_samples: int) -> int:
+    """Traces per block, for traces of ``n_samples`` samples"""
+    return max(1, BLOCK_BYTES // (8 * max(1, n_samples)))
+
+
+def thread_count(workers) -> int:
+    """Threads for the value of a ``workers`` control, 0 meaning one per CPU"""
+    return int(workers) or os.cpu_count() or 1
+
+
+def map_blocks(
+    function: Callable[[int], T], starts: Iterable[int], workers: int
+) -> Iterator[T]:
+    """Calls ``function`` with the first trace of each block, on ``workers``
+    threads, yielding the results as blocks complete, in any order.
+    """
+    starts = list(starts)
+    if workers <= 1 or len(starts) <= 1:
+        for start in starts:
+            yield function(start)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: Set[Future] = set()
+        for start in starts:
+            if len(pending) == workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(function, start))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -1,4 +1,5 @@
 from .file_node import FileNode
 from .trace_file import TraceFileNode
+from .trace_directory import TraceDirectoryNode
 from .plaintext_file import PlaintextFileNode
 from .ciphertext_file import CiphertextFileNode
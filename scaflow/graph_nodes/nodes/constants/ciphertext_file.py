@@ -13,7 +13,7 @@ class CiphertextFileNode(FileNode):
     @classmethod
     def create_node(cls):
         c = cls()
-        output = Output("ciphertext", "File")
+        output = Output("ciphertext", "File", return_type="str")
         c.add_output(output)
         c.add_control(FileControl("file_control", "File Path"))
         return c
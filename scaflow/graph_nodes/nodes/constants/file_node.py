@@ -1,8 +1,10 @@
+import os
 from typing import Dict, List, Type
 
 from scaflow.model.node import Node
 from scaflow.model.output_socket import Output
 from scaflow.graph_nodes.controls import FileControl
+from scaflow.graph_nodes.nodes.trace_nodes.shards import shard_files
 from scaflow.model.dispatcher import dispatcher
 
 
@@ -24,3 +26,25 @@ class FileNode(Node):
 
     def execute(self, kwargs) -> Dict[str, any]:
         return self.controls["file_control"]._data["filename"]
+
+    def fingerprint(self) -> Dict[str, any]:
+        """Controls and the modification time and size of the file. For a
+        directory or glob pattern, those of every shard read from it.
+        """
+        data = super().fingerprint()
+        filename = self.controls["file_control"]._data.get("filename")
+        if not filename:
+            return data
+        if os.path.isfile(filename):
+            stat = os.stat(filename)
+            data["file_stat"] = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+            return data
+        try:
+            files = shard_files(filename)
+        except FileNotFoundError:
+            return data
+        data["shard_stats"] = {}
+        for path in files:
+            stat = path.stat()
+            data["shard_stats"][str(path)] = [stat.st_mtime_ns, stat.st_size]
+        return data
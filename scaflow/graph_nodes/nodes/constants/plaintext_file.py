@@ -14,7 +14,7 @@ class PlaintextFileNode(FileNode):
     @classmethod
     def create_node(cls):
         c = cls()
-        output = Output("plaintext", "File")
+        output = Output("plaintext", "File", return_type="str")
         c.add_output(output)
         c.add_control(FileControl("file_control", "File Path"))
         return c
@@ -0,0 +1,22 @@
+from scaflow.graph_nodes.controls import FileControl
+from scaflow.model import ControlType
+from scaflow.model.output_socket import Output
+from scaflow.model.dispatcher import dispatcher
+from .file_node import FileNode
+
+
+@dispatcher
+class TraceDirectoryNode(FileNode):
+    display_name = "Trace Directory"
+    output_type = "file"
+
+    @classmethod
+    def create_node(cls):
+        c = cls()
+        c.add_output(Output("filename", "Directory", return_type="str"))
+        c.add_control(
+            FileControl(
+                "file_control", "Directory", control_type=ControlType.DirectoryPath
+            )
+        )
+        return c
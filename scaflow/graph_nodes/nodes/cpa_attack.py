@@ -1,5 +1,13 @@
+import collections
+import copy
+import hashlib
 import logging
-from typing import Any, Callable, Dict, Type
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
 from estraces import TraceHeaderSet
 import numpy as np
@@ -7,17 +15,251 @@ import scared
 from scared import Model
 from scared.selection_functions import SelectionFunction
 
-from scaflow.model import Input, Node, Output, dispatcher
+from scaflow.engine.shared_memory import SharedArray
+from scaflow.graph_nodes.controls import BooleanControl, NumberControl
+from scaflow.model import GraphEvent, Input, Node, Output, dispatcher
 
 logger = logging.getLogger(__name__)
 
 
+class CPAAccumulator:
+    """Sums over traces from which CPA computes its correlations.
+
+    Intermediate values have one row per trace, then a guess and a word axis.
+    The sums are kept here rather than in a scared distinguisher so that
+    shards of an attack can be added, joined and saved without relying on
+    scared internals.
+
+    Args:
+        precision: Type of the sums, single precision like scared by default
+    """
+
+    def __init__(self, precision=np.float32):
+        self.precision = np.dtype(precision)
+        self.count = 0
+        #: Sums of the samples and of their squares, by sample
+        self.ex: Optional[np.ndarray] = None
+        self.ex2: Optional[np.ndarray] = None
+        #: Sums of the intermediate values and of their squares, by guess and word
+        self.ey: Optional[np.ndarray] = None
+        self.ey2: Optional[np.ndarray] = None
+        #: Sums of products of intermediate values and samples, by guess, word
+        #: and sample
+        self.exy: Optional[np.ndarray] = None
+
+    def update(self, samples: np.ndarray, intermediate: np.ndarray):
+        """Adds traces, one per row, and their intermediate values"""
+        samples = np.asarray(samples, dtype=self.precision)
+        data = np.asarray(intermediate, dtype=self.precision)
+        if self.count == 0:
+            self._allocate(data.shape[1:], samples.shape[1])
+        elif samples.shape[1] != self.ex.shape[0]:
+            raise ValueError(
+                f"Traces have {samples.shape[1]} samples, not {self.ex.shape[0]}"
+            )
+        self.count += len(samples)
+        self.ex += samples.sum(axis=0)
+        self.ex2 += np.square(samples).sum(axis=0)
+        self.ey += data.sum(axis=0)
+        self.ey2 += np.square(data).sum(axis=0)
+        flat = data.reshape(len(data), -1)
+        self.exy += (flat.T @ samples).reshape(self.exy.shape)
+
+    def _allocate(self, data_shape: Tuple[int, ...], n_samples: int):
+        self.ex = np.zeros(n_samples, dtype=self.precision)
+        self.ex2 = np.zeros(n_samples, dtype=self.precision)
+        self.ey = np.zeros(data_shape, dtype=self.precision)
+        self.ey2 = np.zeros(data_shape, dtype=self.precision)
+        self.exy = np.zeros(data_shape + (n_samples,), dtype=self.precision)
+
+    def add(self, other: "CPAAccumulator"):
+        """Adds the sums over other traces, for the same guesses and words"""
+        if not other.count:
+            return
+        if not self.count:
+            self._allocate(other.ey.shape, len(other.ex))
+        for key in ACCUMULATORS:
+            getattr(self, key)[...] += getattr(other, key)
+        self.count += other.count
+
+    @classmethod
+    def join_words(cls, parts: List["CPAAccumulator"]) -> "CPAAccumulator":
+        """Sums over the same traces for consecutive groups of words"""
+        if len(parts) == 1:
+            return parts[0]
+        joined = cls(parts[0].precision)
+        joined.count = parts[0].count
+        joined.ex, joined.ex2 = parts[0].ex, parts[0].ex2
+        for key in ("ey", "ey2", "exy"):
+            setattr(
+                joined,
+                key,
+                np.concatenate([getattr(part, key) for part in parts], axis=1),
+            )
+        return joined
+
+    def correlation(self) -> np.ndarray:
+        """Pearson correlation by guess, word and sample"""
+        if not self.count:
+            raise ValueError("No traces were accumulated")
+        n = self.count
+        ex, ey = self.ex.astype(np.float64) / n, self.ey.astype(np.float64) / n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sigma_x = np.sqrt(self.ex2 / n - ex**2)
+            sigma_y = np.sqrt(self.ey2 / n - ey**2)
+            result = (self.exy / n - ey[..., None] * ex) / (
+                sigma_y[..., None] * sigma_x
+            )
+        result[~np.isfinite(result)] = np.nan
+        return result.astype(self.precision)
+
+
+ACCUMULATORS = ("ex", "ex2", "ey", "ey2", "exy")  #: Sums of :class:`CPAAccumulator`
+
+
+class _Attack:
+    """Selection function, model and discriminant of an attack, with its sums"""
+
+    def __init__(self, kwargs, precision=np.float32):
+        self.selection_class: type = kwargs.get("selection")
+        self.selection_function: SelectionFunction = self.selection_class()
+        self.model: Model = kwargs.get("model")()
+        self.discriminant: Callable[[np.ndarray], np.ndarray] = kwargs.get(
+            "discriminant"
+        )
+        self.sums = CPAAccumulator(precision)
+        #: Scores of every key guess, as of the last :meth:`compute_results`
+        self.scores: Optional[np.ndarray] = None
+        self._scored_traces = 0
+        #: Traces processed from each source, by digest of its first trace
+        self.sources: Dict[str, int] = {}
+        #: Digest of the traces being processed, with a state file
+        self.source: Optional[str] = None
+        #: What the sums depend on besides the traces, see :func:`_identity`
+        self.identity: Dict[str, np.ndarray] = {}
+
+    def add(self, sums: CPAAccumulator):
+        self.sums.add(sums)
+        if self.source is not None:
+            self.sources[self.source] += sums.count
+
+    @property
+    def processed_traces(self) -> int:
+        return self.sums.count
+
+    def process(self, traces: TraceHeaderSet):
+        self.sums.update(
+            traces.samples[:],
+            _intermediate(self.selection_function, self.model, _metadata(traces)),
+        )
+        if self.source is not None:
+            self.sources[self.source] += len(traces)
+
+    def compute_results(self):
+        """Scores the traces processed so far, unless they already are"""
+        if self.scores is None or self._scored_traces != self.processed_traces:
+            self.scores = self.discriminant(self.sums.correlation())
+            self._scored_traces = self.processed_traces
+
+
+class _Round:
+    """Shards of a round of traces being accumulated in the process pool"""
+
+    def __init__(self, samples: SharedArray, futures: List[List[Future]]):
+        self._samples: Optional[SharedArray] = samples
+        #: Futures by group of words, then by block of traces
+        self._futures = futures
+
+    def result(self) -> CPAAccumulator:
+        """Waits for the shards, adding the blocks and joining the words"""
+        try:
+            shards = [[f.result() for f in blocks] for blocks in self._futures]
+        finally:
+            self._release()
+        groups = []
+        for blocks in shards:
+            total = CPAAccumulator(blocks[0].precision)
+            for block in blocks:
+                total.add(block)
+            groups.append(total)
+        return CPAAccumulator.join_words(groups)
+
+    def cancel(self):
+        for blocks in self._futures:
+            for f in blocks:
+                f.cancel()
+        self._release()
+
+    def _release(self):
+        if self._samples is not None:
+            self._samples.release()
+            self._samples = None
+
+
 @dispatcher
 class CPAAttackNode(Node):
+    """Correlation power analysis, folding traces into the attack by batches.
+
+    After each batch ``progressEvent`` is called with the number of traces
+    processed and the total, ``None`` when streaming, and :attr:`scores` and
+    :attr:`best_guess` give the scores reached so far. They are only computed
+    when read, at checkpoints and at the end. :meth:`stop` ends the attack
+    after the current batch, reporting the scores reached so far. As these
+    live on the node, the attack runs in the engine's process, parallelised by
+    its own ``processes`` instead.
+
+    Every ``checkpoint_step`` traces, and after the last one, the scores are
+    kept to output the convergence of the attack in the same pass: the rank
+    of each correct key byte and its score against the number of traces. The
+    correct key is the ``key`` metadata of the traces if they have one, the
+    recovered key otherwise. A rank of 0 means the key byte is found.
+
+    With several ``processes``, each round of traces is placed once in shared
+    memory and sharded into ``byte_shards`` groups of key bytes times blocks
+    of ``batch_size`` traces, accumulated in a process pool kept between
+    attacks. The next round is shared while the current one is accumulated.
+    The CPA sums are over traces, so the shards are merged exactly by adding
+    the blocks and concatenating the key bytes.
+
+    Given a state file, the accumulators are saved to it every ``save_every``
+    seconds, at the end of the attack and when it stops early, along with the
+    number of traces taken from each source, told apart by a digest
+    of their first trace. An attack starts from the saved accumulators and
+    skips the traces the state holds of its source, so running it again
+    continues an interrupted attack, or only adds the traces the source has
+    gained. Traces of another source are only added with ``append``. A state
+    saved by an attack with another selection function, words, guesses,
+    model, trace length or precision is refused.
+    """
+
     display_name = "CPA Attack"
+    stream_sink = True
 
     def __init__(self, name=None):
         super().__init__(name if name else self.display_name)
+        self._attack: Optional[_Attack] = None
+        #: Attack running, or the last one run, of which scores are published
+        self._current: Optional[_Attack] = None
+        #: Metadata of the first trace of each batch, to check the key against
+        self._checked_rows: List[Dict[str, np.ndarray]] = []
+        self._stop_requested = False
+        #: Trace counts and scores at each convergence checkpoint
+        self._checkpoints: List[Tuple[int, np.ndarray]] = []
+        self._pool: Optional[Executor] = None
+        self._state_file: Optional[str] = None
+        #: When the state was last saved, and with how many traces
+        self._saved_at = 0.0
+        self._saved_traces = 0
+        #: Traces still to skip as they are already in the loaded state
+        self._skip = 0
+        self.progressEvent = GraphEvent(self)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["progressEvent"] = GraphEvent(self)
+        state["_pool"] = None
+        state["_current"] = None
+        return state
 
     @classmethod
     def create_node(cls):
@@ -34,33 +276,440 @@ class CPAAttackNode(Node):
         n.add_input(
             Input("discriminant", "Discriminant", accepted_types=["discriminant"])
         )
-        n.add_output(Output("output", "Data", return_type="bool"))
+        n.add_input(Input("filename", "State file", accepted_types=["str"]))
+        n.add_output(Output("scores", "Scores", return_type="ndarray"))
+        n.add_output(Output("key", "Key", return_type="ndarray"))
+        n.add_output(Output("trace_counts", "Trace counts", return_type="ndarray"))
+        n.add_output(Output("key_ranks", "Key ranks", return_type="ndarray"))
+        n.add_output(Output("key_scores", "Key scores", return_type="ndarray"))
+        n.add_control(NumberControl("batch_size", "Traces per batch", value=5000))
+        n.add_control(
+            NumberControl("checkpoint_step", "Checkpoint every (0: end only)", value=0)
+        )
+        n.add_control(NumberControl("processes", "Processes (0: all)", value=1))
+        n.add_control(NumberControl("byte_shards", "Key byte shards", value=1))
+        n.add_control(
+            BooleanControl("append", "Add other traces to state", value=False)
+        )
+        n.add_control(NumberControl("save_every", "Save state every (s)", value=60))
         return n
 
+    def _processes(self) -> int:
+        return int(self.control_value("processes", 1)) or os.cpu_count() or 1
+
+    @property
+    def scores(self) -> Optional[np.ndarray]:
+        """Scores of every key guess for the traces processed so far"""
+        att = self._current
+        if att is None or not att.processed_traces:
+            return None
+        att.compute_results()
+        return att.scores
+
+    @property
+    def best_guess(self) -> Optional[np.ndarray]:
+        """Best key guess for the traces processed so far"""
+        scores = self.scores
+        return None if scores is None else np.argmax(scores, axis=0).astype("uint8")
+
+    def _byte_shards(self) -> int:
+        return max(1, int(self.control_value("byte_shards", 1)))
+
+    def _create_pool(self) -> Optional[Executor]:
+        """Pool of the worker processes, ``None`` to attack in this process"""
+        if self._processes() <= 1:
+            return None
+        return _process_pool(self._processes())
+
+    def stop(self):
+        """Ends the running attack once the current batch is processed"""
+        self._stop_requested = True
+
+    def _fold(self, att: _Attack, traces: TraceHeaderSet, total: Optional[int]):
+        """Processes traces batch by batch, publishing the scores after each.
+
+        Batches are cut short at checkpoints, to snapshot the scores there.
+        """
+        if self._skip:
+            skipped = min(self._skip, len(traces))
+            traces = traces[skipped:]
+            self._skip -= skipped
+        batch_size = int(self.control_value("batch_size", 5000))
+        step = int(self.control_value("checkpoint_step", 0))
+        if self._pool is None:
+            for start, stop in _cuts(
+                att.processed_traces, len(traces), batch_size, step
+            ):
+                if self._stop_requested:
+                    return
+                att.process(traces[start:stop])
+                self._publish(att, total)
+            return
+
+        # Rounds of one batch per block of traces in each group of words
+        n_blocks = max(1, self._processes() // self._byte_shards())
+        cuts = _cuts(att.processed_traces, len(traces), batch_size * n_blocks, step)
+        pending: Deque[_Round] = collections.deque()
+        try:
+            for start, stop in cuts:
+                if self._stop_requested:
+                    return
+                pending.append(self._submit(att, traces[start:stop], n_blocks))
+                if len(pending) > 1:
+                    att.add(pending.popleft().result())
+                    self._publish(att, total)
+            while pending and not self._stop_requested:
+                att.add(pending.popleft().result())
+                self._publish(att, total)
+        finally:
+            for round_ in pending:
+                round_.cancel()
+
+    def _save(self, att: Optional[_Attack], force: bool = False):
+        """Saves the state if it changed, at most every ``save_every`` seconds
+        unless forced
+        """
+        if not self._state_file or att is None:
+            return
+        if att.processed_traces == self._saved_traces:
+            return
+        interval = float(self.control_value("save_every", 60))
+        if not force and time.monotonic() - self._saved_at < interval:
+            return
+        _save_state(att, self._state_file)
+        self._saved_at = time.monotonic()
+        self._saved_traces = att.processed_traces
+
+    def _publish(self, att: _Attack, total: Optional[int]):
+        """Saves the state when due and reports progress after a batch"""
+        self._save(att)
+        step = int(self.control_value("checkpoint_step", 0))
+        if step and att.processed_traces % step == 0:
+            att.compute_results()
+            self._checkpoints.append((att.processed_traces, att.scores.copy()))
+        logger.info("Processed %d traces", att.processed_traces)
+        self.progressEvent(att.processed_traces, total)
+
+    def _submit(self, att: _Attack, traces: TraceHeaderSet, n_blocks: int) -> _Round:
+        """Shares the samples of a round once, and accumulates its shards in the
+        process pool from row ranges of them
+        """
+        metadata = _metadata(traces)
+        blocks = [
+            (b[0], b[-1] + 1)
+            for b in np.array_split(np.arange(len(traces)), n_blocks)
+            if len(b)
+        ]
+        samples = SharedArray(np.asarray(traces.samples[:]))
+        futures = []
+        try:
+            for selection_function in _word_shards(
+                att.selection_function, metadata, self._byte_shards()
+            ):
+                futures.append(
+                    [
+                        self._pool.submit(
+                            _accumulate,
+                            samples,
+                            (a, b),
+                            {key: value[a:b] for key, value in metadata.items()},
+                            selection_function,
+                            att.model,
+                            att.sums.precision,
+                        )
+                        for a, b in blocks
+                    ]
+                )
+        except BaseException:
+            _Round(samples, futures).cancel()
+            raise
+        return _Round(samples, futures)
+
+    def _open_state(self, att: _Attack, traces: TraceHeaderSet, kwargs):
+        """Loads the state file given to the attack, if it exists yet, and
+        skips the traces it holds of the given ones
+        """
+        self._state_file = kwargs.get("filename") or None
+        self._skip = 0
+        self._saved_at = time.monotonic()
+        self._saved_traces = 0
+        if not self._state_file or not len(traces):
+            return
+        att.source = _digest(traces)
+        att.identity = _identity(att, traces)
+        if os.path.exists(self._state_file):
+            _load_state(att, self._state_file)
+            self._saved_traces = att.processed_traces
+            logger.info(
+                "Loaded %d traces from '%s'", att.processed_traces, self._state_file
+            )
+        if att.source in att.sources:
+            self._skip = att.sources[att.source]
+        elif att.sources and not self.control_value("append", False):
+            raise ValueError(
+                f"'{self._state_file}' holds the state of an attack on other "
+                "traces, enable 'append' to add these to it"
+            )
+        else:
+            att.sources[att.source] = 0
+
     def execute(self, kwargs) -> Dict[str, any]:
         traces: TraceHeaderSet = kwargs.get("traces")
-        selection = kwargs.get("selection")
-        model: Type[Model] = kwargs.get("model")
-        discriminant = kwargs.get("discriminant")
-        att = scared.CPAAttack(
-            selection_function=selection(),
-            model=model(),
-            discriminant=discriminant,
-        )
-        container = scared.Container(traces)
-        att.run(container)
+        att = self._current = _Attack(kwargs)
+        self._stop_requested = False
+        self._checkpoints = []
+        self._open_state(att, traces, kwargs)
+        total = att.processed_traces + max(0, len(traces) - self._skip)
+        self._pool = self._create_pool()
+        try:
+            self._fold(att, traces, total)
+        finally:
+            self._pool = None
+            self._save(att, force=True)
+        return self._report(att, _checked(traces))
 
+    def begin_stream(self):
+        self._attack = None
+        self._checked_rows = []
+        self._stop_requested = False
+        self._checkpoints = []
+        self._pool = self._create_pool()
+
+    def consume_batch(self, kwargs):
+        traces: TraceHeaderSet = kwargs.get("traces")
+        if self._attack is None:
+            self._attack = self._current = _Attack(kwargs)
+            self._open_state(self._attack, traces, kwargs)
+        self._fold(self._attack, traces, None)
+        self._checked_rows.append(_checked(traces[:1]))
+
+    def end_stream(self) -> Dict[str, any]:
+        att, rows = self._attack, self._checked_rows
+        self._attack, self._checked_rows = None, []
+        self._pool = None
+        self._save(att, force=True)
+        # Batches are not kept, so the key is checked against their first traces
+        checked = {
+            key: np.concatenate([row[key] for row in rows])
+            for key in (rows[0] if rows else {})
+        }
+        return self._report(att, checked)
+
+    def abort_stream(self):
+        att, self._attack, self._checked_rows = self._attack, None, []
+        self._pool = None
+        self._save(att, force=True)
+
+    def _report(
+        self, att: Optional[_Attack], checked: Dict[str, np.ndarray]
+    ) -> Dict[str, any]:
+        """Results of an attack, checking the recovered key against the
+        ``plaintext``, ``ciphertext`` and ``key`` metadata in ``checked``
+        """
+        if att is None or not att.processed_traces:
+            raise ValueError("No traces were processed")
+        att.compute_results()
         recovered_masterkey = np.argmax(att.scores, axis=0).astype("uint8")
-        logger.info(
-            "Recovered key: %s",
-            "".join([format(key_byte, "02X") for key_byte in recovered_masterkey]),
-        )
+        logger.info("Recovered key: %s", _hex(recovered_masterkey))
+
+        if "plaintext" in checked and "ciphertext" in checked:
+            recomputed_ciphertexts = scared.aes.encrypt(
+                checked["plaintext"], recovered_masterkey
+            )
+            logger.info(
+                "Recomputed ciphertexts equal: %s",
+                np.array_equal(recomputed_ciphertexts, checked["ciphertext"]),
+            )
+
+        if not self._checkpoints or self._checkpoints[-1][0] != att.processed_traces:
+            self._checkpoints.append((att.processed_traces, att.scores))
+        if "key" in checked:
+            correct_key = checked["key"][0]
+        else:
+            correct_key = recovered_masterkey
+        trace_counts, ranks, key_scores = _convergence(self._checkpoints, correct_key)
+        self._checkpoints = []
+        return {
+            "scores": att.scores,
+            "key": recovered_masterkey,
+            "trace_counts": trace_counts,
+            "key_ranks": ranks,
+            "key_scores": key_scores,
+        }
+
+
+_POOL_LOCK = threading.Lock()
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_SIZE = 0
+
+
+def _process_pool(size: int) -> ProcessPoolExecutor:
+    """Worker processes of the attacks, kept between them as spawning is slow"""
+    global _POOL, _POOL_SIZE
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_SIZE != size:
+            if _POOL is not None:
+                # Work already submitted by another attack still completes
+                _POOL.shutdown(wait=False)
+            # Spawned like the engine pool, as forking next to threads can deadlock
+            _POOL = ProcessPoolExecutor(
+                max_workers=size, mp_context=multiprocessing.get_context("spawn")
+            )
+            _POOL_SIZE = size
+        return _POOL
+
+
+def _cuts(
+    processed: int, n_traces: int, size: int, step: int
+) -> Iterator[Tuple[int, int]]:
+    """Ranges of at most ``size`` traces, cut short at every ``step`` traces
+    counted from the ``processed`` ones
+    """
+    start = 0
+    while start < n_traces:
+        stop = min(start + size, n_traces)
+        if step:
+            stop = min(stop, start + step - (processed + start) % step)
+        yield start, stop
+        start = stop
+
 
-        recomputed_ciphertexts = scared.aes.encrypt(
-            traces.plaintext, recovered_masterkey
+def _metadata(traces: TraceHeaderSet) -> Dict[str, np.ndarray]:
+    return {key: np.asarray(traces.metadatas[key]) for key in traces.metadatas.keys()}
+
+
+def _checked(traces: TraceHeaderSet) -> Dict[str, np.ndarray]:
+    """Metadata of the traces that the recovered key is checked against"""
+    return {
+        key: np.asarray(traces.metadatas[key])
+        for key in ("plaintext", "ciphertext", "key")
+        if key in traces.metadatas
+    }
+
+
+def _intermediate(
+    selection_function: SelectionFunction,
+    model: Model,
+    metadata: Dict[str, np.ndarray],
+) -> np.ndarray:
+    """Intermediate values by trace, guess and word"""
+    return model(selection_function(**metadata))
+
+
+def _accumulate(
+    samples: SharedArray,
+    rows: Tuple[int, int],
+    metadata: Dict[str, np.ndarray],
+    selection_function: SelectionFunction,
+    model: Model,
+    precision: np.dtype,
+) -> CPAAccumulator:
+    """CPA sums of a block of shared traces, computed in a worker process"""
+    # Selection functions keep the metadata of their last call, so blocks
+    # sharing a worker must not share one
+    selection_function = copy.deepcopy(selection_function)
+    sums = CPAAccumulator(precision)
+    sums.update(samples.read(*rows), _intermediate(selection_function, model, metadata))
+    return sums
+
+
+def _word_shards(
+    selection_function: SelectionFunction,
+    metadata: Dict[str, np.ndarray],
+    n_shards: int,
+) -> List[SelectionFunction]:
+    """Copies of a selection function, each computing a group of its words"""
+    if n_shards <= 1:
+        return [selection_function]
+    shards = []
+    for group in np.array_split(_words(selection_function, metadata), n_shards):
+        if len(group):
+            shard = copy.copy(selection_function)
+            shard.words = group
+            shards.append(shard)
+    return shards
+
+
+def _words(
+    selection_function: SelectionFunction, metadata: Dict[str, np.ndarray]
+) -> np.ndarray:
+    """Indices of the words a selection function computes"""
+    first = {key: value[:1] for key, value in metadata.items()}
+    everything = copy.deepcopy(selection_function)
+    everything.words = ...
+    return np.arange(everything(**first).shape[-1])[selection_function.words]
+
+
+def _qualified_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _identity(att: _Attack, traces: TraceHeaderSet) -> Dict[str, np.ndarray]:
+    """What the accumulators of an attack depend on, besides the traces"""
+    model = att.model
+    return {
+        "selection": np.array(_qualified_name(att.selection_class)),
+        "words": _words(att.selection_function, _metadata(traces[:1])),
+        "guesses": np.asarray(att.selection_function.guesses),
+        "model": np.array(
+            f"{_qualified_name(type(model))}{sorted(vars(model).items())!r}"
+        ),
+        "samples": np.array(len(traces.samples[0])),
+        "precision": np.array(att.sums.precision.str),
+    }
+
+
+def _digest(traces: TraceHeaderSet) -> str:
+    """Tells sources of traces apart by their first trace"""
+    digest = hashlib.sha256(np.ascontiguousarray(traces.samples[0]).tobytes())
+    for key in sorted(traces.metadatas.keys()):
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(traces.metadatas[key][0]).tobytes())
+    return digest.hexdigest()
+
+
+def _save_state(att: _Attack, filename: str):
+    """Saves the accumulators of an attack, replacing the file atomically"""
+    partial = f"{filename}.partial"
+    with open(partial, "wb") as f:
+        np.savez(
+            f,
+            processed_traces=att.processed_traces,
+            source_digests=np.array(list(att.sources)),
+            source_counts=np.array(list(att.sources.values()), dtype="int64"),
+            **att.identity,
+            **{key: getattr(att.sums, key) for key in ACCUMULATORS}
         )
-        logger.info(
-            "Recomputed ciphertexts equal: %s",
-            np.array_equal(recomputed_ciphertexts, traces.ciphertext),
+    os.replace(partial, filename)
+
+
+def _load_state(att: _Attack, filename: str):
+    """Restores the accumulators saved by :func:`_save_state` into an attack"""
+    with np.load(filename) as state:
+        for field, value in att.identity.items():
+            if field not in state.files or not np.array_equal(state[field], value):
+                raise ValueError(
+                    f"'{filename}' holds the state of a different attack, "
+                    f"by its {field}"
+                )
+        for key in ACCUMULATORS:
+            setattr(att.sums, key, state[key].astype(att.sums.precision))
+        att.sums.count = int(state["processed_traces"])
+        att.sources = dict(
+            zip(state["source_digests"].tolist(), state["source_counts"].tolist())
         )
-        return {}
+
+
+def _convergence(
+    checkpoints: List[Tuple[int, np.ndarray]], key: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Trace counts, and the rank and score of each key byte at each of them"""
+    trace_counts = np.array([count for count, _ in checkpoints])
+    scores = np.stack([s for _, s in checkpoints])
+    key_scores = scores[:, key, np.arange(len(key))]
+    ranks = np.sum(scores > key_scores[:, None, :], axis=1)
+    return trace_counts, ranks, key_scores
+
+
+def _hex(key: np.ndarray) -> str:
+    return "".join([format(key_byte, "02X") for key_byte in key])
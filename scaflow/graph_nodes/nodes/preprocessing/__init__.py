@@ -1 +1,3 @@
 from .find_peaks import FindPeaksNode
+from .correlation_align import CorrelationAlignNode
+from .filters import DecimateNode, FrequencyFilterNode, MovingAverageNode
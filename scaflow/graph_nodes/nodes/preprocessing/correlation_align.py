@@ -0,0 +1,129 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+import estraces
+import numpy as np
+
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.graph_nodes.nodes import blocks
+from scaflow.model import Input, Node, Output, dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def correlation_shifts(
+    segments: np.ndarray, pattern: np.ndarray, max_before: int
+) -> np.ndarray:
+    """Lag of the best match of a pattern in each row, using FFTs.
+
+    Args:
+        segments: 2-D array, the rows searched for the pattern
+        pattern: Pattern with its mean removed, so the offset of each row
+            does not change the result
+        max_before: Lag of a row aligned with the pattern, i.e., how far the
+            pattern may match before it
+
+    Returns: Shift of each row relative to the pattern
+    """
+    width = segments.shape[1]
+    n_lags = width - len(pattern) + 1
+    # Long enough that negative lags do not wrap around onto the ones we keep
+    n_fft = 1 << (width + len(pattern) - 2).bit_length()
+    spectrum = np.fft.rfft(segments, n=n_fft, axis=1)
+    spectrum *= np.conj(np.fft.rfft(pattern, n=n_fft))
+    correlation = np.fft.irfft(spectrum, n=n_fft, axis=1)[:, :n_lags]
+    return np.argmax(correlation, axis=1) - max_before
+
+
+@dispatcher
+class CorrelationAlignNode(Node):
+    """Aligns traces to a pattern of the first trace by cross-correlation.
+
+    Traces are cropped to the samples every allowed shift covers. When
+    streaming, the pattern of the first trace of the first batch is kept for
+    the following batches.
+    """
+
+    display_name = "Align by Correlation"
+    process_safe = True
+    cacheable = True
+    stream_transform = True
+
+    def __init__(self, name=None):
+        super().__init__(name if name else self.display_name)
+        #: Reference pattern kept between batches while streaming
+        self._stream_pattern: Optional[np.ndarray] = None
+        self._streaming = False
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_output(Output("traces", "Aligned", return_type="TraceHeaderSet"))
+        n.add_output(Output("shifts", "Shifts", return_type="ndarray"))
+        n.add_control(NumberControl("pattern_start", "Pattern start", value=0))
+        n.add_control(NumberControl("pattern_stop", "Pattern stop (0: all)", value=0))
+        n.add_control(NumberControl("max_shift", "Max shift", value=50))
+        return n
+
+    def begin_stream(self):
+        self._stream_pattern = None
+        self._streaming = True
+
+    def end_stream(self):
+        self._stream_pattern = None
+        self._streaming = False
+
+    def _window(self, n_samples: int) -> Tuple[int, int, int, int]:
+        """Pattern bounds and the shifts allowed before and after them"""
+        start = int(self.control_value("pattern_start", 0))
+        stop = int(self.control_value("pattern_stop", 0)) or n_samples
+        if not 0 <= start < stop <= n_samples:
+            raise ValueError(
+                f"Pattern [{start}, {stop}) is not within the {n_samples} samples"
+            )
+        max_shift = int(self.control_value("max_shift", 50))
+        return start, stop, min(max_shift, start), min(max_shift, n_samples - stop)
+
+    def _pattern(self, traces, start: int, stop: int) -> np.ndarray:
+        if self._stream_pattern is not None:
+            return self._stream_pattern
+        pattern = np.asarray(traces.samples[0:1, start:stop], dtype=np.float64)[0]
+        pattern = pattern - pattern.mean()
+        if self._streaming:
+            self._stream_pattern = pattern
+        return pattern
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        traces = kwargs.get("traces")
+        n_traces = len(traces)
+        n_samples = traces._reader.get_trace_size(0) if n_traces else 0
+        if not n_traces:
+            return {"traces": traces, "shifts": np.empty(0, dtype=int)}
+        start, stop, before, after = self._window(n_samples)
+        pattern = self._pattern(traces, start, stop)
+
+        kept = np.arange(before, n_samples - after)
+        shifts = np.empty(n_traces, dtype=int)
+        aligned = None
+        size = blocks.block_size(n_samples)
+        for block_start in range(0, n_traces, size):
+            block = np.asarray(traces.samples[block_start : block_start + size])
+            if aligned is None:
+                aligned = np.empty((n_traces, len(kept)), dtype=block.dtype)
+            rows = slice(block_start, block_start + len(block))
+            segments = block[:, start - before : stop + after].astype(np.float64)
+            shifts[rows] = correlation_shifts(segments, pattern, before)
+            aligned[rows] = block[
+                np.arange(len(block))[:, None], kept + shifts[rows, None]
+            ]
+        logger.debug("Shifts: %s", shifts)
+
+        ths_aligned = estraces.read_ths_from_ram(
+            samples=aligned,
+            **{
+                key: np.asarray(traces.metadatas[key])
+                for key in traces.metadatas.keys()
+            },
+        )
+        return {"traces": ths_aligned, "shifts": shifts}
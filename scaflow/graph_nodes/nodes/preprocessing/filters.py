@@ -0,0 +1,148 @@
+"""Nodes filtering and downsampling the samples of each trace
+
+Every trace is processed on its own, so the nodes stream batches of traces
+without carrying state between them. Traces are processed in blocks written
+into a preallocated output.
+"""
+import abc
+import logging
+from typing import Dict
+
+import estraces
+import numpy as np
+
+from scaflow.graph_nodes.controls import BooleanControl, NumberControl
+from scaflow.graph_nodes.nodes import blocks
+from scaflow.model import Input, Node, Output, dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def _float_dtype(dtype: np.dtype) -> np.dtype:
+    """Floating point type of filtered samples, keeping single precision inputs"""
+    return dtype if dtype == np.float32 else np.dtype(np.float64)
+
+
+class SampleFilterNode(Node):
+    """Node applying :meth:`transform` to the samples of its input traces"""
+
+    process_safe = True
+    cacheable = True
+    stream_transform = True
+
+    def __init__(self, name=None):
+        super().__init__(name if name else self.display_name)
+
+    @classmethod
+    def _create(cls, output_name: str) -> "SampleFilterNode":
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_output(Output("traces", output_name, return_type="TraceHeaderSet"))
+        return n
+
+    @abc.abstractmethod
+    def transform(self, samples: np.ndarray) -> np.ndarray:
+        """Filters a block of traces, one trace per row"""
+        raise NotImplementedError
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        traces = kwargs.get("traces")
+        n_traces = len(traces)
+        filtered = None
+        size = blocks.block_size(traces._reader.get_trace_size(0) if n_traces else 0)
+        for start in range(0, n_traces, size):
+            block = self.transform(np.asarray(traces.samples[start : start + size]))
+            if filtered is None:
+                filtered = np.empty((n_traces,) + block.shape[1:], dtype=block.dtype)
+            filtered[start : start + len(block)] = block
+        if filtered is None:
+            filtered = np.empty((0, 0))
+
+        return estraces.read_ths_from_ram(
+            samples=filtered,
+            **{
+                key: np.asarray(traces.metadatas[key])
+                for key in traces.metadatas.keys()
+            },
+        )
+
+
+@dispatcher
+class MovingAverageNode(SampleFilterNode):
+    """Averages each window of ``window`` samples, keeping only full windows"""
+
+    display_name = "Moving Average"
+
+    @classmethod
+    def create_node(cls):
+        n = cls._create("Smoothed")
+        n.add_control(NumberControl("window", "Window", value=8))
+        return n
+
+    def transform(self, samples: np.ndarray) -> np.ndarray:
+        window = int(self.control_value("window", 8))
+        if not 0 < window <= samples.shape[1]:
+            raise ValueError(f"Window of {window} does not fit in the samples")
+        sums = np.zeros((len(samples), samples.shape[1] + 1))
+        np.cumsum(samples, axis=1, out=sums[:, 1:])
+        averages = (sums[:, window:] - sums[:, :-window]) / window
+        return averages.astype(_float_dtype(samples.dtype), copy=False)
+
+
+@dispatcher
+class FrequencyFilterNode(SampleFilterNode):
+    """Keeps the frequencies between two cutoffs, by zeroing FFT bins.
+
+    Cutoffs are fractions of the Nyquist frequency, half the sampling rate. A
+    low cutoff of 0 gives a low-pass filter, a high cutoff of 1 a high-pass.
+    """
+
+    display_name = "Frequency Filter"
+
+    @classmethod
+    def create_node(cls):
+        n = cls._create("Filtered")
+        n.add_control(NumberControl("low", "Low cutoff (x Nyquist)", value=0.0))
+        n.add_control(NumberControl("high", "High cutoff (x Nyquist)", value=0.5))
+        return n
+
+    def transform(self, samples: np.ndarray) -> np.ndarray:
+        low = float(self.control_value("low", 0.0))
+        high = float(self.control_value("high", 0.5))
+        if not 0 <= low < high:
+            raise ValueError(f"Invalid cutoffs: {low} to {high}")
+        n_samples = samples.shape[1]
+        frequencies = np.fft.rfftfreq(n_samples) * 2
+        spectrum = np.fft.rfft(samples, axis=1)
+        spectrum[:, (frequencies < low) | (frequencies > high)] = 0
+        filtered = np.fft.irfft(spectrum, n=n_samples, axis=1)
+        return filtered.astype(_float_dtype(samples.dtype), copy=False)
+
+
+@dispatcher
+class DecimateNode(SampleFilterNode):
+    """Downsamples traces by ``factor``.
+
+    By default each group of ``factor`` samples is averaged, integrating the
+    signal and filtering out what would alias. Otherwise only the first
+    sample of each group is kept.
+    """
+
+    display_name = "Decimate"
+
+    @classmethod
+    def create_node(cls):
+        n = cls._create("Decimated")
+        n.add_control(NumberControl("factor", "Factor", value=4))
+        n.add_control(BooleanControl("average", "Average groups", value=True))
+        return n
+
+    def transform(self, samples: np.ndarray) -> np.ndarray:
+        factor = int(self.control_value("factor", 4))
+        if factor < 1:
+            raise ValueError(f"Invalid decimation factor: {factor}")
+        if not self.control_value("average", True):
+            return samples[:, ::factor]
+        n_groups = samples.shape[1] // factor
+        groups = samples[:, : n_groups * factor].reshape(len(samples), n_groups, factor)
+        return groups.mean(axis=2, dtype=_float_dtype(samples.dtype))
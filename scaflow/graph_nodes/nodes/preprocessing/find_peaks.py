@@ -3,16 +3,54 @@ from typing import Dict
 
 import estraces
 import numpy as np
-from scared.signal_processing import find_peaks
 
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.graph_nodes.nodes import blocks
 from scaflow.model import Input, Node, Output, dispatcher
 
 logger = logging.getLogger(__name__)
 
 
+def first_peaks(data: np.ndarray, min_distance: int, min_height: float) -> np.ndarray:
+    """Index of the first peak of each row, as found by ``scared.find_peaks``.
+
+    A peak is a local maximum of at least ``min_height``, higher than the
+    maxima before it and at least as high as those after it, within
+    ``min_distance`` samples, so the first of equally high maxima, e.g., of
+    a plateau, is the peak as with scared. Unlike scared, which compares the
+    maxima following a dropped maximum within the first ``min_distance``
+    samples with the last sample of the signal, maxima are only compared
+    with other maxima.
+
+    Args:
+        data: 2-D array, one signal per row
+        min_distance: Minimum distance between two peaks
+        min_height: Minimum value of a peak
+
+    Returns: Index of the first peak of each row, -1 for rows without any
+    """
+    rising = np.ones(data.shape, dtype=bool)
+    rising[:, 1:] = data[:, 1:] >= data[:, :-1]
+    falling = np.ones(data.shape, dtype=bool)
+    falling[:, :-1] = data[:, :-1] >= data[:, 1:]
+    maxima = rising & falling & (data >= min_height)
+
+    heights = np.where(maxima, data, -np.inf)
+    earlier = np.full(data.shape, -np.inf)
+    later = np.full(data.shape, -np.inf)
+    for shift in range(1, min(min_distance, data.shape[1])):
+        np.maximum(earlier[:, shift:], heights[:, :-shift], out=earlier[:, shift:])
+        np.maximum(later[:, :-shift], heights[:, shift:], out=later[:, :-shift])
+    peaks = maxima & (data > earlier) & (data >= later)
+    return np.where(peaks.any(axis=1), peaks.argmax(axis=1), -1)
+
+
 @dispatcher
 class FindPeaksNode(Node):
     display_name = "Synchronise Peaks"
+    process_safe = True
+    cacheable = True
+    stream_transform = True
 
     def __init__(self, name=None):
         super().__init__(name if name else self.display_name)
@@ -20,30 +58,62 @@ class FindPeaksNode(Node):
     @classmethod
     def create_node(cls):
         n = cls()
-        n.add_input(Input("traces", "Traces"))
-        n.add_output(Output("peaks", "Synced Peaks"))
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_output(Output("traces", "Synced Peaks", return_type="TraceHeaderSet"))
+        n.add_control(NumberControl("before", "Samples before peak", value=500))
+        n.add_control(NumberControl("after", "Samples after peak", value=2000))
+        n.add_control(NumberControl("min_distance", "Min peak distance", value=5))
+        n.add_control(NumberControl("min_height", "Min peak height", value=0.10))
+        n.add_control(NumberControl("workers", "Threads (0: one per CPU)", value=0))
         return n
 
+    def _resync_block(self, traces, start: int, size: int, out: np.ndarray):
+        """Resynchronises the block of traces starting at ``start`` into ``out``"""
+        before = int(self.control_value("before", 500))
+        after = int(self.control_value("after", 2000))
+        block = np.asarray(traces.samples[start : start + size])
+        # Peaks are found on the negated traces, i.e., these are minima
+        peaks = first_peaks(
+            np.negative(block, dtype=np.float64),
+            int(self.control_value("min_distance", 5)),
+            float(self.control_value("min_height", 0.10)),
+        )
+        if (peaks < 0).any():
+            i = int(np.argmax(peaks < 0))
+            raise ValueError(f"No peak found in trace {start + i}")
+        invalid = (peaks < before) | (peaks + after > block.shape[1])
+        if invalid.any():
+            i = int(np.argmax(invalid))
+            raise ValueError(
+                f"Window around peak {peaks[i]} of trace {start + i} does not "
+                f"fit in its {block.shape[1]} samples"
+            )
+        rows = np.arange(len(block))[:, None]
+        window = np.arange(-before, after)
+        out[start : start + len(block)] = block[rows, peaks[:, None] + window]
+
     def execute(self, kwargs) -> Dict[str, any]:
         traces = kwargs.get("traces")
-        # traces = input_data.get("traces")
-        # logger.debug("Input to node: %s", traces)
-
-        traces_resync = []
-
-        traces_desync = traces.samples[:]
-
-        for trace_desync in traces_desync:
-            peaks = find_peaks(-trace_desync, min_peak_distance=5, min_peak_height=0.10)
-            peak_index = peaks[0]
-
-            trace_resync = trace_desync[peak_index - 500 : peak_index + 2000]
-            trace_resync = np.reshape(trace_resync, (1, trace_resync.size))
-            traces_resync.append(trace_resync)
+        width = int(self.control_value("before", 500)) + int(
+            self.control_value("after", 2000)
+        )
+        n_traces = len(traces)
+        first = traces.samples[0:1] if n_traces else np.empty((0, 0))
+        # Every block writes its own rows, so blocks can run in any order
+        traces_resync = np.empty((n_traces, width), dtype=first.dtype)
+        size = blocks.block_size(first.shape[1])
+        for _ in blocks.map_blocks(
+            lambda start: self._resync_block(traces, start, size, traces_resync),
+            range(0, n_traces, size),
+            blocks.thread_count(self.control_value("workers", 0)),
+        ):
+            pass
 
-        traces_resync = np.concatenate(traces_resync, axis=0)
         ths_resync = estraces.read_ths_from_ram(
             samples=traces_resync,
-            **{"plaintext": traces.plaintext, "ciphertext": traces.ciphertext}
+            **{
+                key: np.asarray(traces.metadatas[key])
+                for key in traces.metadatas.keys()
+            },
         )
         return ths_resync
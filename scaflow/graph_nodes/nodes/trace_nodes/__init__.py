@@ -1,2 +1,5 @@
 from .ets_trace_node import ETSTraceNode
 from .npy_trace_node import NpyTraceNode
+from .store_trace_node import StoreTraceNode, StoreWriterNode
+from .select_traces_node import SelectTracesNode
+from .sharded_trace_node import ShardedTraceNode
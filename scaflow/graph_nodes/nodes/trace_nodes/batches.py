@@ -0,0 +1,101 @@
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+import estraces
+from estraces import TraceHeaderSet
+import numpy as np
+
+T = TypeVar("T")
+
+
+def iter_ths_batches(ths: TraceHeaderSet, batch_size: int) -> Iterator[TraceHeaderSet]:
+    """Splits a trace header set into in-memory batches.
+
+    Args:
+        ths: Trace header set, only read one batch at a time
+        batch_size: Maximum number of traces per batch
+
+    Returns: Iterator of trace header sets held in RAM, with the headers of ``ths``
+    """
+    headers = dict(ths.headers)
+    for start in range(0, len(ths), batch_size):
+        batch = ths[start : start + batch_size]
+        yield estraces.read_ths_from_ram(
+            samples=batch.samples[:],
+            headers=headers,
+            **{key: np.asarray(batch.metadatas[key]) for key in batch.metadatas.keys()}
+        )
+
+
+def prefetch(items: Iterable[T], depth: int = 1) -> Iterator[T]:
+    """Produces items on a background thread, ahead of the consumer.
+
+    Reading the next batch from disk then overlaps with processing the current
+    one. Exceptions raised while producing are re-raised to the consumer.
+
+    Args:
+        items: Items to produce, e.g., batches read from a file
+        depth: Number of items read ahead, 0 produces them on the calling thread
+
+    Returns: Iterator of the same items, in order
+    """
+    if depth <= 0:
+        yield from items
+        return
+
+    ready: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                ready.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = ready.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def select_ths(ths: TraceHeaderSet, traces: slice, samples: slice) -> TraceHeaderSet:
+    """Reads a window of a trace header set into RAM.
+
+    Lazy trace header sets, e.g., read from ETS files or trace stores, only
+    read the samples inside the window from disk.
+
+    Args:
+        ths: Trace header set to select from
+        traces: Traces to keep
+        samples: Samples of each trace to keep
+
+    Returns: Trace header set held in RAM
+    """
+    subset = ths[traces]
+    return estraces.read_ths_from_ram(
+        samples=subset.samples[:, samples],
+        **{key: np.asarray(subset.metadatas[key]) for key in subset.metadatas.keys()}
+    )
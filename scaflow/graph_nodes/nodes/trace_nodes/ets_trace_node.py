@@ -5,10 +5,12 @@ from typing import Dict, List, Type
 from estraces import TraceHeaderSet
 import scared
 
+from scaflow.graph_nodes.controls import NumberControl
 from scaflow.model.dispatcher import dispatcher
 from scaflow.model.input_socket import Input
 from scaflow.model.output_socket import Output
 from scaflow.model.node import Node
+from .batches import iter_ths_batches, prefetch, select_ths
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,8 @@ logger = logging.getLogger(__name__)
 class ETSTraceNode(Node):
 
     display_name = "ETS Trace Input"
+    stream_source = True
+    selectable = True
 
     def __init__(self, name="Trace Input"):
         super().__init__(name)
@@ -26,6 +30,8 @@ class ETSTraceNode(Node):
         n = cls()
         n.add_input(Input("filename", "Trace File", accepted_types=["str"]))
         n.add_output(Output("traces", "Output", return_type="TraceHeaderSet"))
+        n.add_control(NumberControl("read_size", "Traces per read", value=10000))
+        n.add_control(NumberControl("prefetch", "Reads ahead", value=2))
         return n
 
     def execute(self, kwargs):
@@ -37,3 +43,15 @@ class ETSTraceNode(Node):
         else:
             raise TypeError("Invalid file type for trace node")
         return traces
+
+    def execute_selection(self, kwargs, traces: slice, samples: slice):
+        return select_ths(self.execute(kwargs), traces, samples)
+
+    def iter_batches(self, kwargs, batch_size: int):
+        # Large reads, rounded to whole batches so they split evenly, are made on
+        # a background thread while the previous ones are processed
+        read_size = max(int(self.control_value("read_size", 0)), batch_size)
+        read_size = -(-read_size // batch_size) * batch_size
+        reads = iter_ths_batches(self.execute(kwargs), read_size)
+        for chunk in prefetch(reads, int(self.control_value("prefetch", 0))):
+            yield from iter_ths_batches(chunk, batch_size)
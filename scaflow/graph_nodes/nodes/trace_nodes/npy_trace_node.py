@@ -5,6 +5,7 @@ import estraces
 from estraces import TraceHeaderSet
 import numpy as np
 
+from scaflow.graph_nodes.controls import BooleanControl
 from scaflow.model.dispatcher import dispatcher
 from scaflow.model.input_socket import Input
 from scaflow.model.output_socket import Output
@@ -17,6 +18,8 @@ logger = logging.getLogger(__name__)
 class NpyTraceNode(Node):
 
     display_name = "Numpy Trace Input"
+    stream_source = True
+    selectable = True
 
     def __init__(self, name="Trace Input"):
         super().__init__(name)
@@ -28,9 +31,11 @@ class NpyTraceNode(Node):
         n.add_input(Input("plaintext", "Plaintext File", accepted_types=["str"]))
         n.add_input(Input("ciphertext", "Ciphertext File", accepted_types=["str"]))
         n.add_output(Output("traces", "Output", return_type="TraceHeaderSet"))
+        n.add_control(BooleanControl("mmap", "Memory-map", value=True))
         return n
 
-    def execute(self, kwargs):
+    @staticmethod
+    def _load(kwargs, mmap_mode=None):
         filename = kwargs.get("filename")
         plaintext = kwargs.get("plaintext")
         ciphertext = kwargs.get("ciphertext")
@@ -38,13 +43,43 @@ class NpyTraceNode(Node):
         suffix = Path(filename).suffix
         if suffix != ".npy":
             raise TypeError("Invalid file type for trace node")
-        traces = np.load(filename)
-        plains = np.load(plaintext)
-        ciphers = np.load(ciphertext)
+        traces = np.load(filename, mmap_mode=mmap_mode)
+        plains = np.load(plaintext, mmap_mode=mmap_mode)
+        ciphers = np.load(ciphertext, mmap_mode=mmap_mode)
+        return traces, plains, ciphers
+
+    def execute(self, kwargs):
+        # Memory-mapping is zero-copy, traces are only read when accessed
+        mmap_mode = "r" if self.control_value("mmap", False) else None
+        traces, plains, ciphers = self._load(kwargs, mmap_mode=mmap_mode)
         traces = estraces.read_ths_from_ram(
-            samples=np.copy(traces), **{"plaintext": plains, "ciphertext": ciphers}
+            samples=traces, **{"plaintext": plains, "ciphertext": ciphers}
         )
         # out = {"traces": traces, "plaintext": plains, "ciphertext": ciphers}
         # logger.debug("Outputs: %s", out)
 
         return traces
+
+    def execute_selection(self, kwargs, traces: slice, samples: slice):
+        # Slicing the memory map only reads the pages holding the window
+        samples_mm, plains, ciphers = self._load(kwargs, mmap_mode="r")
+        return estraces.read_ths_from_ram(
+            samples=np.array(samples_mm[traces, samples]),
+            **{
+                "plaintext": np.array(plains[traces]),
+                "ciphertext": np.array(ciphers[traces]),
+            }
+        )
+
+    def iter_batches(self, kwargs, batch_size: int):
+        # Memory-mapped so only the current batch is read into RAM
+        traces, plains, ciphers = self._load(kwargs, mmap_mode="r")
+        for start in range(0, traces.shape[0], batch_size):
+            batch = slice(start, start + batch_size)
+            yield estraces.read_ths_from_ram(
+                samples=np.array(traces[batch]),
+                **{
+                    "plaintext": np.array(plains[batch]),
+                    "ciphertext": np.array(ciphers[batch]),
+                }
+            )
@@ -0,0 +1,53 @@
+import logging
+from typing import Tuple
+
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.model.dispatcher import dispatcher
+from scaflow.model.input_socket import Input
+from scaflow.model.output_socket import Output
+from scaflow.model.node import Node
+from .batches import select_ths
+
+logger = logging.getLogger(__name__)
+
+
+@dispatcher
+class SelectTracesNode(Node):
+    """Keeps a range of traces and a window of samples of each trace.
+
+    When its input comes straight from a :attr:`Node.selectable` trace loader,
+    the engine has the loader read only the selected region from disk.
+    """
+
+    display_name = "Select Traces"
+    cacheable = True
+
+    def __init__(self, name="Select Traces"):
+        super().__init__(name)
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_output(Output("traces", "Selected", return_type="TraceHeaderSet"))
+        n.add_control(NumberControl("trace_start", "First trace", value=0))
+        n.add_control(NumberControl("trace_stop", "Stop trace (0: all)", value=0))
+        n.add_control(NumberControl("sample_start", "First sample", value=0))
+        n.add_control(NumberControl("sample_stop", "Stop sample (0: all)", value=0))
+        return n
+
+    def _range(self, start_key: str, stop_key: str) -> slice:
+        start = int(self.control_value(start_key, 0))
+        stop = int(self.control_value(stop_key, 0))
+        return slice(start, stop or None)
+
+    def selection(self) -> Tuple[slice, slice]:
+        return (
+            self._range("trace_start", "trace_stop"),
+            self._range("sample_start", "sample_stop"),
+        )
+
+    def execute(self, kwargs):
+        traces, samples = self.selection()
+        logger.debug("Selecting traces %s, samples %s", traces, samples)
+        return select_ths(kwargs["traces"], traces, samples)
@@ -0,0 +1,46 @@
+import logging
+
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.model.dispatcher import dispatcher
+from scaflow.model.input_socket import Input
+from scaflow.model.output_socket import Output
+from scaflow.model.node import Node
+from .batches import iter_ths_batches, prefetch, select_ths
+from .shards import read_ths_from_shards
+
+logger = logging.getLogger(__name__)
+
+
+@dispatcher
+class ShardedTraceNode(Node):
+    """Reads every trace file in a directory, or matching a glob pattern, as one
+    trace set. Shards are read on demand, several at once."""
+
+    display_name = "Sharded Trace Input"
+    stream_source = True
+    selectable = True
+
+    def __init__(self, name="Sharded Trace Input"):
+        super().__init__(name)
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("filename", "Directory or Pattern", accepted_types=["str"]))
+        n.add_output(Output("traces", "Output", return_type="TraceHeaderSet"))
+        n.add_control(NumberControl("workers", "Load threads", value=0))
+        n.add_control(NumberControl("prefetch", "Reads ahead", value=2))
+        return n
+
+    def execute(self, kwargs):
+        pattern = kwargs.get("filename")
+        logger.debug("Input to sharded trace node: %s", pattern)
+        workers = int(self.control_value("workers", 0)) or None
+        return read_ths_from_shards(pattern, workers=workers)
+
+    def execute_selection(self, kwargs, traces: slice, samples: slice):
+        return select_ths(self.execute(kwargs), traces, samples)
+
+    def iter_batches(self, kwargs, batch_size: int):
+        reads = iter_ths_batches(self.execute(kwargs), batch_size)
+        return prefetch(reads, int(self.control_value("prefetch", 0)))
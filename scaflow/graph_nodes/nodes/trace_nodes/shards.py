@@ -0,0 +1,252 @@
+"""Virtual trace header set spanning many trace files
+
+Acquisitions are often split into shards of a few thousand traces each. A
+:class:`ShardSet` opens every shard without reading its samples, and maps
+global trace indices to shards. Samples and metadata are read on demand, from
+several shards at once on a thread pool that lasts for the read.
+
+NumPy shards hold samples only, their metadata is read from sibling files
+named after the shard, e.g., ``traces_0_plaintext.npy`` for ``traces_0.npy``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import logging
+from pathlib import Path
+import re
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar, Union
+
+import estraces
+from estraces import AbstractReader, TraceHeaderSet
+from estraces.traces.trace_header_set import build_trace_header_set
+import numpy as np
+
+from .store import read_ths_from_store
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = (".npy", ".ets", ".sct")  #: Extensions of files read as shards
+NPY_METADATA = ("plaintext", "ciphertext")  #: Metadata read beside NumPy shards
+
+T = TypeVar("T")
+
+
+def _natural_key(path: Path):
+    """Sorts ``traces_2`` before ``traces_10``"""
+    return [
+        int(part) if part.isdigit() else part for part in re.split(r"(\d+)", str(path))
+    ]
+
+
+def find_shards(pattern: Union[str, Path]) -> List[Path]:
+    """Trace files in a directory, or matching a glob pattern.
+
+    Returns: Paths in natural order, e.g., ``traces_2.npy`` before ``traces_10.npy``
+
+    Raises:
+        FileNotFoundError: If no trace file is found
+    """
+    path = Path(pattern)
+    candidates = path.iterdir() if path.is_dir() else map(Path, glob.glob(str(pattern)))
+    metadata_suffixes = tuple(f"_{key}.npy" for key in NPY_METADATA)
+    shards = [
+        p
+        for p in candidates
+        if p.suffix in SUFFIXES and not p.name.endswith(metadata_suffixes)
+    ]
+    if not shards:
+        raise FileNotFoundError(f"No trace files found at '{pattern}'")
+    return sorted(shards, key=_natural_key)
+
+
+def _npy_metadata_files(path: Path) -> Dict[str, Path]:
+    """Metadata files beside a NumPy shard, by metadata key"""
+    siblings = {key: path.with_name(f"{path.stem}_{key}.npy") for key in NPY_METADATA}
+    return {key: sibling for key, sibling in siblings.items() if sibling.exists()}
+
+
+def shard_files(pattern: Union[str, Path]) -> List[Path]:
+    """Every file read from the shards at ``pattern``, see :func:`find_shards`,
+    including the metadata files of NumPy shards
+    """
+    files = []
+    for path in find_shards(pattern):
+        files.append(path)
+        if path.suffix == ".npy":
+            files.extend(_npy_metadata_files(path).values())
+    return files
+
+
+def open_shard(path: Path) -> TraceHeaderSet:
+    """Opens a trace file as a lazily read trace header set"""
+    if path.suffix == ".npy":
+        metadata = {
+            key: np.load(sibling, mmap_mode="r")
+            for key, sibling in _npy_metadata_files(path).items()
+        }
+        samples = np.load(path, mmap_mode="r")
+        return estraces.read_ths_from_ram(samples=samples, **metadata)
+    if path.suffix == ".ets":
+        return estraces.read_ths_from_ets_file(str(path))
+    if path.suffix == ".sct":
+        # Shards are already decoded in parallel, one thread each is enough
+        return read_ths_from_store(path, workers=1)
+    raise TypeError(f"Unsupported trace file: '{path}'")
+
+
+def _as_slice(indices: np.ndarray) -> Union[slice, np.ndarray]:
+    """Turns a run of consecutive indices into a slice, which readers handle faster"""
+    if len(indices) and np.all(np.diff(indices) == 1):
+        return slice(int(indices[0]), int(indices[-1]) + 1)
+    return indices
+
+
+class ShardSet:
+    """Traces of many files, indexed as if they were concatenated.
+
+    Args:
+        paths: Shard files, in order
+        workers: Threads reading shards, defaults to the
+            :class:`ThreadPoolExecutor` default
+
+    Raises:
+        ValueError: If the shards do not have the same number of samples and
+            metadata
+    """
+
+    def __init__(
+        self, paths: Iterable[Union[str, Path]], workers: Optional[int] = None
+    ):
+        self.paths = [Path(p) for p in paths]
+        self.workers = workers
+        self._metadata: Dict[str, np.ndarray] = {}
+        # Opened one after the other, as opening only maps files and parses
+        # headers. Parsing .npy headers uses the ast module, which is not safe
+        # to run on several threads at once on some Python versions
+        self.shards: List[TraceHeaderSet] = [open_shard(p) for p in self.paths]
+
+        sizes = [len(shard) for shard in self.shards]
+        #: Global index of the first trace of each shard, then the total count
+        self.offsets = np.concatenate(([0], np.cumsum(sizes))).astype(int)
+        first = self.shards[0]
+        self.n_samples: int = first._reader.get_trace_size(0)
+        self.metadata_keys = list(first._reader.metadatas_keys)
+        for path, shard in zip(self.paths, self.shards):
+            if len(shard) and shard._reader.get_trace_size(0) != self.n_samples:
+                raise ValueError(
+                    f"Shard '{path}' does not have {self.n_samples} samples"
+                )
+            if set(shard._reader.metadatas_keys) != set(self.metadata_keys):
+                raise ValueError(f"Shard '{path}' does not have the same metadata")
+        logger.debug("Opened %d shards, %d traces", len(self.shards), len(self))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _map(self, function: Callable[..., T], *items: Iterable) -> List[T]:
+        """Calls ``function`` on items of several shards at once.
+
+        The pool is shut down once they are read: the set has no owner to close
+        it, and reading shards takes much longer than starting threads.
+        """
+        items = [list(i) for i in items]
+        if len(items[0]) <= 1 or self.workers == 1:
+            return list(map(function, *items))
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="shards"
+        ) as pool:
+            return list(pool.map(function, *items))
+
+    def read_metadata(self, key: str) -> np.ndarray:
+        """Values of a metadata for every trace, read once and then kept"""
+        if key not in self._metadata:
+            values = self._map(
+                lambda shard: np.asarray(shard.metadatas[key]), self.shards
+            )
+            self._metadata[key] = np.concatenate(values)
+        return self._metadata[key]
+
+    def read_samples(self, indices: np.ndarray, frame=None) -> np.ndarray:
+        """Reads samples of traces, loading the shards holding them in parallel.
+
+        Args:
+            indices: Global trace indices
+            frame: Sample indices, as an int, slice, list or array. Defaults to all
+
+        Returns: Array of shape (number of traces, number of samples)
+        """
+        if frame is None:
+            frame = slice(None)
+        elif isinstance(frame, (int, np.integer)):
+            frame = slice(frame, frame + 1 if frame != -1 else None)
+        indices = np.atleast_1d(indices)
+        shard_ids = np.searchsorted(self.offsets, indices, side="right") - 1
+        used = np.unique(shard_ids)
+        positions = [np.flatnonzero(shard_ids == s) for s in used]
+
+        def read(shard_id, shard_positions):
+            local = indices[shard_positions] - self.offsets[shard_id]
+            return self.shards[shard_id].samples[_as_slice(local), frame]
+
+        pieces = self._map(read, used, positions)
+        if not pieces:
+            return np.empty((0, self.n_samples))[:, frame]
+        if len(pieces) == 1:
+            return pieces[0]
+        out = np.empty((len(indices),) + pieces[0].shape[1:], dtype=pieces[0].dtype)
+        for shard_positions, piece in zip(positions, pieces):
+            out[shard_positions] = piece
+        return out
+
+    def to_ths(self) -> TraceHeaderSet:
+        """Lazy trace header set over every shard"""
+        return build_trace_header_set(
+            reader=ShardedReader(self), name="Scaflow Sharded THS"
+        )
+
+
+class ShardedReader(AbstractReader):
+    """estraces format reader of a :class:`ShardSet`, or of a subset of its traces"""
+
+    def __init__(self, shards: ShardSet, indices: Optional[np.ndarray] = None):
+        self._shards = shards
+        self._indices = np.arange(len(shards)) if indices is None else indices
+        self._size = len(self._indices)
+
+    def fetch_samples(self, traces, frame=None) -> np.ndarray:
+        return self._shards.read_samples(self._indices[traces], frame)
+
+    def fetch_metadatas(self, key, trace_id=None):
+        values = self._shards.read_metadata(key)
+        if trace_id is not None:
+            return values[self._indices[trace_id]]
+        return values[self._indices]
+
+    def __getitem__(self, key):
+        super().__getitem__(key)
+        return ShardedReader(self._shards, self._indices[key])
+
+    def fetch_header(self, key):
+        return self._shards.shards[0].headers[key]
+
+    @property
+    def metadatas_keys(self):
+        return self._shards.metadata_keys
+
+    @property
+    def headers_keys(self):
+        return self._shards.shards[0].headers.keys()
+
+    def get_trace_size(self, trace_id):
+        return self._shards.n_samples
+
+    def __repr__(self):
+        return (
+            f"Sharded reader of {len(self._shards.paths)} files with {len(self)} traces"
+        )
+
+
+def read_ths_from_shards(
+    pattern: Union[str, Path], workers: Optional[int] = None
+) -> TraceHeaderSet:
+    """Opens the trace files in a directory, or matching a pattern, as one trace set"""
+    return ShardSet(find_shards(pattern), workers=workers).to_ths()
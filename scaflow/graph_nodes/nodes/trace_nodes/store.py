@@ -0,0 +1,505 @@
+"""Chunked, compressed trace container
+
+Samples are split into tiles of ``chunk_traces`` traces by ``chunk_samples``
+samples, and metadata into blocks of ``chunk_traces`` traces, each compressed
+on its own. A window of traces and samples can then be read by decompressing
+only the tiles overlapping it, on several threads at once.
+
+The file starts with :data:`MAGIC`, followed by the compressed chunks and a
+JSON index giving the shape, types and location of every chunk. It ends with
+the offset of the index and :data:`MAGIC` again::
+
+    MAGIC | chunks... | index JSON | index offset (uint64 LE) | MAGIC
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+from pathlib import Path
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+import zlib
+
+from estraces import AbstractReader, TraceHeaderSet
+from estraces.traces.trace_header_set import build_trace_header_set
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SCAFLOWT"
+VERSION = 1
+_FOOTER = struct.Struct("<Q8s")
+
+#: Location of a chunk in the file, as offset and length in bytes
+Extent = Tuple[int, int]
+
+
+def _compress(data: bytes, level: int) -> bytes:
+    return zlib.compress(data, level) if level else data
+
+
+def _decompress(data: bytes, compression: Optional[str]) -> bytes:
+    return zlib.decompress(data) if compression == "zlib" else data
+
+
+#: Positions along an axis, as a slice or an array of indices
+Positions = Union[slice, np.ndarray]
+
+
+def _chunks(
+    index, length: int, size: int
+) -> Tuple[int, List[Tuple[int, Positions, Positions]]]:
+    """Splits indices into an axis by the chunks of ``size`` they fall in.
+
+    Slices of step 1 are split by arithmetic, other indices by sorting them,
+    so that the cost does not grow with the length of the axis.
+
+    Args:
+        index: Indices, as None or ``...`` for all, an int, slice, range, list
+            or array
+        length: Length of the axis
+        size: Length of a chunk
+
+    Returns: Number of indices, and for each chunk overlapped, the chunk, the
+    positions of its indices in the output and their positions in the chunk
+    """
+    if index is None or index is Ellipsis:
+        index = slice(None)
+    if isinstance(index, range) and index.step > 0:
+        index = slice(index.start, index.stop, index.step)
+    if isinstance(index, slice):
+        start, stop, step = index.indices(length)
+        if step == 1:
+            stop = max(start, stop)
+            chunks = []
+            for chunk in range(start // size, -(-stop // size)):
+                low = max(start, chunk * size)
+                high = min(stop, (chunk + 1) * size)
+                chunks.append(
+                    (
+                        chunk,
+                        slice(low - start, high - start),
+                        slice(low - chunk * size, high - chunk * size),
+                    )
+                )
+            return stop - start, chunks
+        index = np.arange(start, stop, step)
+    index = np.atleast_1d(np.asarray(index))
+    if index.dtype == bool:
+        index = np.flatnonzero(index)
+    index = np.where(index < 0, index + length, index)
+    if not len(index):
+        return 0, []
+    if index.min() < 0 or index.max() >= length:
+        raise IndexError(f"Index out of range for an axis of length {length}")
+    order = np.argsort(index, kind="stable")
+    ordered = index[order]
+    chunk_of = ordered // size
+    cuts = np.flatnonzero(np.diff(chunk_of)) + 1
+    starts = np.concatenate([[0], cuts])
+    stops = np.concatenate([cuts, [len(ordered)]])
+    return len(index), [
+        (
+            int(chunk_of[a]),
+            order[a:b],
+            ordered[a:b] - chunk_of[a] * size,
+        )
+        for a, b in zip(starts, stops)
+    ]
+
+
+def _grid(rows: Positions, cols: Positions):
+    """Indexes the rows and columns of a 2-D array at once"""
+    if isinstance(rows, slice) or isinstance(cols, slice):
+        return rows, cols
+    return np.ix_(rows, cols)
+
+
+class TraceStoreWriter:
+    """Writes traces to a store, one chunk of traces at a time.
+
+    Args:
+        path: File to create, replaced if it exists
+        chunk_traces: Number of traces per chunk
+        chunk_samples: Number of samples per chunk
+        level: zlib compression level, 0 stores chunks uncompressed
+        headers: JSON serializable values describing the campaign
+        workers: Threads compressing tiles, defaults to the number of CPUs
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        chunk_traces: int = 256,
+        chunk_samples: int = 4096,
+        level: int = 6,
+        headers: Optional[Dict[str, Any]] = None,
+        workers: Optional[int] = None,
+    ):
+        if chunk_traces < 1 or chunk_samples < 1:
+            raise ValueError("Chunks must hold at least one trace and sample")
+        self.path = Path(path)
+        self.chunk_traces = chunk_traces
+        self.chunk_samples = chunk_samples
+        self.level = level
+        self.headers = dict(headers or {})
+        self._file = open(self.path, "wb")
+        self._file.write(MAGIC)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending: List[Tuple[np.ndarray, Dict[str, np.ndarray]]] = []
+        self._pending_traces = 0
+        self._n_traces = 0
+        self._n_samples: Optional[int] = None
+        self._dtype: Optional[np.dtype] = None
+        self._metadata_types: Dict[str, Tuple[str, List[int]]] = {}
+        self._samples_index: List[List[Extent]] = []
+        self._metadata_index: Dict[str, List[Extent]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, samples: np.ndarray, **metadata: np.ndarray):
+        """Adds traces, with one entry per trace in each metadata array"""
+        samples = np.asarray(samples)
+        metadata = {k: np.asarray(v) for k, v in metadata.items()}
+        if samples.ndim != 2:
+            raise ValueError("Samples must be a 2-dimensional array")
+        if self._n_samples is None:
+            self._n_samples = samples.shape[1]
+            self._dtype = samples.dtype
+            self._metadata_types = {
+                k: (v.dtype.str, list(v.shape[1:])) for k, v in metadata.items()
+            }
+            self._metadata_index = {k: [] for k in metadata}
+        elif samples.shape[1] != self._n_samples or samples.dtype != self._dtype:
+            raise ValueError("Samples differ in length or type from previous traces")
+        if set(metadata) != set(self._metadata_types):
+            raise ValueError("Metadata differ from previous traces")
+        for k, v in metadata.items():
+            if len(v) != len(samples):
+                raise ValueError(f"Metadata '{k}' does not match number of traces")
+
+        self._pending.append((samples, metadata))
+        self._pending_traces += len(samples)
+        if self._pending_traces >= self.chunk_traces:
+            self._flush(final=False)
+
+    def append_ths(self, ths: TraceHeaderSet):
+        self.append(
+            ths.samples[:],
+            **{k: np.asarray(ths.metadatas[k]) for k in ths.metadatas.keys()}
+        )
+
+    def _flush(self, final: bool):
+        if not self._pending:
+            return
+        samples = np.concatenate([s for s, _ in self._pending])
+        metadata = {
+            k: np.concatenate([m[k] for _, m in self._pending])
+            for k in self._metadata_types
+        }
+        end = (
+            len(samples)
+            if final
+            else len(samples) // self.chunk_traces * self.chunk_traces
+        )
+        for start in range(0, end, self.chunk_traces):
+            rows = slice(start, min(start + self.chunk_traces, end))
+            self._write_chunk(samples[rows], {k: v[rows] for k, v in metadata.items()})
+        self._pending = []
+        self._pending_traces = 0
+        if end < len(samples):
+            self._pending.append(
+                (samples[end:], {k: v[end:] for k, v in metadata.items()})
+            )
+            self._pending_traces = len(samples) - end
+
+    def _write_chunk(self, samples: np.ndarray, metadata: Dict[str, np.ndarray]):
+        tiles = [
+            np.ascontiguousarray(samples[:, start : start + self.chunk_samples])
+            for start in range(0, samples.shape[1], self.chunk_samples)
+        ]
+        compressed = list(
+            self._pool.map(lambda tile: _compress(tile.tobytes(), self.level), tiles)
+        )
+        self._samples_index.append([self._write(data) for data in compressed])
+        for k, v in metadata.items():
+            data = _compress(np.ascontiguousarray(v).tobytes(), self.level)
+            self._metadata_index[k].append(self._write(data))
+        self._n_traces += len(samples)
+
+    def _write(self, data: bytes) -> Extent:
+        offset = self._file.tell()
+        self._file.write(data)
+        return offset, len(data)
+
+    def close(self):
+        """Writes the remaining traces and the index"""
+        if self._file.closed:
+            return
+        try:
+            self._flush(final=True)
+            index = {
+                "version": VERSION,
+                "n_traces": self._n_traces,
+                "n_samples": self._n_samples or 0,
+                "dtype": (self._dtype or np.dtype("float64")).str,
+                "chunk_traces": self.chunk_traces,
+                "chunk_samples": self.chunk_samples,
+                "compression": "zlib" if self.level else None,
+                "headers": self.headers,
+                "samples": self._samples_index,
+                "metadata": {
+                    k: {
+                        "dtype": dtype,
+                        "shape": shape,
+                        "chunks": self._metadata_index[k],
+                    }
+                    for k, (dtype, shape) in self._metadata_types.items()
+                },
+            }
+            index_offset = self._file.tell()
+            self._file.write(json.dumps(index).encode())
+            self._file.write(_FOOTER.pack(index_offset, MAGIC))
+        finally:
+            self._file.close()
+            self._pool.shutdown()
+        logger.info("Wrote %d traces to '%s'", self._n_traces, self.path)
+
+
+def ths_headers(ths: TraceHeaderSet) -> Dict[str, Any]:
+    """Headers of a trace header set that can be stored, NumPy values as lists"""
+    headers = {}
+    for key, value in ths.headers.items():
+        if isinstance(value, (np.ndarray, np.generic)):
+            value = value.tolist()
+        try:
+            json.dumps(value)
+        except TypeError:
+            logger.warning("Header '%s' cannot be stored, it is left out", key)
+            continue
+        headers[key] = value
+    return headers
+
+
+def write_ths(path: Union[str, Path], ths: TraceHeaderSet, **kwargs):
+    """Writes a whole trace header set to a store, reading one chunk at a time.
+
+    Args:
+        path: File to create
+        ths: Traces to write, along with their headers
+        **kwargs: Passed on to :class:`TraceStoreWriter`, ``headers`` adding to
+            those of ``ths``
+    """
+    kwargs["headers"] = {**ths_headers(ths), **(kwargs.get("headers") or {})}
+    with TraceStoreWriter(path, **kwargs) as writer:
+        for start in range(0, len(ths), writer.chunk_traces):
+            writer.append_ths(ths[start : start + writer.chunk_traces])
+
+
+class TraceStore:
+    """Random access to the traces of a store.
+
+    Args:
+        path: Store file
+        workers: Threads decompressing tiles, defaults to the number of CPUs
+    """
+
+    def __init__(self, path: Union[str, Path], workers: Optional[int] = None):
+        self.path = Path(path)
+        self.workers = workers
+        with open(self.path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"'{path}' is not a scaflow trace store")
+            file.seek(-_FOOTER.size, os.SEEK_END)
+            index_offset, magic = _FOOTER.unpack(file.read(_FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"'{path}' is truncated, the index is missing")
+            file.seek(index_offset)
+            index = json.loads(file.read()[: -_FOOTER.size])
+        if index["version"] > VERSION:
+            raise ValueError(f"'{path}' uses unsupported version {index['version']}")
+
+        self.n_traces: int = index["n_traces"]
+        self.n_samples: int = index["n_samples"]
+        self.dtype = np.dtype(index["dtype"])
+        self.chunk_traces: int = index["chunk_traces"]
+        self.chunk_samples: int = index["chunk_samples"]
+        self.compression: Optional[str] = index["compression"]
+        self.headers: Dict[str, Any] = index["headers"]
+        self._samples_index: List[List[Extent]] = index["samples"]
+        self._metadata_index: Dict[str, dict] = index["metadata"]
+        self._metadata: Dict[str, np.ndarray] = {}
+        self._file = open(self.path, "rb")
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self):
+        return self.n_traces
+
+    def close(self):
+        self._file.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __del__(self):
+        if hasattr(self, "_file"):
+            self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_file"], state["_lock"], state["_pool"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._file = open(self.path, "rb")
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @property
+    def metadata_keys(self) -> Iterable[str]:
+        return self._metadata_index.keys()
+
+    def _read(self, extent: Extent) -> bytes:
+        offset, length = extent
+        with self._lock:
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return _decompress(data, self.compression)
+
+    def read_metadata(self, key: str) -> np.ndarray:
+        """Values of a metadata for every trace, decoded once and then kept"""
+        if key not in self._metadata:
+            info = self._metadata_index[key]
+            dtype = np.dtype(info["dtype"])
+            data = b"".join(self._read(extent) for extent in info["chunks"])
+            self._metadata[key] = np.frombuffer(data, dtype=dtype).reshape(
+                -1, *info["shape"]
+            )
+        return self._metadata[key]
+
+    def read_samples(self, traces=None, frame=None) -> np.ndarray:
+        """Reads a window of samples, decompressing only the tiles it overlaps.
+
+        Args:
+            traces: Trace indices, as a slice, list or array. Defaults to all
+            frame: Sample indices, as an int, slice, list or array. Defaults to all
+
+        Returns: Array of shape (number of traces, number of samples)
+        """
+        n_rows, row_chunks = _chunks(traces, self.n_traces, self.chunk_traces)
+        n_cols, col_chunks = _chunks(frame, self.n_samples, self.chunk_samples)
+        out = np.empty((n_rows, n_cols), dtype=self.dtype)
+        if not out.size:
+            return out
+
+        def decode(tile):
+            (row_chunk, out_rows, rows), (col_chunk, out_cols, cols) = tile
+            data = self._read(self._samples_index[row_chunk][col_chunk])
+            width = min(
+                self.chunk_samples, self.n_samples - col_chunk * self.chunk_samples
+            )
+            block = np.frombuffer(data, dtype=self.dtype).reshape(-1, width)
+            out[_grid(out_rows, out_cols)] = block[_grid(rows, cols)]
+
+        tiles = [(r, c) for r in row_chunks for c in col_chunks]
+        threads = self.workers or os.cpu_count() or 1
+        if threads == 1 or len(tiles) == 1:
+            for tile in tiles:
+                decode(tile)
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            # Tiles are handed out in runs, as a task per tile costs as much as
+            # decoding a small one, with a few runs per thread to balance them
+            run = -(-len(tiles) // (4 * threads))
+            list(
+                self._pool.map(
+                    lambda start: [decode(tile) for tile in tiles[start : start + run]],
+                    range(0, len(tiles), run),
+                )
+            )
+        return out
+
+    def to_ths(self) -> TraceHeaderSet:
+        """Lazy trace header set, reading samples from the store as accessed"""
+        return build_trace_header_set(
+            reader=TraceStoreReader(self), name="Scaflow Trace Store THS"
+        )
+
+
+def _take(indices: Union[range, np.ndarray], key) -> Union[int, range, np.ndarray]:
+    """Indices selected by ``key`` among ``indices``, kept as a range if they can be"""
+    if isinstance(key, (slice, int, np.integer)) or not isinstance(indices, range):
+        return indices[key]
+    key = np.asarray(key)
+    if key.dtype == bool:
+        key = np.flatnonzero(key)
+    key = np.where(key < 0, key + len(indices), key)
+    if len(key) and (key.min() < 0 or key.max() >= len(indices)):
+        raise IndexError(f"Index out of range for {len(indices)} traces")
+    return indices.start + indices.step * key
+
+
+def _index(indices: Union[int, range, np.ndarray]):
+    """Indexes a NumPy array with trace indices"""
+    if isinstance(indices, range):
+        if indices.step > 0:
+            return slice(indices.start, indices.stop, indices.step)
+        return np.asarray(indices)
+    return indices
+
+
+class TraceStoreReader(AbstractReader):
+    """estraces format reader of a :class:`TraceStore`, or of a subset of its traces"""
+
+    def __init__(
+        self, store: TraceStore, indices: Optional[Union[range, np.ndarray]] = None
+    ):
+        self._store = store
+        #: Traces of the store read, a range unless picked one by one
+        self._indices = range(len(store)) if indices is None else indices
+        self._size = len(self._indices)
+
+    def fetch_samples(self, traces, frame=None) -> np.ndarray:
+        return self._store.read_samples(_take(self._indices, traces), frame)
+
+    def fetch_metadatas(self, key, trace_id=None):
+        values = self._store.read_metadata(key)
+        if trace_id is not None:
+            return values[_index(_take(self._indices, trace_id))]
+        return values[_index(self._indices)]
+
+    def __getitem__(self, key):
+        super().__getitem__(key)
+        return TraceStoreReader(self._store, _take(self._indices, key))
+
+    def fetch_header(self, key):
+        return self._store.headers[key]
+
+    @property
+    def metadatas_keys(self):
+        return self._store.metadata_keys
+
+    @property
+    def headers_keys(self):
+        return self._store.headers.keys()
+
+    def get_trace_size(self, trace_id):
+        return self._store.n_samples
+
+    def __repr__(self):
+        return f"Trace store reader of '{self._store.path}' with {len(self)} traces"
+
+
+def read_ths_from_store(
+    path: Union[str, Path], workers: Optional[int] = None
+) -> TraceHeaderSet:
+    """Opens a trace store as a lazily read trace header set"""
+    return TraceStore(path, workers=workers).to_ths()
@@ -0,0 +1,118 @@
+import logging
+from pathlib import Path
+from typing import Dict
+
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.model.dispatcher import dispatcher
+from scaflow.model.input_socket import Input
+from scaflow.model.output_socket import Output
+from scaflow.model.node import Node
+from .batches import iter_ths_batches, prefetch, select_ths
+from .store import TraceStoreWriter, read_ths_from_store, ths_headers, write_ths
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".sct"  #: File extension of trace stores
+
+
+@dispatcher
+class StoreTraceNode(Node):
+
+    display_name = "Trace Store Input"
+    stream_source = True
+    selectable = True
+
+    def __init__(self, name="Trace Store Input"):
+        super().__init__(name)
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("filename", "Trace File", accepted_types=["str"]))
+        n.add_output(Output("traces", "Output", return_type="TraceHeaderSet"))
+        n.add_control(NumberControl("workers", "Decode threads", value=0))
+        n.add_control(NumberControl("prefetch", "Reads ahead", value=2))
+        return n
+
+    def execute(self, kwargs):
+        filename = kwargs.get("filename")
+        logger.debug("Input to trace store node: %s", filename)
+        if Path(filename).suffix != SUFFIX:
+            raise TypeError("Invalid file type for trace store node")
+        workers = int(self.control_value("workers", 0)) or None
+        return read_ths_from_store(filename, workers=workers)
+
+    def execute_selection(self, kwargs, traces: slice, samples: slice):
+        # Only the tiles overlapping the window are decompressed
+        return select_ths(self.execute(kwargs), traces, samples)
+
+    def iter_batches(self, kwargs, batch_size: int):
+        reads = iter_ths_batches(self.execute(kwargs), batch_size)
+        return prefetch(reads, int(self.control_value("prefetch", 0)))
+
+
+@dispatcher
+class StoreWriterNode(Node):
+
+    display_name = "Trace Store Output"
+    stream_sink = True
+
+    def __init__(self, name="Trace Store Output"):
+        super().__init__(name)
+        self._writer = None
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_input(Input("filename", "Output File", accepted_types=["str"]))
+        n.add_output(Output("filename", "Written File", return_type="str"))
+        n.add_control(NumberControl("chunk_traces", "Traces per chunk", value=256))
+        n.add_control(NumberControl("chunk_samples", "Samples per chunk", value=4096))
+        n.add_control(NumberControl("level", "Compression level", value=6))
+        return n
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_writer"] = None
+        return state
+
+    def _options(self, filename) -> Dict[str, int]:
+        if Path(filename).suffix != SUFFIX:
+            raise TypeError(f"Trace store files must end in '{SUFFIX}'")
+        return {
+            "chunk_traces": int(self.control_value("chunk_traces", 256)),
+            "chunk_samples": int(self.control_value("chunk_samples", 4096)),
+            "level": int(self.control_value("level", 6)),
+        }
+
+    def execute(self, kwargs):
+        filename = kwargs["filename"]
+        write_ths(filename, kwargs["traces"], **self._options(filename))
+        return filename
+
+    def begin_stream(self):
+        self.abort_stream()
+
+    def consume_batch(self, kwargs):
+        traces = kwargs["traces"]
+        if self._writer is None:
+            filename = kwargs["filename"]
+            self._writer = TraceStoreWriter(
+                filename, headers=ths_headers(traces), **self._options(filename)
+            )
+        self._writer.append_ths(traces)
+
+    def end_stream(self):
+        writer, self._writer = self._writer, None
+        if writer is None:
+            return None
+        writer.close()
+        return str(writer.path)
+
+    def abort_stream(self):
+        # The store of a stream cut short is incomplete, so it is not kept
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            writer.path.unlink(missing_ok=True)
@@ -0,0 +1,297 @@
+"""Leakage assessment by Welch's t-test (TVLA)
+
+Traces are split in two groups by a label, e.g., fixed against random
+plaintexts, and their moments compared sample by sample. Moments are centred
+and accumulated in one pass over the traces, block by block, so they stay
+numerically stable and merge exactly across blocks, batches and workers.
+"""
+import logging
+from math import comb
+from typing import Dict, List, Optional, Tuple
+
+from estraces import TraceHeaderSet
+import numpy as np
+
+from scaflow.graph_nodes.controls import NumberControl
+from scaflow.graph_nodes.nodes import blocks
+from scaflow.model import Input, Node, Output, dispatcher
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = 4.5  #: Usual bound on the t-statistic above which a sample leaks
+
+
+class CentralMoments:
+    """Trace count, mean and centred sums of powers of samples.
+
+    Args:
+        max_power: Highest power accumulated, twice the highest t-test order
+    """
+
+    def __init__(self, max_power: int):
+        self.max_power = max_power
+        self.count = 0
+        self.mean: Optional[np.ndarray] = None
+        #: Sums of ``(x - mean) ** p`` for ``p`` from 2 to ``max_power``
+        self.sums: Optional[np.ndarray] = None
+
+    @classmethod
+    def of(cls, samples: np.ndarray, max_power: int) -> "CentralMoments":
+        """Moments of a block of traces, one trace per row, in two passes"""
+        moments = cls(max_power)
+        moments.count = len(samples)
+        if not moments.count:
+            return moments
+        samples = np.asarray(samples, dtype=np.float64)
+        moments.mean = samples.mean(axis=0)
+        centred = samples - moments.mean
+        power = centred * centred
+        moments.sums = np.empty((max_power - 1, samples.shape[1]))
+        for p in range(2, max_power + 1):
+            if p > 2:
+                power *= centred
+            moments.sums[p - 2] = power.sum(axis=0)
+        return moments
+
+    def sum(self, p: int) -> np.ndarray:
+        """Sum of ``(x - mean) ** p``"""
+        if p == 0:
+            return np.full_like(self.mean, self.count)
+        if p == 1:
+            return np.zeros_like(self.mean)
+        return self.sums[p - 2]
+
+    def central(self, p: int) -> np.ndarray:
+        """Central moment of order ``p``, the mean of ``(x - mean) ** p``"""
+        return self.sum(p) / self.count
+
+    def update(self, samples: np.ndarray):
+        self.merge(CentralMoments.of(samples, self.max_power))
+
+    def merge(self, other: "CentralMoments"):
+        """Adds the traces of other moments, with the pairwise formulas of
+        Pébay, "Formulas for robust, one-pass parallel computation of
+        covariances and arbitrary-order statistical moments", 2008.
+        """
+        if other.max_power != self.max_power:
+            raise ValueError("Moments up to different powers cannot be merged")
+        if not other.count:
+            return
+        if not self.count:
+            self.count = other.count
+            self.mean, self.sums = other.mean.copy(), other.sums.copy()
+            return
+        n_a, n_b = self.count, other.count
+        n = n_a + n_b
+        delta = other.mean - self.mean
+        delta_a = -n_b / n * delta
+        delta_b = n_a / n * delta
+        sums = np.empty_like(self.sums)
+        for p in range(2, self.max_power + 1):
+            # Terms k = 0 and k = p of the binomial expansion, k = p - 1
+            # vanishes as the first centred sum is zero
+            total = self.sum(p) + other.sum(p)
+            total += n_a * delta_a**p + n_b * delta_b**p
+            for k in range(1, p - 1):
+                total += comb(p, k) * (
+                    self.sum(p - k) * delta_a**k + other.sum(p - k) * delta_b**k
+                )
+            sums[p - 2] = total
+        self.count = n
+        self.mean = self.mean - delta_a
+        self.sums = sums
+
+
+def welch_t(groups: Tuple[CentralMoments, CentralMoments], order: int) -> np.ndarray:
+    """Welch's t-statistic of a given order between two groups of traces.
+
+    Higher orders compare the centred moment of that order, standardised from
+    the third order on, as in Schneider and Moradi, "Leakage assessment
+    methodology", CHES 2015.
+    """
+    means, variances = [], []
+    for moments in groups:
+        if moments.count < 2:
+            raise ValueError("Both groups need at least two traces")
+        if order == 1:
+            mean, variance = moments.mean, moments.central(2)
+        elif order == 2:
+            mean = moments.central(2)
+            variance = moments.central(4) - mean**2
+        else:
+            spread = moments.central(2)
+            mean = moments.central(order) / spread ** (order / 2)
+            variance = (moments.central(2 * order) - moments.central(order) ** 2) / (
+                spread**order
+            )
+        means.append(mean)
+        variances.append(variance / moments.count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (means[0] - means[1]) / np.sqrt(variances[0] + variances[1])
+
+
+@dispatcher
+class TTestNode(Node):
+    """Welch's t-test between traces labelled 0 and the other traces.
+
+    Outputs one t-curve per order up to ``order``, the first row for the
+    first order. Samples where ``|t|`` exceeds 4.5 are taken to leak.
+    """
+
+    display_name = "Welch t-test"
+    process_safe = True
+    stream_sink = True
+
+    def __init__(self, name=None):
+        super().__init__(name if name else self.display_name)
+        self._groups: Optional[Tuple[CentralMoments, CentralMoments]] = None
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_input(Input("labels", "Group labels", accepted_types=["ndarray"]))
+        n.add_output(Output("t", "t-statistics", return_type="ndarray"))
+        n.add_control(NumberControl("order", "Max order", value=2))
+        n.add_control(NumberControl("workers", "Threads (0: one per CPU)", value=0))
+        return n
+
+    def _order(self) -> int:
+        order = int(self.control_value("order", 2))
+        if order < 1:
+            raise ValueError(f"Invalid t-test order: {order}")
+        return order
+
+    def _accumulate(
+        self,
+        groups: Tuple[CentralMoments, CentralMoments],
+        traces: TraceHeaderSet,
+        labels,
+    ):
+        """Adds traces to the moments of their group, block by block"""
+        labels = np.asarray(labels)
+        if len(labels) != len(traces):
+            raise ValueError(
+                f"{len(labels)} labels were given for {len(traces)} traces"
+            )
+        max_power = groups[0].max_power
+        size = blocks.block_size(traces._reader.get_trace_size(0) if len(traces) else 0)
+
+        def block_moments(start: int) -> List[CentralMoments]:
+            block = np.asarray(traces.samples[start : start + size])
+            second = labels[start : start + len(block)] != 0
+            return [
+                CentralMoments.of(block[~second], max_power),
+                CentralMoments.of(block[second], max_power),
+            ]
+
+        # Moments merge in any order, so blocks are merged as they complete
+        for block in blocks.map_blocks(
+            block_moments,
+            range(0, len(traces), size),
+            blocks.thread_count(self.control_value("workers", 0)),
+        ):
+            for moments, block_group in zip(groups, block):
+                moments.merge(block_group)
+
+    def _report(self, groups: Tuple[CentralMoments, CentralMoments]) -> np.ndarray:
+        t = np.stack([welch_t(groups, order) for order in range(1, self._order() + 1)])
+        for order, curve in enumerate(t, start=1):
+            leaking = np.abs(curve) > THRESHOLD
+            logger.info(
+                "Order %d: max |t| %.2f, %d leaking samples",
+                order,
+                np.nanmax(np.abs(curve)),
+                np.count_nonzero(leaking),
+            )
+        return t
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        max_power = 2 * self._order()
+        groups = (CentralMoments(max_power), CentralMoments(max_power))
+        self._accumulate(groups, kwargs.get("traces"), kwargs.get("labels"))
+        return self._report(groups)
+
+    def begin_stream(self):
+        max_power = 2 * self._order()
+        self._groups = (CentralMoments(max_power), CentralMoments(max_power))
+
+    def consume_batch(self, kwargs):
+        self._accumulate(self._groups, kwargs.get("traces"), kwargs.get("labels"))
+
+    def end_stream(self) -> Dict[str, any]:
+        groups, self._groups = self._groups, None
+        return self._report(groups)
+
+
+@dispatcher
+class FixedVsRandomNode(Node):
+    """Labels traces 1 when their plaintext is the fixed one, 0 otherwise.
+
+    The fixed plaintext is given as input, or else the most frequent one, of
+    the first batch when streaming. It must then repeat at least ``min_repeats``
+    times, and be the most frequent of later batches too.
+    """
+
+    display_name = "Fixed vs Random"
+    process_safe = True
+    cacheable = True
+    stream_transform = True
+
+    def __init__(self, name=None):
+        super().__init__(name if name else self.display_name)
+        #: Fixed plaintext kept between batches while streaming
+        self._stream_fixed: Optional[np.ndarray] = None
+        self._streaming = False
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_input(Input("fixed", "Fixed plaintext", accepted_types=["ndarray"]))
+        n.add_output(Output("labels", "Labels", return_type="ndarray"))
+        n.add_control(NumberControl("min_repeats", "Min fixed repeats", value=10))
+        return n
+
+    def begin_stream(self):
+        self._stream_fixed = None
+        self._streaming = True
+
+    def end_stream(self):
+        self._stream_fixed = None
+        self._streaming = False
+
+    def _most_frequent(self, plaintext: np.ndarray) -> Optional[np.ndarray]:
+        """Most frequent plaintext, if it repeats ``min_repeats`` times"""
+        if not len(plaintext):
+            return None
+        values, counts = np.unique(plaintext, axis=0, return_counts=True)
+        if counts.max() < max(2, int(self.control_value("min_repeats", 10))):
+            return None
+        return values[np.argmax(counts)]
+
+    def _fixed(self, plaintext: np.ndarray) -> np.ndarray:
+        frequent = self._most_frequent(plaintext)
+        if self._stream_fixed is not None:
+            if frequent is not None and not np.array_equal(
+                frequent, self._stream_fixed
+            ):
+                raise ValueError(
+                    "Another plaintext than the fixed one of the first batch is "
+                    "the most frequent of a batch, give the fixed plaintext"
+                )
+            return self._stream_fixed
+        if frequent is None:
+            raise ValueError(
+                "No plaintext repeats enough to be the fixed one, give the fixed "
+                "plaintext or use larger batches"
+            )
+        if self._streaming:
+            self._stream_fixed = frequent
+        return frequent
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        plaintext = np.asarray(kwargs.get("traces").plaintext)
+        fixed = kwargs.get("fixed")
+        fixed = self._fixed(plaintext) if fixed is None else np.asarray(fixed)
+        return np.all(plaintext == fixed, axis=1).astype("uint8")
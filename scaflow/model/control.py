@@ -44,7 +44,14 @@ class Control(JsonSerializable):
 
     def update_data(self, key, value):
         self._data[key] = value
+        if self._parent is not None:
+            self._parent.controlChangedEvent(self)
 
     @property
     def key(self):
         return self._key
+
+    @property
+    def parent(self):
+        """Node the control belongs to, if any"""
+        return self._parent
@@ -10,3 +10,7 @@ class GraphEvent:
         if not callable(cb):
             raise TypeError("Must be callable object")
         self.callbacks.append(cb)
+
+    def remove(self, cb):
+        if cb in self.callbacks:
+            self.callbacks.remove(cb)
@@ -2,11 +2,10 @@ from __future__ import annotations
 
 import abc
 import logging
-from typing import Dict, List, TYPE_CHECKING, Type
-
-from PySide6.QtGui import QColor
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING, Tuple, Type
 
 from scaflow.model.dispatcher import JsonSerializable, dispatcher
+from scaflow.model.graph_event import GraphEvent
 
 if TYPE_CHECKING:
     from scaflow.model import Connection, Input, Output, Control, Socket
@@ -57,6 +56,24 @@ class Node(JsonSerializable, abc.ABC):
 
     _last_node_id = 0  #: Static variable for creating unique node IDs
     display_name = ""
+    #: Whether :meth:`execute` can run in a worker process. It then receives
+    #: copies of the node and its inputs, so must not rely on side effects
+    process_safe = False
+    #: Whether the engine may store outputs in its persistent result cache.
+    #: Not set on trace loaders, as storing their lazily read output reads all
+    #: of it, and reading the file again is no slower than the cache
+    cacheable = False
+    #: Roles of the node when the engine streams batches of traces through the
+    #: graph. Sources implement :meth:`iter_batches`, transforms have
+    #: :meth:`execute` called once per batch, and sinks accumulate batches with
+    #: :meth:`consume_batch`
+    stream_source = False
+    stream_transform = False
+    stream_sink = False
+    #: Whether :meth:`execute_selection` can read a window of the traces output
+    #: by the node directly, so the engine may push the :meth:`selection` of
+    #: consuming nodes down into it
+    selectable = False
 
     def __init__(self, name: str = "") -> None:
         """Constructor method"""
@@ -66,7 +83,8 @@ class Node(JsonSerializable, abc.ABC):
         self._inputs: Dict[str, Input] = {}
         self._outputs: Dict[str, Output] = {}
         self._controls: Dict[str, Control] = {}
-        self._color: QColor = QColor(110, 136, 255, 204)
+        #: RGBA colour, kept free of Qt types so graphs can run headless
+        self._color: Tuple[int, int, int, int] = (110, 136, 255, 204)
 
         self._width = 200
         self._margin: Spacing = Spacing(3)
@@ -76,6 +94,14 @@ class Node(JsonSerializable, abc.ABC):
 
         self._base_height = 90
 
+        self.controlChangedEvent = GraphEvent(self)
+
+    def __getstate__(self):
+        # Callbacks belong to this process, copies sent to workers get none
+        state = self.__dict__.copy()
+        state["controlChangedEvent"] = GraphEvent(self)
+        return state
+
     @staticmethod
     def _get_id() -> int:
         Node._last_node_id += 1
@@ -213,6 +239,16 @@ class Node(JsonSerializable, abc.ABC):
     def controls(self):
         return self._controls
 
+    def control_value(self, key: str, default=None):
+        """Value held by a control.
+
+        Returns: The ``value`` data of the control, or ``default`` if the node
+            has no such control, e.g., when loaded from an older saved graph
+        """
+        if key not in self._controls:
+            return default
+        return self._controls[key]._data.get("value", default)
+
     @classmethod
     @abc.abstractmethod
     def create_node(cls):
@@ -222,6 +258,58 @@ class Node(JsonSerializable, abc.ABC):
     def execute(self, kwargs) -> Dict[str, any]:
         raise NotImplementedError
 
+    def selection(self) -> Optional[Tuple[slice, slice]]:
+        """Window of traces and samples the node selects from its input traces.
+
+        Returns: Trace and sample slices, or ``None`` if the node does more
+            than select a window of its input
+        """
+        return None
+
+    def execute_selection(self, kwargs, traces: slice, samples: slice) -> any:
+        """Reads only a window of the output of a :attr:`selectable` node"""
+        raise NotImplementedError
+
+    def iter_batches(self, kwargs, batch_size: int) -> Iterator[any]:
+        """Yields the output of a stream source in batches of ``batch_size`` traces"""
+        raise NotImplementedError
+
+    def begin_stream(self):
+        """Resets the state of a stream transform or sink before the first batch"""
+
+    def consume_batch(self, kwargs):
+        """Folds a batch into the state of a stream sink"""
+        raise NotImplementedError
+
+    def end_stream(self) -> any:
+        """Returns the output of a stream sink once all batches are consumed.
+
+        Also called on stream transforms, after the last batch or when the stream
+        stops early, to drop any state carried between batches.
+        """
+        if self.stream_sink:
+            raise NotImplementedError
+        return None
+
+    def abort_stream(self):
+        """Drops the state of a stream sink when the stream stops early, on an
+        error or when cancelled, in place of :meth:`end_stream`.
+        """
+
+    def stop(self):
+        """Asks a running :meth:`execute` or stream to end early with what it
+        has computed so far. Called from another thread, nodes that cannot stop
+        early ignore it.
+        """
+
+    def fingerprint(self) -> Dict[str, any]:
+        """JSON-able data that, along with its inputs, determines the output of
+        the node.
+
+        Used to address cached results, so must change whenever the result would.
+        """
+        return {k: v._data for k, v in self._controls.items()}
+
     def as_dict(self) -> NodeDict:
         return {
             "id": self._id,
@@ -11,6 +11,9 @@ Position = Tuple[float, float]
 
 class ControlType(str, Enum):
     FilePath = "file_path"
+    DirectoryPath = "directory_path"
+    Boolean = "boolean"
+    Number = "number"
 
 
 class ControlDict(TypedDict):
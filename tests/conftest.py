@@ -0,0 +1,11 @@
+import pytest
+
+from scaflow.model import Connection, Node
+
+
+@pytest.fixture(autouse=True)
+def restore_ids():
+    # Some tests compare serialised IDs, so don't leak the counters
+    node_id, conn_id = Node._last_node_id, Connection._last_conn_id
+    yield
+    Node._last_node_id, Connection._last_conn_id = node_id, conn_id
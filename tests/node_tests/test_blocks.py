@@ -0,0 +1,31 @@
+import threading
+import time
+
+from scaflow.graph_nodes.nodes import blocks
+
+
+def test_block_size(monkeypatch):
+    monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 100 * 5)
+    assert blocks.block_size(100) == 5
+    assert blocks.block_size(10**6) == 1
+    assert blocks.block_size(0) == 8 * 100 * 5 // 8
+
+
+def test_map_blocks_bounds_blocks_in_flight():
+    lock = threading.Lock()
+    running, most = 0, 0
+
+    def square(start):
+        nonlocal running, most
+        with lock:
+            running += 1
+            most = max(most, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return start * start
+
+    results = blocks.map_blocks(square, range(20), 3)
+    assert sorted(results) == [start * start for start in range(20)]
+    assert most <= 3
+    assert list(blocks.map_blocks(square, range(4), 1)) == [0, 1, 4, 9]
@@ -0,0 +1,67 @@
+import estraces
+import numpy as np
+import pytest
+
+from scaflow.graph_nodes.nodes import CorrelationAlignNode, blocks
+
+SHIFTS = np.array([0, 7, -12, 25, -30, 3, 0, -1, 18, -25])
+
+
+@pytest.fixture
+def traces():
+    rng = np.random.default_rng(2)
+    base = rng.normal(size=600)
+    offsets = rng.normal(0, 5, size=len(SHIFTS))
+    samples = np.array(
+        [base[100 + s : 400 + s] + offset for s, offset in zip(SHIFTS, offsets)]
+    )
+    return estraces.read_ths_from_ram(samples=samples, offset=offsets)
+
+
+@pytest.fixture
+def node():
+    n = CorrelationAlignNode.create_node()
+    n.controls["pattern_start"].update_data("value", 100)
+    n.controls["pattern_stop"].update_data("value", 200)
+    n.controls["max_shift"].update_data("value", 40)
+    return n
+
+
+class TestCorrelationAlignNode:
+    def test_align(self, node, traces, monkeypatch):
+        monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 300 * 3)
+        r = node.execute({"traces": traces})
+        assert np.array_equal(r["shifts"], -SHIFTS)
+
+        aligned = r["traces"].samples[:] - traces.offset[:, None]
+        assert aligned.shape == (10, 300 - 80)
+        assert np.allclose(aligned, aligned[0])
+        assert np.array_equal(r["traces"].offset, traces.offset)
+
+    def test_shift_limits(self, node, traces):
+        node.controls["max_shift"].update_data("value", 20)
+        shifts = node.execute({"traces": traces})["shifts"]
+        small = np.abs(SHIFTS) <= 20
+        assert np.array_equal(shifts[small], -SHIFTS[small])
+        assert np.all(np.abs(shifts) <= 20)
+
+        node.controls["pattern_stop"].update_data("value", 1000)
+        with pytest.raises(ValueError):
+            node.execute({"traces": traces})
+
+    def test_streaming_keeps_pattern(self, node, traces):
+        expected = node.execute({"traces": traces})
+
+        node.begin_stream()
+        batches = [node.execute({"traces": traces[i : i + 4]}) for i in (0, 4, 8)]
+        node.end_stream()
+        assert np.array_equal(
+            np.concatenate([b["shifts"] for b in batches]), expected["shifts"]
+        )
+        assert np.array_equal(
+            np.concatenate([b["traces"].samples[:] for b in batches]),
+            expected["traces"].samples[:],
+        )
+        # The pattern is taken from the input again outside of a stream
+        later = node.execute({"traces": traces[4:]})["shifts"]
+        assert later[0] == 0
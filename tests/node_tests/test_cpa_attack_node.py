@@ -0,0 +1,265 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import estraces
+import numpy as np
+import pytest
+import scared
+
+from scaflow.graph_nodes.nodes import CPAAttackNode
+from scaflow.graph_nodes.nodes import cpa_attack
+
+KEY = np.arange(16, dtype="uint8")
+
+
+def make_traces(n=200, samples=16):
+    rng = np.random.default_rng(0)
+    plaintext = rng.integers(0, 256, (n, 16), dtype="uint8")
+    ciphertext = scared.aes.encrypt(plaintext, KEY)
+    leakage = scared.HammingWeight()(scared.aes.sub_bytes(plaintext ^ KEY))
+    noise = rng.normal(0, 0.5, (n, 16))
+    samples = (leakage.astype("float32") + noise)[:, :samples]
+    return estraces.read_ths_from_ram(
+        samples=samples.astype("float32"), plaintext=plaintext, ciphertext=ciphertext
+    )
+
+
+def attack_inputs(traces):
+    return {
+        "traces": traces,
+        "selection": scared.aes.selection_functions.encrypt.FirstSubBytes,
+        "model": scared.HammingWeight,
+        "discriminant": scared.maxabs,
+    }
+
+
+class TestCPAAttackNode:
+    def test_create_node(self):
+        n = CPAAttackNode.create_node()
+        assert set(n.inputs) == {
+            "traces",
+            "selection",
+            "model",
+            "discriminant",
+            "filename",
+        }
+
+    def test_matches_scared(self):
+        traces = make_traces()
+        att = scared.CPAAttack(
+            selection_function=scared.aes.selection_functions.encrypt.FirstSubBytes(),
+            model=scared.HammingWeight(),
+            discriminant=scared.maxabs,
+        )
+        att.run(scared.Container(traces))
+        r = CPAAttackNode.create_node().execute(attack_inputs(traces))
+        assert np.allclose(r["scores"], att.scores, atol=1e-5)
+
+    def test_streaming_matches_execute(self, mocker):
+        scores, checked = [], []
+        mocker.patch.object(
+            CPAAttackNode,
+            "_report",
+            side_effect=lambda att, rows: scores.append(n.scores)
+            or checked.append(rows)
+            or {},
+        )
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.execute(attack_inputs(traces))
+
+        n.begin_stream()
+        for start in range(0, len(traces), 64):
+            n.consume_batch(attack_inputs(traces[start : start + 64]))
+        n.end_stream()
+
+        assert np.allclose(scores[0], scores[1], atol=1e-5)
+        assert np.array_equal(np.argmax(scores[1], axis=0), KEY)
+        # The key is checked against the first trace of every batch
+        assert np.array_equal(checked[1]["plaintext"], traces.plaintext[::64])
+        assert np.array_equal(checked[1]["ciphertext"], traces.ciphertext[::64])
+
+    def test_progress(self):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 50)
+        progress = []
+        n.progressEvent.add(
+            lambda processed, total: progress.append(
+                (processed, total, n.best_guess.copy())
+            )
+        )
+        r = n.execute(attack_inputs(traces))
+
+        assert [p[:2] for p in progress] == [(i, 200) for i in (50, 100, 150, 200)]
+        assert np.array_equal(progress[-1][2], KEY)
+        assert np.array_equal(r["key"], KEY)
+        assert r["scores"].shape == (256, 16)
+        assert n.scores is r["scores"]
+
+    def test_scores_computed_when_needed(self, mocker):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 50)
+        correlation = mocker.spy(cpa_attack.CPAAccumulator, "correlation")
+        n.execute(attack_inputs(traces))
+        assert correlation.call_count == 1
+
+        n.controls["checkpoint_step"].update_data("value", 100)
+        n.execute(attack_inputs(traces))
+        assert correlation.call_count == 3
+
+    def test_stop(self):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 50)
+        processed = []
+        n.progressEvent.add(lambda count, total: processed.append(count) or n.stop())
+        n.execute(attack_inputs(traces))
+        assert processed == [50]
+
+    def test_convergence(self):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 64)
+        n.controls["checkpoint_step"].update_data("value", 30)
+        r = n.execute(attack_inputs(traces))
+
+        counts = list(range(30, 200, 30)) + [200]
+        assert list(r["trace_counts"]) == counts
+        assert r["key_ranks"].shape == r["key_scores"].shape == (len(counts), 16)
+        assert np.all(r["key_ranks"][-1] == 0)
+
+        # Same as attacking each prefix of the traces from scratch
+        n.controls["checkpoint_step"].update_data("value", 0)
+        for i, count in enumerate(counts):
+            prefix = n.execute(attack_inputs(traces[:count]))
+            key_scores = prefix["scores"][KEY, np.arange(16)]
+            ranks = np.sum(prefix["scores"] > key_scores, axis=0)
+            assert np.allclose(r["key_scores"][i], key_scores, atol=1e-5)
+            assert np.array_equal(r["key_ranks"][i], ranks)
+
+    def test_streaming_convergence(self):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["checkpoint_step"].update_data("value", 50)
+        expected = n.execute(attack_inputs(traces))
+
+        n.begin_stream()
+        for start in range(0, len(traces), 64):
+            n.consume_batch(attack_inputs(traces[start : start + 64]))
+        r = n.end_stream()
+        assert list(r["trace_counts"]) == [50, 100, 150, 200]
+        assert np.array_equal(r["key_ranks"], expected["key_ranks"])
+        assert np.allclose(r["key_scores"], expected["key_scores"], atol=1e-5)
+
+    @pytest.mark.parametrize("processes, byte_shards", [(4, 1), (4, 2), (3, 5)])
+    def test_sharded_matches_serial(self, processes, byte_shards, mocker):
+        # Threads shard the same way, without the cost of starting processes
+        mocker.patch.object(
+            CPAAttackNode,
+            "_create_pool",
+            side_effect=lambda: ThreadPoolExecutor(max_workers=processes),
+        )
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 120)
+        serial = n.execute(attack_inputs(traces))
+
+        n.controls["processes"].update_data("value", processes)
+        n.controls["byte_shards"].update_data("value", byte_shards)
+        sharded = n.execute(attack_inputs(traces))
+        assert np.allclose(sharded["scores"], serial["scores"], atol=1e-5)
+        assert np.array_equal(sharded["key"], KEY)
+
+    def test_processes_without_cpu_count(self, monkeypatch):
+        monkeypatch.setattr(os, "cpu_count", lambda: None)
+        n = CPAAttackNode.create_node()
+        n.controls["processes"].update_data("value", 0)
+        assert n._create_pool() is None
+
+    def test_sharded_streaming(self):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        serial = n.execute(attack_inputs(traces))
+
+        n.controls["processes"].update_data("value", 2)
+        n.controls["byte_shards"].update_data("value", 2)
+        n.begin_stream()
+        for start in range(0, len(traces), 64):
+            n.consume_batch(attack_inputs(traces[start : start + 64]))
+        r = n.end_stream()
+        assert np.allclose(r["scores"], serial["scores"], atol=1e-5)
+
+    def test_resume_interrupted(self, tmp_path):
+        traces = make_traces()
+        state = str(tmp_path / "cpa.npz")
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 50)
+        expected = n.execute(attack_inputs(traces))
+
+        n.progressEvent.add(lambda count, total: n.stop())
+        n.execute({**attack_inputs(traces), "filename": state})
+        assert n.best_guess is not None
+
+        n.progressEvent.callbacks.clear()
+        progress = []
+        n.progressEvent.add(lambda count, total: progress.append((count, total)))
+        r = n.execute({**attack_inputs(traces), "filename": state})
+        assert progress == [(100, 200), (150, 200), (200, 200)]
+        assert np.allclose(r["scores"], expected["scores"], atol=1e-5)
+
+        # Running again adds nothing
+        r = n.execute({**attack_inputs(traces), "filename": state})
+        assert list(r["trace_counts"]) == [200]
+        assert np.allclose(r["scores"], expected["scores"], atol=1e-5)
+
+    def test_add_traces(self, tmp_path):
+        traces = make_traces()
+        state = str(tmp_path / "cpa.npz")
+        n = CPAAttackNode.create_node()
+        expected = n.execute(attack_inputs(traces))
+
+        n.execute({**attack_inputs(traces[:120]), "filename": state})
+        with pytest.raises(ValueError, match="other traces"):
+            n.execute({**attack_inputs(traces[120:]), "filename": state})
+
+        n.controls["append"].update_data("value", True)
+        n.begin_stream()
+        for start in range(120, len(traces), 32):
+            n.consume_batch(
+                {**attack_inputs(traces[start : start + 32]), "filename": state}
+            )
+        r = n.end_stream()
+        assert np.allclose(r["scores"], expected["scores"], atol=1e-5)
+        assert list(r["trace_counts"]) == [200]
+
+        with pytest.raises(ValueError, match="different attack, by its model"):
+            n.execute(
+                {**attack_inputs(traces), "filename": state, "model": scared.Value}
+            )
+        with pytest.raises(ValueError, match="different attack, by its samples"):
+            n.execute({**attack_inputs(make_traces(samples=8)), "filename": state})
+
+    def test_save_interval(self, tmp_path, mocker):
+        traces = make_traces()
+        n = CPAAttackNode.create_node()
+        n.controls["batch_size"].update_data("value", 50)
+        save = mocker.spy(cpa_attack, "_save_state")
+
+        n.execute({**attack_inputs(traces), "filename": str(tmp_path / "a.npz")})
+        assert save.call_count == 1
+
+        n.controls["save_every"].update_data("value", 0)
+        n.execute({**attack_inputs(traces), "filename": str(tmp_path / "b.npz")})
+        assert save.call_count == 5
+
+        # A stream cut short keeps what it folded
+        n.controls["save_every"].update_data("value", 60)
+        state = str(tmp_path / "c.npz")
+        n.begin_stream()
+        n.consume_batch({**attack_inputs(traces[:64]), "filename": state})
+        n.abort_stream()
+        assert save.call_count == 6
+        r = n.execute({**attack_inputs(traces[:64]), "filename": state})
+        assert list(r["trace_counts"]) == [64]
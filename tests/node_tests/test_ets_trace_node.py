@@ -1,8 +1,12 @@
+import threading
+import time
+
 import estraces
 from estraces import TraceHeaderSet
 import pytest
 
 from scaflow.graph_nodes.nodes import ETSTraceNode
+from scaflow.graph_nodes.nodes.trace_nodes import batches, ets_trace_node
 import numpy as np
 
 
@@ -28,3 +32,59 @@ class TestETSTraceNode:
         n = ETSTraceNode.create_node()
         with pytest.raises(TypeError):
             n.execute({"filename": "test"})
+
+    def test_iter_batches(self, mocker):
+        samples = np.arange(230).reshape(23, 10)
+        mocker.patch(
+            "scared.traces.read_ths_from_ets_file",
+            return_value=estraces.read_ths_from_ram(
+                samples=samples, plaintext=np.arange(23)
+            ),
+        )
+        n = ETSTraceNode.create_node()
+        n.controls["read_size"].update_data("value", 7)
+        read = mocker.spy(ets_trace_node, "iter_ths_batches")
+
+        out = list(n.iter_batches({"filename": "test.ets"}, 5))
+        assert [len(b) for b in out] == [5, 5, 5, 5, 3]
+        assert np.array_equal(np.concatenate([b.samples[:] for b in out]), samples)
+        assert np.array_equal(out[-1].plaintext, np.arange(20, 23))
+        assert read.call_args_list[0].args[1] == 10  # Rounded to whole batches
+
+
+class TestPrefetch:
+    def test_order(self):
+        assert list(batches.prefetch(iter(range(100)), depth=3)) == list(range(100))
+        assert list(batches.prefetch(iter(range(5)), depth=0)) == list(range(5))
+
+    def test_reads_ahead(self):
+        produced = []
+
+        def produce():
+            for i in range(10):
+                produced.append(i)
+                yield i
+
+        items = batches.prefetch(produce(), depth=2)
+        assert next(items) == 0
+        deadline = time.monotonic() + 5
+        while len(produced) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(produced) == 3  # One handed out, two queued
+        items.close()
+
+    def test_exception(self):
+        def produce():
+            yield 1
+            raise OSError("read failed")
+
+        items = batches.prefetch(produce())
+        assert next(items) == 1
+        with pytest.raises(OSError):
+            next(items)
+
+    def test_close_stops_thread(self):
+        items = batches.prefetch(iter(range(1000)), depth=1)
+        next(items)
+        items.close()
+        assert not any(t.name == "prefetch" for t in threading.enumerate())
@@ -0,0 +1,72 @@
+import estraces
+import numpy as np
+import pytest
+
+from scaflow.graph_nodes.nodes import (
+    DecimateNode,
+    FrequencyFilterNode,
+    MovingAverageNode,
+    blocks,
+)
+
+
+@pytest.fixture
+def traces():
+    rng = np.random.default_rng(3)
+    return estraces.read_ths_from_ram(
+        samples=rng.integers(-50, 50, size=(10, 64)).astype("int16"),
+        plaintext=rng.integers(0, 256, size=(10, 16), dtype="uint8"),
+    )
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 64 * 3)
+
+
+class TestFilterNodes:
+    def test_moving_average(self, traces):
+        node = MovingAverageNode.create_node()
+        node.controls["window"].update_data("value", 5)
+        r = node.execute({"traces": traces})
+
+        samples = traces.samples[:].astype(float)
+        expected = np.array([np.convolve(t, np.ones(5) / 5, "valid") for t in samples])
+        assert r.samples[:].dtype == np.float64
+        assert np.allclose(r.samples[:], expected)
+        assert np.array_equal(r.plaintext, traces.plaintext)
+
+        node.controls["window"].update_data("value", 100)
+        with pytest.raises(ValueError):
+            node.execute({"traces": traces})
+
+    def test_frequency_filter(self):
+        t = np.arange(256)
+        slow = np.sin(2 * np.pi * 4 * t / 256)
+        fast = np.sin(2 * np.pi * 100 * t / 256)
+        traces = estraces.read_ths_from_ram(
+            samples=np.tile(slow + fast, (4, 1)).astype("float32")
+        )
+        node = FrequencyFilterNode.create_node()
+        node.controls["high"].update_data("value", 0.5)
+        low_pass = node.execute({"traces": traces}).samples[:]
+        assert low_pass.dtype == np.float32
+        assert np.allclose(low_pass, slow, atol=1e-4)
+
+        node.controls["low"].update_data("value", 0.5)
+        node.controls["high"].update_data("value", 1.0)
+        assert np.allclose(node.execute({"traces": traces}).samples[:], fast, atol=1e-4)
+
+    @pytest.mark.parametrize("average", [True, False])
+    def test_decimate(self, traces, average):
+        node = DecimateNode.create_node()
+        node.controls["factor"].update_data("value", 3)
+        node.controls["average"].update_data("value", average)
+        r = node.execute({"traces": traces}).samples[:]
+
+        samples = traces.samples[:]
+        if average:
+            expected = samples[:, :63].reshape(10, 21, 3).mean(axis=2)
+        else:
+            expected = samples[:, ::3]
+        assert np.array_equal(r, expected)
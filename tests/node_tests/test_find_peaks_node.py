@@ -0,0 +1,89 @@
+import estraces
+import numpy as np
+import pytest
+from scared.signal_processing import find_peaks
+
+from scaflow.graph_nodes.nodes import FindPeaksNode, blocks
+from scaflow.graph_nodes.nodes.preprocessing import find_peaks as find_peaks_module
+
+
+@pytest.fixture
+def traces():
+    rng = np.random.default_rng(1)
+    samples = rng.normal(0, 0.02, size=(30, 400))
+    # Two dips per trace, the first one is where traces are aligned
+    dips = rng.integers(60, 150, size=30)
+    samples[np.arange(30), dips] -= 1
+    samples[np.arange(30), dips + 150] -= 0.5
+    return estraces.read_ths_from_ram(
+        samples=samples, plaintext=rng.integers(0, 256, (30, 16), dtype="uint8")
+    )
+
+
+def reference(samples, before, after):
+    """Resynchronisation of traces one at a time, using scared directly"""
+    out = []
+    for trace in samples:
+        peak = find_peaks(-trace, min_peak_distance=5, min_peak_height=0.10)[0]
+        out.append(trace[peak - before : peak + after])
+    return np.array(out)
+
+
+class TestFindPeaksNode:
+    def test_matches_reference(self, traces, monkeypatch):
+        monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 400 * 8)
+        node = FindPeaksNode.create_node()
+        node.controls["before"].update_data("value", 50)
+        node.controls["after"].update_data("value", 200)
+
+        r = node.execute({"traces": traces})
+        assert r.samples[:].shape == (30, 250)
+        assert np.array_equal(r.samples[:], reference(traces.samples[:], 50, 200))
+        assert np.array_equal(r.plaintext, traces.plaintext)
+
+    def test_first_peaks(self):
+        data = np.array(
+            [
+                [0, 3, 0, 0, 0, 0, 0, 0, 5, 0],
+                [0, 3, 0, 4, 0, 0, 0, 0, 0, 0],  # Second maximum is too close
+                [0, 0.05, 0, 0, 0, 0, 0, 0, 0, 0],  # Too low
+            ]
+        )
+        assert list(find_peaks_module.first_peaks(data, 5, 0.1)) == [1, 3, -1]
+        assert list(find_peaks_module.first_peaks(data, 2, 0.1)) == [1, 1, -1]
+
+    def test_ties_match_scared(self):
+        rng = np.random.default_rng(7)
+        samples = rng.integers(-2, 3, size=(50, 120)).astype("int8")
+        for trace in samples:
+            # Quantised dips, flat and as deep as a second dip close by
+            dip = rng.integers(20, 80)
+            trace[dip : dip + rng.integers(1, 4)] = -8
+            trace[dip + rng.integers(3, 12)] = -8
+        data = np.negative(samples, dtype=np.float64)
+        expected = [find_peaks(row, 5, 5.0)[0] for row in data]
+        assert list(find_peaks_module.first_peaks(data, 5, 5.0)) == expected
+
+    def test_window_out_of_range(self, traces):
+        node = FindPeaksNode.create_node()
+        with pytest.raises(ValueError):
+            node.execute({"traces": traces})  # 500 samples before the peak
+
+        node.controls["before"].update_data("value", 10)
+        node.controls["after"].update_data("value", 10)
+        node.controls["min_height"].update_data("value", 5.0)
+        with pytest.raises(ValueError, match="No peak"):
+            node.execute({"traces": traces})
+
+    def test_parallel_matches_serial(self, traces, monkeypatch):
+        monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 400 * 4)
+        node = FindPeaksNode.create_node()
+        node.controls["before"].update_data("value", 50)
+        node.controls["after"].update_data("value", 200)
+        node.controls["workers"].update_data("value", 1)
+        serial = node.execute({"traces": traces}).samples[:]
+
+        node.controls["workers"].update_data("value", 4)
+        parallel = node.execute({"traces": traces})
+        assert np.array_equal(parallel.samples[:], serial)
+        assert np.array_equal(parallel.plaintext, traces.plaintext)
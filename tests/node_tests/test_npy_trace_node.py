@@ -28,3 +28,36 @@ class TestNpyTraceNode:
         n = NpyTraceNode.create_node()
         with pytest.raises(TypeError):
             n.execute({"filename": "test"})
+
+    @pytest.mark.parametrize("mmap", [True, False])
+    def test_mmap_mode(self, tmp_path, mocker, mmap):
+        samples = np.random.random((8, 20))
+        for name, array in [
+            ("traces", samples),
+            ("plaintext", np.zeros((8, 16), dtype="uint8")),
+            ("ciphertext", np.ones((8, 16), dtype="uint8")),
+        ]:
+            np.save(tmp_path / f"{name}.npy", array)
+        load = mocker.spy(np, "load")
+
+        n = NpyTraceNode.create_node()
+        n.controls["mmap"].update_data("value", mmap)
+        r = n.execute(
+            {
+                "filename": str(tmp_path / "traces.npy"),
+                "plaintext": str(tmp_path / "plaintext.npy"),
+                "ciphertext": str(tmp_path / "ciphertext.npy"),
+            }
+        )
+        expected_mode = "r" if mmap else None
+        assert all(c.kwargs["mmap_mode"] == expected_mode for c in load.call_args_list)
+        assert np.array_equal(r.samples[:], samples)
+        assert np.array_equal(r[2:4].ciphertext, np.ones((2, 16), dtype="uint8"))
+
+    def test_missing_mmap_control(self, mocker):
+        load = mocker.patch("numpy.load", return_value=np.ndarray(shape=(0, 0)))
+
+        n = NpyTraceNode.create_node()
+        n.remove_control(n.controls["mmap"])
+        n.execute({"filename": "test.npy"})
+        assert load.call_args.kwargs["mmap_mode"] is None
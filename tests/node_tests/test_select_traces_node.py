@@ -0,0 +1,164 @@
+import estraces
+import numpy as np
+import pytest
+
+from scaflow.engine import Engine
+from scaflow.graph_nodes.nodes import (
+    CiphertextFileNode,
+    NpyTraceNode,
+    PlaintextFileNode,
+    SelectTracesNode,
+    StoreTraceNode,
+    TraceFileNode,
+)
+from scaflow.graph_nodes.nodes.trace_nodes import store
+from scaflow.model import Graph, Input, Node, Output, dispatcher
+
+
+@dispatcher
+class CountNode(Node):
+    @classmethod
+    def create_node(cls):
+        n = cls("Count")
+        n.add_input(Input("traces", "Traces", accepted_types=["TraceHeaderSet"]))
+        n.add_output(Output("count", "Count", return_type="int"))
+        return n
+
+    def execute(self, kwargs):
+        return len(kwargs["traces"])
+
+
+@pytest.fixture
+def samples():
+    return np.arange(40 * 30, dtype="float64").reshape(40, 30)
+
+
+@pytest.fixture
+def npy_graph(tmp_path, samples):
+    """Graph loading NumPy traces, returning the graph and the loader"""
+    g = Graph()
+    loader = NpyTraceNode.create_node()
+    g.add_node(loader)
+    for node_type, name, array in [
+        (TraceFileNode, "filename", samples),
+        (PlaintextFileNode, "plaintext", np.zeros((40, 16), dtype="uint8")),
+        (CiphertextFileNode, "ciphertext", np.arange(40 * 16).reshape(40, 16)),
+    ]:
+        np.save(tmp_path / f"{name}.npy", array)
+        file_node = node_type.create_node()
+        file_node.controls["file_control"].update_data(
+            "filename", str(tmp_path / f"{name}.npy")
+        )
+        g.add_node(file_node)
+        g.add_edge(file_node.outputs[name], loader.inputs[name])
+    return g, loader
+
+
+def add_selection(graph, upstream, traces=(0, 0), samples=(0, 0)):
+    select = SelectTracesNode.create_node()
+    select.controls["trace_start"].update_data("value", traces[0])
+    select.controls["trace_stop"].update_data("value", traces[1])
+    select.controls["sample_start"].update_data("value", samples[0])
+    select.controls["sample_stop"].update_data("value", samples[1])
+    graph.add_node(select)
+    graph.add_edge(upstream.outputs["traces"], select.inputs["traces"])
+    return select
+
+
+class TestSelectTracesNode:
+    def test_execute(self, samples):
+        ths = estraces.read_ths_from_ram(samples=samples, plaintext=samples[:, :16])
+        select = SelectTracesNode.create_node()
+        assert select.selection() == (slice(0, None), slice(0, None))
+        select.controls["trace_start"].update_data("value", 5)
+        select.controls["trace_stop"].update_data("value", 9)
+        select.controls["sample_start"].update_data("value", 10)
+
+        r = select.execute({"traces": ths})
+        assert np.array_equal(r.samples[:], samples[5:9, 10:])
+        assert np.array_equal(r.plaintext, samples[5:9, :16])
+
+    def test_pushdown(self, npy_graph, samples, mocker):
+        g, loader = npy_graph
+        select = add_selection(g, loader, traces=(10, 20), samples=(5, 12))
+        execute = mocker.spy(NpyTraceNode, "execute")
+        execute_selection = mocker.spy(NpyTraceNode, "execute_selection")
+
+        outputs = Engine(g)()
+        assert execute.call_count == 0
+        assert execute_selection.call_args.args[2:] == (slice(10, 20), slice(5, 12))
+        assert outputs[loader.id] is None
+        r = outputs[select.id]
+        assert np.array_equal(r.samples[:], samples[10:20, 5:12])
+        assert np.array_equal(r.ciphertext, np.arange(40 * 16).reshape(40, 16)[10:20])
+
+    def test_pushdown_selections_share_source(self, npy_graph, samples, mocker):
+        g, loader = npy_graph
+        first = add_selection(g, loader, traces=(0, 5))
+        second = add_selection(g, loader, samples=(20, 0))
+        execute = mocker.spy(NpyTraceNode, "execute")
+
+        engine = Engine(g)
+        outputs = engine()
+        assert execute.call_count == 0
+        assert np.array_equal(outputs[first.id].samples[:], samples[:5])
+        assert np.array_equal(outputs[second.id].samples[:], samples[:, 20:])
+
+        second.controls["sample_start"].update_data("value", 25)
+        assert np.array_equal(engine()[second.id].samples[:], samples[:, 25:])
+        assert execute.call_count == 0
+
+    def test_pushdown_releases_source_inputs(self, npy_graph, samples):
+        g, loader = npy_graph
+        select = add_selection(g, loader, traces=(0, 5))
+        engine = Engine(g, release_outputs=True)
+        outputs = engine()
+        assert np.array_equal(outputs[select.id].samples[:], samples[:5])
+        assert all(outputs[node_id] is None for node_id in g if node_id != select.id)
+
+        select.controls["trace_stop"].update_data("value", 8)
+        assert np.array_equal(engine()[select.id].samples[:], samples[:8])
+
+    @pytest.mark.parametrize("reason", ["consumer", "target", "pinned"])
+    def test_no_pushdown(self, npy_graph, samples, mocker, reason):
+        g, loader = npy_graph
+        select = add_selection(g, loader, traces=(0, 3), samples=(1, 4))
+        engine = Engine(g)
+        targets = None
+        if reason == "consumer":
+            count = CountNode.create_node()
+            g.add_node(count)
+            g.add_edge(loader.outputs["traces"], count.inputs["traces"])
+        elif reason == "target":
+            targets = [loader.id, select.id]
+        else:
+            engine.pin(loader.id)
+        execute_selection = mocker.spy(NpyTraceNode, "execute_selection")
+
+        outputs = engine(targets)
+        assert execute_selection.call_count == 0
+        assert outputs[loader.id] is not None
+        assert np.array_equal(outputs[select.id].samples[:], samples[:3, 1:4])
+
+    def test_pushdown_into_store(self, tmp_path, samples, mocker):
+        path = tmp_path / "traces.sct"
+        store.write_ths(
+            path,
+            estraces.read_ths_from_ram(samples=samples),
+            chunk_traces=8,
+            chunk_samples=8,
+        )
+        g = Graph()
+        file_node = TraceFileNode.create_node()
+        file_node.controls["file_control"].update_data("filename", str(path))
+        loader = StoreTraceNode.create_node()
+        g.add_node(file_node)
+        g.add_node(loader)
+        g.add_edge(file_node.outputs["filename"], loader.inputs["filename"])
+        select = add_selection(g, loader, traces=(3, 11), samples=(16, 24))
+        read_samples = mocker.spy(store.TraceStore, "read_samples")
+
+        r = Engine(g)()[select.id]
+        assert np.array_equal(r.samples[:], samples[3:11, 16:24])
+        assert read_samples.call_count == 1
+        assert read_samples.call_args.args[2] == slice(16, 24)
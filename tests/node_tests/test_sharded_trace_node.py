@@ -0,0 +1,170 @@
+import os
+import threading
+
+import estraces
+import numpy as np
+import pytest
+
+from scaflow.engine import Engine
+from scaflow.graph_nodes.nodes import (
+    SelectTracesNode,
+    ShardedTraceNode,
+    StoreWriterNode,
+    TraceDirectoryNode,
+    TraceFileNode,
+)
+from scaflow.graph_nodes.nodes.trace_nodes import shards, store
+from scaflow.model import Graph
+
+SIZES = [7, 0, 12, 5]
+
+
+@pytest.fixture
+def samples():
+    rng = np.random.default_rng(0)
+    return rng.integers(-100, 100, size=(sum(SIZES), 30)).astype("int16")
+
+
+@pytest.fixture
+def plaintext():
+    return np.arange(sum(SIZES) * 16, dtype="uint16").reshape(-1, 16).astype("uint8")
+
+
+@pytest.fixture
+def shard_dir(tmp_path, samples, plaintext):
+    """NumPy shards, except the third one which is a trace store"""
+    ciphertext = plaintext[::-1]
+    offsets = np.cumsum([0] + SIZES)
+    for i, (start, stop) in enumerate(zip(offsets, offsets[1:])):
+        name = f"traces_{2 ** (i * 2)}"  # 1, 4, 16, 64: out of lexical order
+        if i == 2:
+            store.write_ths(
+                tmp_path / f"{name}.sct",
+                estraces.read_ths_from_ram(
+                    samples=samples[start:stop],
+                    plaintext=plaintext[start:stop],
+                    ciphertext=ciphertext[start:stop],
+                ),
+                chunk_traces=4,
+            )
+            continue
+        np.save(tmp_path / f"{name}.npy", samples[start:stop])
+        np.save(tmp_path / f"{name}_plaintext.npy", plaintext[start:stop])
+        np.save(tmp_path / f"{name}_ciphertext.npy", ciphertext[start:stop])
+    (tmp_path / "notes.txt").write_text("not a trace file")
+    return tmp_path
+
+
+class TestShards:
+    def test_find_shards(self, shard_dir):
+        found = [p.name for p in shards.find_shards(shard_dir)]
+        assert found == [
+            "traces_1.npy",
+            "traces_4.npy",
+            "traces_16.sct",
+            "traces_64.npy",
+        ]
+        found = [p.name for p in shards.find_shards(shard_dir / "traces_*.npy")]
+        assert found == ["traces_1.npy", "traces_4.npy", "traces_64.npy"]
+        with pytest.raises(FileNotFoundError):
+            shards.find_shards(shard_dir / "*.ets")
+
+    def test_read(self, shard_dir, samples, plaintext):
+        ths = shards.read_ths_from_shards(shard_dir, workers=3)
+        assert len(ths) == len(samples)
+        assert np.array_equal(ths.samples[:], samples)
+        assert np.array_equal(ths.plaintext, plaintext)
+        assert np.array_equal(ths.ciphertext, plaintext[::-1])
+
+        indices = [23, 0, 9, 6, 7, 19]
+        assert np.array_equal(ths.samples[indices, 3:9], samples[indices, 3:9])
+        subset = ths[5:21]
+        assert np.array_equal(subset.samples[:, 10], samples[5:21, 10])
+        assert np.array_equal(subset[2:4].plaintext, plaintext[7:9])
+        assert np.array_equal(ths[8].samples, samples[8])
+
+    def test_shard_files(self, shard_dir):
+        files = [p.name for p in shards.shard_files(shard_dir / "traces_*.npy")]
+        assert files[:3] == [
+            "traces_1.npy",
+            "traces_1_plaintext.npy",
+            "traces_1_ciphertext.npy",
+        ]
+        assert len(files) == 9
+
+    def test_inconsistent_shards(self, tmp_path):
+        np.save(tmp_path / "a.npy", np.zeros((3, 10)))
+        np.save(tmp_path / "b.npy", np.zeros((3, 11)))
+        with pytest.raises(ValueError):
+            shards.read_ths_from_shards(tmp_path)
+
+
+class TestShardedTraceNode:
+    @pytest.fixture
+    def graph(self, shard_dir):
+        g = Graph()
+        directory = TraceDirectoryNode.create_node()
+        directory.controls["file_control"].update_data("filename", str(shard_dir))
+        reader = ShardedTraceNode.create_node()
+        g.add_node(directory)
+        g.add_node(reader)
+        g.add_edge(directory.outputs["filename"], reader.inputs["filename"])
+        return g, reader
+
+    def test_execute(self, graph, samples):
+        g, reader = graph
+        ths = Engine(g)()[reader.id]
+        assert np.array_equal(ths.samples[:], samples)
+
+    def test_execute_with_workers(self, graph, samples, plaintext):
+        g, reader = graph
+        reader.controls["workers"].update_data("value", 4)
+        for parallel in (False, True):
+            ths = Engine(g, parallel=parallel)()[reader.id]
+            assert np.array_equal(ths.samples[:], samples)
+            assert np.array_equal(ths[3:20].samples[:, 5], samples[3:20, 5])
+            assert np.array_equal(ths.plaintext, plaintext)
+        # Reading leaves no threads behind
+        assert not [t for t in threading.enumerate() if t.name.startswith("shards")]
+
+    @pytest.mark.parametrize("pattern", ["", "traces_*.npy"])
+    def test_fingerprint(self, shard_dir, pattern):
+        directory = TraceDirectoryNode.create_node()
+        directory.controls["file_control"].update_data(
+            "filename", str(shard_dir / pattern)
+        )
+        before = directory.fingerprint()
+        # Rewriting a shard in place changes the fingerprint
+        os.utime(shard_dir / "traces_4_plaintext.npy", ns=(0, 0))
+        assert directory.fingerprint() != before
+
+    def test_streaming(self, graph, samples, tmp_path):
+        g, reader = graph
+        output_file = TraceFileNode.create_node()
+        output_file.controls["file_control"].update_data(
+            "filename", str(tmp_path / "out" / "copy.sct")
+        )
+        (tmp_path / "out").mkdir()
+        writer = StoreWriterNode.create_node()
+        g.add_node(output_file)
+        g.add_node(writer)
+        g.add_edge(reader.outputs["traces"], writer.inputs["traces"])
+        g.add_edge(output_file.outputs["filename"], writer.inputs["filename"])
+
+        outputs = Engine(g, batch_size=4)()
+        copy = store.read_ths_from_store(outputs[writer.id])
+        assert np.array_equal(copy.samples[:], samples)
+
+    def test_selection(self, graph, samples, mocker):
+        g, reader = graph
+        select = SelectTracesNode.create_node()
+        select.controls["trace_start"].update_data("value", 4)
+        select.controls["trace_stop"].update_data("value", 22)
+        select.controls["sample_start"].update_data("value", 20)
+        g.add_node(select)
+        g.add_edge(reader.outputs["traces"], select.inputs["traces"])
+        read_samples = mocker.spy(shards.ShardSet, "read_samples")
+
+        r = Engine(g)()[select.id]
+        assert np.array_equal(r.samples[:], samples[4:22, 20:])
+        assert read_samples.call_args.args[2] == slice(20, None)
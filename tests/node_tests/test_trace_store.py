@@ -0,0 +1,165 @@
+import pickle
+
+import estraces
+from estraces import TraceHeaderSet
+import numpy as np
+import pytest
+
+from scaflow.engine import Engine
+from scaflow.graph_nodes.nodes import StoreTraceNode, StoreWriterNode, TraceFileNode
+from scaflow.graph_nodes.nodes.trace_nodes import store
+from scaflow.model import Graph
+
+
+@pytest.fixture
+def traces():
+    rng = np.random.default_rng(0)
+    return estraces.read_ths_from_ram(
+        samples=rng.integers(-100, 100, size=(50, 70)).astype("int16"),
+        plaintext=rng.integers(0, 256, size=(50, 16), dtype="uint8"),
+        key=np.zeros((50, 16), dtype="uint8"),
+        headers={"device": "stm32", "mask": np.arange(4)},
+    )
+
+
+@pytest.fixture
+def store_file(tmp_path, traces):
+    path = tmp_path / "traces.sct"
+    store.write_ths(path, traces, chunk_traces=8, chunk_samples=16, workers=2)
+    return path
+
+
+class TestTraceStore:
+    def test_round_trip(self, store_file, traces):
+        ths = store.read_ths_from_store(store_file)
+        assert len(ths) == 50
+        assert np.array_equal(ths.samples[:], traces.samples[:])
+        assert np.array_equal(ths.plaintext, traces.plaintext)
+        assert set(ths.metadatas.keys()) == {"plaintext", "key"}
+
+    def test_random_access(self, store_file, traces):
+        s = store.TraceStore(store_file, workers=4)
+        expected = traces.samples[:]
+        assert np.array_equal(
+            s.read_samples(slice(5, 30), slice(10, 40)), expected[5:30, 10:40]
+        )
+        rows, cols = [49, 0, 17, 17], [69, 3, 33]
+        assert np.array_equal(s.read_samples(rows, cols), expected[rows][:, cols])
+        assert s.read_samples(slice(0, 0)).shape == (0, 70)
+
+        ths = s.to_ths()[10:20]
+        assert np.array_equal(ths.samples[2:4, 5:9], expected[12:14, 5:9])
+        assert np.array_equal(ths.plaintext, traces.plaintext[10:20])
+        assert np.array_equal(ths[3].plaintext, traces.plaintext[13])
+
+    @pytest.mark.parametrize(
+        "rows",
+        [slice(3, 45, 4), slice(40, 2, -3), slice(-9, None), [-1, 8, 0, 8]],
+    )
+    @pytest.mark.parametrize("cols", [None, slice(15, 50, 7), 33, [60, 2]])
+    def test_indexing(self, store_file, traces, rows, cols):
+        s = store.TraceStore(store_file, workers=3)
+        expected = traces.samples[:][rows]
+        expected = expected.reshape(-1, 70)[:, cols if cols is not None else ...]
+        assert np.array_equal(
+            s.read_samples(rows, cols), expected.reshape(len(expected), -1)
+        )
+
+        subset = s.to_ths()[5:45][::-2][[0, 3, -1]]
+        assert np.array_equal(subset.samples[:], traces.samples[:][[44, 38, 6]])
+        assert np.array_equal(subset.key, traces.key[[44, 38, 6]])
+        with pytest.raises(IndexError):
+            s.read_samples([50])
+
+    def test_compression(self, tmp_path):
+        samples = np.tile(np.arange(500, dtype="float32"), (200, 1))
+        path = tmp_path / "regular.sct"
+        with store.TraceStoreWriter(path, chunk_traces=64) as writer:
+            writer.append(samples[:100])
+            writer.append(samples[100:])
+        assert path.stat().st_size < samples.nbytes / 10
+        assert np.array_equal(store.TraceStore(path).read_samples(), samples)
+
+    def test_uncompressed(self, tmp_path, traces):
+        path = tmp_path / "raw.sct"
+        store.write_ths(path, traces, level=0)
+        assert np.array_equal(
+            store.read_ths_from_store(path).samples[:], traces.samples[:]
+        )
+
+    def test_headers_and_pickle(self, tmp_path, traces):
+        path = tmp_path / "headers.sct"
+        store.write_ths(path, traces, headers={"device": "stm32"})
+        ths = pickle.loads(pickle.dumps(store.read_ths_from_store(path)))
+        assert ths.headers["device"] == "stm32"
+        assert np.array_equal(ths.samples[:], traces.samples[:])
+
+    def test_invalid(self, tmp_path):
+        path = tmp_path / "invalid.sct"
+        path.write_bytes(b"not a store")
+        with pytest.raises(ValueError):
+            store.TraceStore(path)
+        with pytest.raises(ValueError):
+            with store.TraceStoreWriter(tmp_path / "mismatch.sct") as writer:
+                writer.append(np.zeros((2, 5)), plaintext=np.zeros((3, 16)))
+
+
+class TestStoreNodes:
+    def test_create_nodes(self):
+        reader = StoreTraceNode.create_node()
+        assert "filename" in reader.inputs and "traces" in reader.outputs
+        writer = StoreWriterNode.create_node()
+        assert {"traces", "filename"} == set(writer.inputs)
+
+    def test_execute(self, store_file, traces, tmp_path):
+        ths = StoreTraceNode.create_node().execute({"filename": str(store_file)})
+        assert isinstance(ths, TraceHeaderSet)
+
+        output = str(tmp_path / "copy.sct")
+        writer = StoreWriterNode.create_node()
+        assert writer.execute({"traces": ths, "filename": output}) == output
+        copy = store.read_ths_from_store(output)
+        assert np.array_equal(copy.samples[:], traces.samples[:])
+        assert dict(copy.headers) == {"device": "stm32", "mask": [0, 1, 2, 3]}
+        with pytest.raises(TypeError):
+            StoreTraceNode.create_node().execute({"filename": "traces.npy"})
+
+    def test_streaming_copy(self, store_file, traces, tmp_path):
+        g = Graph()
+        source_file = TraceFileNode.create_node()
+        source_file.controls["file_control"].update_data("filename", str(store_file))
+        output_file = TraceFileNode.create_node()
+        output_file.controls["file_control"].update_data(
+            "filename", str(tmp_path / "copy.sct")
+        )
+        reader = StoreTraceNode.create_node()
+        writer = StoreWriterNode.create_node()
+        for n in (source_file, output_file, reader, writer):
+            g.add_node(n)
+        g.add_edge(source_file.outputs["filename"], reader.inputs["filename"])
+        g.add_edge(reader.outputs["traces"], writer.inputs["traces"])
+        g.add_edge(output_file.outputs["filename"], writer.inputs["filename"])
+
+        outputs = Engine(g, batch_size=7)()
+        copy = store.read_ths_from_store(outputs[writer.id])
+        assert np.array_equal(copy.samples[:], traces.samples[:])
+        assert np.array_equal(copy.key, traces.key)
+        assert copy.headers["device"] == "stm32"
+
+    def test_stream_cut_short(self, traces, tmp_path, mocker):
+        output = tmp_path / "copy.sct"
+        writer = StoreWriterNode.create_node()
+        writer.begin_stream()
+        writer.consume_batch({"traces": traces[:10], "filename": str(output)})
+        opened = writer._writer
+        writer.begin_stream()  # A new stream drops the store of the last one
+        assert opened._file.closed and not output.exists()
+
+        writer.consume_batch({"traces": traces[:10], "filename": str(output)})
+        opened = writer._writer
+        mocker.patch.object(opened, "append_ths", side_effect=OSError("disk full"))
+        with pytest.raises(OSError):
+            writer.consume_batch({"traces": traces[10:], "filename": str(output)})
+        writer.abort_stream()
+        assert opened._file.closed and not output.exists()
+        assert writer._writer is None
@@ -0,0 +1,104 @@
+import estraces
+import numpy as np
+import pytest
+
+from scaflow.graph_nodes.nodes import FixedVsRandomNode, TTestNode
+from scaflow.graph_nodes.nodes import blocks, ttest
+
+FIXED = np.arange(16, dtype="uint8")
+
+
+@pytest.fixture
+def traces():
+    rng = np.random.default_rng(4)
+    plaintext = rng.integers(0, 256, (400, 16), dtype="uint8")
+    fixed = rng.random(400) < 0.5
+    plaintext[fixed] = FIXED
+    samples = rng.normal(1000, 1, (400, 8))
+    samples[fixed, 2] += 1  # Leaks the mean
+    samples[fixed, 5] = 1000 + (samples[fixed, 5] - 1000) * 3  # Leaks the variance
+    return estraces.read_ths_from_ram(samples=samples, plaintext=plaintext)
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(blocks, "BLOCK_BYTES", 8 * 8 * 64)
+
+
+class TestCentralMoments:
+    def test_merge_matches_direct(self):
+        rng = np.random.default_rng(5)
+        samples = rng.exponential(1, (300, 4)) + 1e6
+        moments = ttest.CentralMoments(6)
+        cuts = [0, 1, 50, 170, 300]
+        for start, end in zip(cuts, cuts[1:]):
+            moments.update(samples[start:end])
+
+        assert moments.count == 300
+        assert np.allclose(moments.mean, samples.mean(axis=0))
+        centred = samples - samples.mean(axis=0)
+        for p in range(2, 7):
+            assert np.allclose(moments.central(p), np.mean(centred**p, axis=0))
+
+    def test_welch_t(self):
+        rng = np.random.default_rng(6)
+        a, b = rng.normal(0, 1, (50, 3)), rng.normal(0.5, 2, (80, 3))
+        groups = ttest.CentralMoments.of(a, 2), ttest.CentralMoments.of(b, 2)
+        expected = (a.mean(0) - b.mean(0)) / np.sqrt(
+            a.var(0) / len(a) + b.var(0) / len(b)
+        )
+        assert np.allclose(ttest.welch_t(groups, 1), expected)
+
+
+class TestTTestNode:
+    def test_leakage(self, traces):
+        labels = FixedVsRandomNode.create_node().execute({"traces": traces})
+        assert np.array_equal(labels, np.all(traces.plaintext == FIXED, axis=1))
+
+        n = TTestNode.create_node()
+        n.controls["order"].update_data("value", 3)
+        t = n.execute({"traces": traces, "labels": labels})
+        assert t.shape == (3, 8)
+        leaking = np.abs(t) > ttest.THRESHOLD
+        assert list(np.flatnonzero(leaking[0])) == [2]
+        assert list(np.flatnonzero(leaking[1])) == [5]
+
+        with pytest.raises(ValueError):
+            n.execute({"traces": traces, "labels": labels[1:]})
+
+    def test_streaming_matches_execute(self, traces):
+        labels_node = FixedVsRandomNode.create_node()
+        n = TTestNode.create_node()
+        expected = n.execute(
+            {"traces": traces, "labels": labels_node.execute({"traces": traces})}
+        )
+
+        labels_node.begin_stream()
+        n.begin_stream()
+        for start in range(0, len(traces), 100):
+            batch = traces[start : start + 100]
+            labels = labels_node.execute({"traces": batch})
+            n.consume_batch({"traces": batch, "labels": labels})
+        labels_node.end_stream()
+        assert np.allclose(n.end_stream(), expected)
+
+    def test_fixed_plaintext(self, traces):
+        n = FixedVsRandomNode.create_node()
+        labels = n.execute({"traces": traces})
+        n.begin_stream()
+        with pytest.raises(ValueError, match="larger batches"):
+            n.execute({"traces": traces[:8]})  # Too few traces to tell
+        assert np.array_equal(
+            n.execute({"traces": traces[:8], "fixed": FIXED}), labels[:8]
+        )
+
+        n.begin_stream()
+        n.execute({"traces": traces[:100]})
+        other = np.asarray(traces.plaintext[:100]).copy()
+        other[:50] = 255 - FIXED
+        batch = estraces.read_ths_from_ram(
+            samples=traces.samples[:100], plaintext=other
+        )
+        with pytest.raises(ValueError, match="most frequent"):
+            n.execute({"traces": batch})
+        n.end_stream()
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import estraces
+import numpy as np
+
+from scaflow.engine import Engine, ResultCache
+from scaflow.engine.cache import node_key
+from scaflow.graph_nodes.nodes import FileNode
+from scaflow.model import Control, ControlType, Graph
+from .test_engine import (
+    ArrayNode,
+    BatchSourceNode,
+    DoubleNode,
+    SumNode,
+    SumSinkNode,
+    chain,
+)
+
+
+class TestResultCache:
+    def test_array_round_trip(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        cache.put("abcd", np.arange(10))
+        hit, value = cache.get("abcd")
+        assert hit
+        assert isinstance(value, np.memmap)
+        assert np.array_equal(value, np.arange(10))
+
+    def test_trace_header_set_round_trip(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        samples = np.random.random((4, 6))
+        plaintext = np.random.randint(0, 256, (4, 16), dtype="uint8")
+        ths = estraces.read_ths_from_ram(
+            samples, plaintext=plaintext, headers={"key": np.arange(16)}
+        )
+        cache.put("abcd", ths)
+        hit, value = cache.get("abcd")
+        assert hit
+        assert np.array_equal(value.samples[:], samples)
+        assert np.array_equal(value.plaintext, plaintext)
+        assert np.array_equal(value.headers["key"], np.arange(16))
+
+    def test_pickled_values(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        cache.put("abcd", {"a": 1})
+        assert cache.get("abcd") == (True, {"a": 1})
+
+    def test_miss(self, tmp_path):
+        assert ResultCache(tmp_path).get("abcd") == (False, None)
+
+    def test_lru_eviction(self, tmp_path):
+        cache = ResultCache(tmp_path, max_size=5000)
+        cache.put("aa01", np.zeros(250))
+        cache.put("aa02", np.zeros(250))
+        time.sleep(0.01)
+        cache.get("aa01")
+        cache.put("aa03", np.zeros(250))
+        assert "aa01" in cache
+        assert "aa02" not in cache
+        assert "aa03" in cache
+
+    def test_scans_only_over_limit(self, tmp_path, mocker):
+        cache = ResultCache(tmp_path, max_size=5000)
+        scan = mocker.spy(cache, "_evict")
+        for i in range(3):
+            cache.put(f"aa0{i}", np.zeros(100))
+        assert scan.call_count == 1
+        cache.put("aa03", np.zeros(500))
+        assert scan.call_count == 2
+        assert "aa00" not in cache
+        assert "aa03" in cache
+
+    def test_concurrent_puts(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: cache.put("abcd", np.arange(1000)), range(32)))
+        hit, value = cache.get("abcd")
+        assert hit
+        assert np.array_equal(value, np.arange(1000))
+        assert os.listdir(tmp_path / "ab") == ["abcd"]
+
+    def test_broken_entry_replaced(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        cache.put("abcd", np.arange(10))
+        os.remove(tmp_path / "ab" / "abcd" / "array.npy")
+        assert cache.get("abcd") == (False, None)
+        cache.put("abcd", np.arange(10))
+        assert np.array_equal(cache.get("abcd")[1], np.arange(10))
+
+    def test_key_depends_on_file_stat(self, tmp_path):
+        path = tmp_path / "traces.npy"
+        path.write_bytes(b"1")
+        n = FileNode.create_node()
+        n.controls["file_control"].update_data("filename", str(path))
+        key = node_key(n, [])
+        assert node_key(n, []) == key
+        os.utime(path, ns=(0, 0))
+        assert node_key(n, []) != key
+        assert node_key(n, [("input", "other")]) != node_key(n, [])
+
+    def test_engine_uses_cache(self, tmp_path, mocker):
+        DoubleNode.cacheable = True
+        try:
+            g = Graph()
+            source = ArrayNode.create_node()
+            double = DoubleNode.create_node()
+            chain(g, source, double)
+            Engine(g, cache=ResultCache(tmp_path))()
+            assert double.calls == 1
+
+            outputs = Engine(g, cache=ResultCache(tmp_path))()
+            assert double.calls == 1
+            assert np.array_equal(outputs[double.id], np.arange(1000) * 2)
+        finally:
+            DoubleNode.cacheable = False
+
+    def test_streaming_cache_keys(self, tmp_path, mocker, monkeypatch):
+        monkeypatch.setattr(SumNode, "cacheable", True)
+        g = Graph()
+        source = BatchSourceNode.create_node()
+        source.add_control(Control("scale", ControlType.FilePath, "Scale"))
+        total = SumNode.create_node()
+        chain(g, source, SumSinkNode.create_node(), total)
+        assert Engine(g, cache=ResultCache(tmp_path), batch_size=3)()[total.id] == 46
+
+        source.controls["scale"].update_data("value", 2)
+        mocker.patch.object(source, "execute", return_value=np.arange(10) * 2)
+        outputs = Engine(g, cache=ResultCache(tmp_path), batch_size=3)()
+        assert outputs[total.id] == 91
@@ -0,0 +1,116 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from scaflow import cli
+from scaflow.graph_nodes.nodes import (
+    CiphertextFileNode,
+    NpyTraceNode,
+    PlaintextFileNode,
+    TraceFileNode,
+)
+from scaflow.model import Graph, dispatcher
+
+
+@pytest.fixture
+def graph_file(tmp_path):
+    samples = np.random.random((6, 10))
+    for name, array in [
+        ("traces", samples),
+        ("plaintext", np.zeros((6, 16), dtype="uint8")),
+        ("ciphertext", np.ones((6, 16), dtype="uint8")),
+    ]:
+        np.save(tmp_path / f"{name}.npy", array)
+
+    g = Graph()
+    trace_file = TraceFileNode.create_node()
+    plaintext_file = PlaintextFileNode.create_node()
+    ciphertext_file = CiphertextFileNode.create_node()
+    trace_node = NpyTraceNode.create_node()
+    for n in (trace_file, plaintext_file, ciphertext_file, trace_node):
+        g.add_node(n)
+    g.add_edge(trace_file.outputs["filename"], trace_node.inputs["filename"])
+    g.add_edge(plaintext_file.outputs["plaintext"], trace_node.inputs["plaintext"])
+    g.add_edge(ciphertext_file.outputs["ciphertext"], trace_node.inputs["ciphertext"])
+    plaintext_file.controls["file_control"].update_data(
+        "filename", str(tmp_path / "plaintext.npy")
+    )
+    ciphertext_file.controls["file_control"].update_data(
+        "filename", str(tmp_path / "ciphertext.npy")
+    )
+
+    path = tmp_path / "graph.json"
+    path.write_text(json.dumps(g, default=dispatcher.encoder_default))
+    return path, trace_file.id, trace_node.id, samples
+
+
+class TestCli:
+    def test_run_with_override(self, graph_file, tmp_path):
+        path, trace_file_id, trace_node_id, samples = graph_file
+        output_dir = tmp_path / "out"
+        assert (
+            cli.main(
+                [
+                    "run",
+                    str(path),
+                    "--set",
+                    f"{trace_file_id}.file_control.filename={tmp_path / 'traces.npy'}",
+                    "--output-dir",
+                    str(output_dir),
+                ]
+            )
+            == 0
+        )
+        written = np.load(output_dir / f"node_{trace_node_id}.npz")
+        assert np.array_equal(written["samples"], samples)
+        assert not (output_dir / f"node_{trace_file_id}.json").exists()
+
+    def test_target_output(self, graph_file, tmp_path):
+        path, trace_file_id, _, _ = graph_file
+        output_dir = tmp_path / "out"
+        override = f"{trace_file_id}.file_control.filename={tmp_path / 'traces.npy'}"
+        cli.main(["run", str(path), "-s", override, "-t", "Trace File:filename"])
+        cli.main(
+            [
+                "run",
+                str(path),
+                "-s",
+                override,
+                "-t",
+                "Trace File",
+                "-o",
+                str(output_dir),
+            ]
+        )
+        assert [p.name for p in output_dir.iterdir()] == [f"node_{trace_file_id}.json"]
+        with pytest.raises(KeyError):
+            cli.parse_target(cli.load_graph(path), "Trace File:missing")
+
+    def test_profile(self, graph_file, tmp_path):
+        path, trace_file_id, trace_node_id, _ = graph_file
+        profile = tmp_path / "profile.json"
+        override = f"{trace_file_id}.file_control.filename={tmp_path / 'traces.npy'}"
+        cli.main(["run", str(path), "--set", override, "--profile", str(profile)])
+        events = json.loads(profile.read_text())["traceEvents"]
+        assert trace_node_id in {e["args"]["node_id"] for e in events}
+
+    def test_override_by_name(self, graph_file):
+        path = graph_file[0]
+        g = cli.load_graph(path)
+        cli.apply_override(g, "Trace File.file_control.filename=other.npy")
+        node = cli.find_node(g, "Trace File")
+        assert node.controls["file_control"]._data["filename"] == "other.npy"
+
+    def test_invalid_override(self, graph_file):
+        g = cli.load_graph(graph_file[0])
+        with pytest.raises(ValueError):
+            cli.apply_override(g, "filename=other.npy")
+        with pytest.raises(KeyError):
+            cli.apply_override(g, "Missing.file_control.filename=other.npy")
+
+    def test_no_gui_imports(self):
+        code = "import sys, scaflow.cli; assert 'PySide6' not in sys.modules"
+        subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,665 @@
+import json
+import sys
+import threading
+from typing import Dict
+
+import numpy as np
+import pytest
+
+from scaflow.engine import Engine, ExecutionCancelled, Profiler
+from scaflow.engine import profiler as profiler_module
+from scaflow.model import (
+    Control,
+    ControlType,
+    Graph,
+    Input,
+    Node,
+    Output,
+    dispatcher,
+)
+
+
+@dispatcher
+class ValueNode(Node):
+    def __init__(self, name="Value", value=0):
+        super().__init__(name)
+        self.value = value
+        self.calls = 0
+
+    @classmethod
+    def create_node(cls, value=0):
+        n = cls(value=value)
+        n.add_output(Output("value", "Value", return_type="int"))
+        return n
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        self.calls += 1
+        return self.value
+
+
+@dispatcher
+class SumNode(Node):
+    def __init__(self, name="Sum"):
+        super().__init__(name)
+        self.calls = 0
+        self.threads = set()
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("value", "Value", accepted_types=["int"], multi_conns=True))
+        n.add_output(Output("sum", "Sum", return_type="int"))
+        return n
+
+    def execute(self, kwargs) -> Dict[str, any]:
+        self.calls += 1
+        self.threads.add(threading.get_ident())
+        return sum(v for v in kwargs.values()) + 1
+
+
+@dispatcher
+class ArrayNode(Node):
+    @classmethod
+    def create_node(cls):
+        n = cls("Array")
+        n.add_output(Output("array", "Array", return_type="ndarray"))
+        return n
+
+    def execute(self, kwargs) -> np.ndarray:
+        return np.arange(1000)
+
+
+@dispatcher
+class DoubleNode(Node):
+    process_safe = True
+
+    def __init__(self, name="Double"):
+        super().__init__(name)
+        self.calls = 0
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("array", "Array", accepted_types=["ndarray"]))
+        n.add_output(Output("array", "Array", return_type="ndarray"))
+        return n
+
+    def execute(self, kwargs) -> np.ndarray:
+        self.calls += 1
+        return kwargs["array"] * 2
+
+
+@dispatcher
+class BatchSourceNode(Node):
+    stream_source = True
+
+    @classmethod
+    def create_node(cls):
+        n = cls("Batches")
+        n.add_output(Output("array", "Array", return_type="ndarray"))
+        return n
+
+    def execute(self, kwargs) -> np.ndarray:
+        return np.arange(10)
+
+    def iter_batches(self, kwargs, batch_size):
+        data = self.execute(kwargs)
+        for start in range(0, len(data), batch_size):
+            yield data[start : start + batch_size]
+
+
+@dispatcher
+class StreamDoubleNode(DoubleNode):
+    stream_transform = True
+
+
+@dispatcher
+class SplitNode(Node):
+    stream_transform = True
+
+    def __init__(self, name="Split"):
+        super().__init__(name)
+        self.streams = []
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("array", "Array", accepted_types=["ndarray"]))
+        n.add_output(Output("array", "Odd", return_type="ndarray"))
+        n.add_output(Output("even", "Even", return_type="ndarray"))
+        return n
+
+    def execute(self, kwargs):
+        array = kwargs["array"]
+        return {"array": array[array % 2 == 1], "even": array[array % 2 == 0]}
+
+    def begin_stream(self):
+        self.streams.append("begin")
+
+    def end_stream(self):
+        self.streams.append("end")
+
+
+@dispatcher
+class SumSinkNode(Node):
+    stream_sink = True
+
+    def __init__(self, name="Sum sink"):
+        super().__init__(name)
+        self.batches = []
+
+    @classmethod
+    def create_node(cls):
+        n = cls()
+        n.add_input(Input("array", "Array", accepted_types=["ndarray"]))
+        n.add_input(Input("value", "Offset", accepted_types=["int"]))
+        n.add_output(Output("sum", "Sum", return_type="int"))
+        return n
+
+    def execute(self, kwargs):
+        return int(np.sum(kwargs["array"])) + kwargs.get("value", 0)
+
+    def begin_stream(self):
+        self.batches = []
+        self._total = 0
+
+    def consume_batch(self, kwargs):
+        self.batches.append(len(kwargs["array"]))
+        self._total += self.execute(kwargs)
+
+    def end_stream(self):
+        return self._total
+
+
+@dispatcher
+class PairSinkNode(SumSinkNode):
+    @classmethod
+    def create_node(cls):
+        n = cls("Pair sink")
+        n.add_input(Input("array", "Array", accepted_types=["ndarray"]))
+        n.add_input(Input("other", "Other array", accepted_types=["ndarray"]))
+        n.add_output(Output("sum", "Sum", return_type="int"))
+        return n
+
+    def execute(self, kwargs):
+        return int(sum(np.sum(array) for array in kwargs.values()))
+
+
+def chain(graph, *nodes):
+    for n in nodes:
+        graph.add_node(n)
+    for upstream, downstream in zip(nodes, nodes[1:]):
+        graph.add_edge(
+            next(iter(upstream.outputs.values())),
+            next(iter(downstream.inputs.values())),
+        )
+
+
+class TestEngine:
+    def test_serial_outputs(self):
+        g = Graph()
+        source = ValueNode.create_node(value=2)
+        first = SumNode.create_node()
+        second = SumNode.create_node()
+        chain(g, source, first, second)
+
+        outputs = Engine(g)()
+        assert outputs == {source.id: 2, first.id: 3, second.id: 4}
+        assert first.calls == 1 and second.calls == 1
+
+    def test_topological_order(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        first = SumNode.create_node()
+        second = SumNode.create_node()
+        # Added out of order so dictionary order differs from execution order
+        g.add_node(second)
+        chain(g, source, first)
+        g.add_edge(first.outputs["sum"], second.inputs["value"])
+
+        order = Engine(g)._topological_order()
+        assert order.index(source.id) < order.index(first.id) < order.index(second.id)
+
+    def test_plan_reused_until_structure_changes(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        total = SumNode.create_node()
+        chain(g, source, total)
+        engine = Engine(g)
+        engine()
+        plan = engine._plan
+
+        engine.invalidate(source.id)
+        engine()
+        assert engine._plan is plan
+
+        extra = SumNode.create_node()
+        g.add_node(extra)
+        g.add_edge(extra.outputs["sum"], total.inputs["value"])
+        assert engine()[total.id] == 3
+        assert engine._plan is not plan
+
+    def test_long_chain(self):
+        g = Graph()
+        nodes = [ValueNode.create_node(value=0)]
+        nodes += [SumNode.create_node() for _ in range(sys.getrecursionlimit() * 2)]
+        chain(g, *nodes)
+        assert Engine(g)()[nodes[-1].id] == len(nodes) - 1
+
+    def test_cycle(self):
+        g = Graph()
+        first = SumNode.create_node()
+        second = SumNode.create_node()
+        chain(g, first, second)
+        g.add_edge(second.outputs["sum"], first.inputs["value"])
+        with pytest.raises(ValueError):
+            Engine(g)()
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_targets(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        wanted = SumNode.create_node()
+        other = SumNode.create_node()
+        chain(g, source, wanted)
+        g.add_node(other)
+        g.add_edge(source.outputs["value"], other.inputs["value"])
+        dead = ValueNode.create_node()
+        g.add_node(dead)
+        engine = Engine(g, parallel=parallel)
+
+        assert engine([wanted.id]) == {wanted.id: 2}
+        assert engine([(source.id, "value")]) == {(source.id, "value"): 1}
+        assert source.calls == 1 and wanted.calls == 1
+        assert other.calls == 0 and dead.calls == 0
+        with pytest.raises(KeyError):
+            engine([(source.id, "missing")])
+
+    def test_streaming_targets(self):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        chain(g, BatchSourceNode.create_node(), sink)
+        unused = DoubleNode.create_node()  # Fails without an input if executed
+        g.add_node(unused)
+        assert Engine(g, batch_size=3)([sink.id]) == {sink.id: 45}
+
+    def test_parallel_matches_serial(self):
+        def build():
+            g = Graph()
+            for value in (1, 10):
+                chain(g, ValueNode.create_node(value=value), SumNode.create_node())
+            return g
+
+        serial_graph = build()
+        parallel_graph = build()
+        serial = Engine(serial_graph)()
+        parallel = Engine(parallel_graph, parallel=True, max_workers=4)()
+        assert list(serial.values()) == list(parallel.values())
+
+    def test_parallel_runs_each_node_once(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        g.add_node(source)
+        sinks = [SumNode.create_node() for _ in range(4)]
+        for sink in sinks:
+            g.add_node(sink)
+            g.add_edge(source.outputs["value"], sink.inputs["value"])
+
+        Engine(g, parallel=True, max_workers=2)()
+        assert source.calls == 1
+        assert all(sink.calls == 1 for sink in sinks)
+
+    def test_parallel_propagates_exceptions(self, mocker):
+        g = Graph()
+        source = ValueNode.create_node()
+        g.add_node(source)
+        mocker.patch.object(source, "execute", side_effect=RuntimeError("failed"))
+        with pytest.raises(RuntimeError):
+            Engine(g, parallel=True)()
+
+    def test_process_workers(self):
+        g = Graph()
+        source = ArrayNode.create_node()
+        double = DoubleNode.create_node()
+        chain(g, source, double)
+
+        outputs = Engine(g, process_workers=2, min_shared_bytes=0)()
+        assert np.array_equal(outputs[double.id], np.arange(1000) * 2)
+        assert double.calls == 0  # Executed on a copy in the worker
+
+    def test_outputs_reused_between_calls(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        total = SumNode.create_node()
+        chain(g, source, total)
+        engine = Engine(g)
+        engine()
+        assert engine() == {source.id: 1, total.id: 2}
+        assert source.calls == 1 and total.calls == 1
+
+    def test_control_change_reruns_downstream(self):
+        g = Graph()
+        changed = ValueNode.create_node(value=1)
+        changed.add_control(Control("value", ControlType.FilePath, "Value"))
+        changed_sum = SumNode.create_node()
+        other = ValueNode.create_node(value=5)
+        other_sum = SumNode.create_node()
+        chain(g, changed, changed_sum)
+        chain(g, other, other_sum)
+        engine = Engine(g)
+        engine()
+
+        changed.value = 10
+        changed.controls["value"].update_data("value", 10)
+        outputs = engine()
+        assert outputs[changed_sum.id] == 11
+        assert changed.calls == 2 and changed_sum.calls == 2
+        assert other.calls == 1 and other_sum.calls == 1
+
+    def test_close(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        source.add_control(Control("value", ControlType.FilePath, "Value"))
+        removed = ValueNode.create_node(value=2)
+        g.add_node(source)
+        g.add_node(removed)
+        engine = Engine(g)
+        g.remove_node(removed)
+        assert not removed.controlChangedEvent.callbacks
+
+        engine.close()
+        assert not source.controlChangedEvent.callbacks
+        assert not g.nodeAddedEvent.callbacks and not g.edgeAddedEvent.callbacks
+
+    def test_new_edge_reruns_input_node(self):
+        g = Graph()
+        first = ValueNode.create_node(value=1)
+        second = ValueNode.create_node(value=2)
+        total = SumNode.create_node()
+        chain(g, first, total)
+        g.add_node(second)
+        engine = Engine(g)
+        engine()
+
+        g.add_edge(second.outputs["value"], total.inputs["value"])
+        assert engine()[total.id] == 3
+        assert first.calls == 1 and total.calls == 2
+
+    def test_streaming_matches_whole(self):
+        def build():
+            g = Graph()
+            sink = SumSinkNode.create_node()
+            chain(
+                g, BatchSourceNode.create_node(), StreamDoubleNode.create_node(), sink
+            )
+            after = SumNode.create_node()
+            g.add_node(after)
+            g.add_edge(sink.outputs["sum"], after.inputs["value"])
+            return g, sink, after
+
+        g, sink, after = build()
+        assert Engine(g)()[sink.id] == 90
+        g, sink, after = build()
+        outputs = Engine(g, batch_size=3)()
+        assert sink.batches == [3, 3, 3, 1]
+        assert outputs[sink.id] == 90
+        assert outputs[after.id] == 91
+
+    def test_streaming_sources_differ(self, mocker):
+        g = Graph()
+        sink = PairSinkNode.create_node()
+        short = BatchSourceNode.create_node()
+        split = SplitNode.create_node()
+        chain(g, BatchSourceNode.create_node(), sink)
+        chain(g, short, split)
+        g.add_edge(split.outputs["even"], sink.inputs["other"])
+        mocker.patch.object(short, "execute", return_value=np.arange(7))
+        with pytest.raises(ValueError, match="number of batches"):
+            Engine(g, batch_size=3)()
+
+    def test_streaming_skips_unconsumed_sources(self, mocker):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        chain(g, BatchSourceNode.create_node(), sink)
+        unconsumed = BatchSourceNode.create_node()
+        g.add_node(unconsumed)
+        batches = mocker.spy(unconsumed, "iter_batches")
+        outputs = Engine(g, batch_size=3)()
+        assert outputs[sink.id] == 45
+        assert np.array_equal(outputs[unconsumed.id], np.arange(10))
+        batches.assert_not_called()
+
+    def test_streaming_error_aborts_sinks(self, mocker):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        chain(g, BatchSourceNode.create_node(), sink)
+        mocker.patch.object(sink, "consume_batch", side_effect=RuntimeError("failed"))
+        abort = mocker.spy(sink, "abort_stream")
+        end = mocker.spy(sink, "end_stream")
+        with pytest.raises(RuntimeError):
+            Engine(g, batch_size=3)()
+        abort.assert_called_once()
+        end.assert_not_called()
+
+    def test_multiple_outputs(self):
+        g = Graph()
+        split = SplitNode.create_node()
+        double = DoubleNode.create_node()
+        chain(g, ArrayNode.create_node(), split)
+        g.add_node(double)
+        g.add_edge(split.outputs["array"], double.inputs["array"])
+
+        engine = Engine(g)
+        assert np.array_equal(engine()[double.id], np.arange(1, 1000, 2) * 2)
+        assert np.array_equal(
+            engine([(split.id, "even")])[(split.id, "even")], np.arange(0, 1000, 2)
+        )
+
+    def test_streaming_multiple_outputs(self):
+        g = Graph()
+        split = SplitNode.create_node()
+        sink = SumSinkNode.create_node()
+        chain(g, BatchSourceNode.create_node(), split)
+        g.add_node(sink)
+        g.add_edge(split.outputs["array"], sink.inputs["array"])
+
+        assert Engine(g, batch_size=3)()[sink.id] == 25
+        assert split.streams == ["begin", "end"]
+
+    def test_streaming_constant_inputs(self):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        offset = ValueNode.create_node(value=1)
+        chain(g, BatchSourceNode.create_node(), sink)
+        g.add_node(offset)
+        g.add_edge(offset.outputs["value"], sink.inputs["value"])
+        assert Engine(g, batch_size=5)()[sink.id] == 45 + 2
+
+    def test_streaming_rejects_unbatched_nodes(self):
+        g = Graph()
+        chain(g, BatchSourceNode.create_node(), DoubleNode.create_node())
+        with pytest.raises(TypeError):
+            Engine(g, batch_size=5)()
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_release_outputs(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        first = SumNode.create_node()
+        second = SumNode.create_node()
+        chain(g, source, first, second)
+        engine = Engine(g, parallel=parallel, release_outputs=True)
+        engine.pin(first.id)
+
+        assert engine() == {source.id: None, first.id: 2, second.id: 3}
+        assert engine()[second.id] == 3
+        assert source.calls == 1
+
+        # A released output is recomputed only when a consumer needs it
+        engine.invalidate(first.id)
+        engine.unpin(first.id)
+        assert engine() == {source.id: None, first.id: None, second.id: 3}
+        assert source.calls == 2 and first.calls == 2 and second.calls == 2
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_release_keeps_targets(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        first = SumNode.create_node()
+        second = SumNode.create_node()
+        chain(g, source, first, second)
+        engine = Engine(g, parallel=parallel, release_outputs=True)
+
+        assert engine([first.id, second.id]) == {first.id: 2, second.id: 3}
+        engine.invalidate(second.id)
+        assert engine([second.id]) == {second.id: 3}
+
+        # A released target is computed again
+        assert engine([first.id]) == {first.id: 2}
+        assert first.calls == 2 and second.calls == 2
+
+    def test_release_waits_for_all_consumers(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        g.add_node(source)
+        sinks = [SumNode.create_node() for _ in range(3)]
+        for sink in sinks:
+            g.add_node(sink)
+            g.add_edge(source.outputs["value"], sink.inputs["value"])
+
+        outputs = Engine(g, release_outputs=True)()
+        assert [outputs[sink.id] for sink in sinks] == [2, 2, 2]
+        assert outputs[source.id] is None
+
+    def test_streaming_release_outputs(self):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        offset = ValueNode.create_node(value=1)
+        chain(g, BatchSourceNode.create_node(), sink)
+        g.add_node(offset)
+        g.add_edge(offset.outputs["value"], sink.inputs["value"])
+        engine = Engine(g, batch_size=5, release_outputs=True)
+
+        assert engine()[sink.id] == 47
+        assert engine()[offset.id] is None
+        assert offset.calls == 1
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_cancel_between_nodes(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        total = SumNode.create_node()
+        chain(g, source, total)
+        engine = Engine(g, parallel=parallel)
+        started, finished = [], []
+        engine.nodeStartedEvent.add(started.append)
+        engine.nodeFinishedEvent.add(finished.append)
+        engine.nodeFinishedEvent.add(lambda node_id: engine.cancel())
+
+        with pytest.raises(ExecutionCancelled):
+            engine()
+        assert started == finished == [source.id]
+        assert total.calls == 0
+
+        # The next call resumes from the nodes that did not finish
+        engine.nodeFinishedEvent.callbacks.pop()
+        assert engine()[total.id] == 2
+        assert source.calls == 1 and total.calls == 1
+
+    def test_cancel_stops_running_node(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        chain(g, source, SumNode.create_node())
+        engine = Engine(g)
+        stopped = []
+        source.stop = lambda: stopped.append(source.id)
+        source.execute = lambda kwargs: engine.cancel() or 1
+
+        with pytest.raises(ExecutionCancelled):
+            engine()
+        assert stopped == [source.id]
+
+    def test_cancel_last_node(self):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        total = SumNode.create_node()
+        chain(g, source, total)
+        engine = Engine(g)
+        execute = total.execute
+        total.execute = lambda kwargs: engine.cancel() or -1  # A partial result
+
+        with pytest.raises(ExecutionCancelled):
+            engine()
+        total.execute = execute
+        assert engine()[total.id] == 2
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_edit_while_executing(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        total = SumNode.create_node()
+        chain(g, source, total)
+        engine = Engine(g, parallel=parallel)
+        execute = source.execute
+
+        def edit(kwargs):
+            # As the GUI thread would, while the node runs
+            engine.invalidate(source.id)
+            return execute(kwargs)
+
+        source.execute = edit
+        engine()
+        assert engine()[total.id] == 2
+        assert source.calls == 2 and total.calls == 2
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_add_node_while_executing(self, parallel):
+        g = Graph()
+        source = ValueNode.create_node(value=1)
+        g.add_node(source)
+        engine = Engine(g, parallel=parallel)
+        added = ValueNode.create_node(value=2)
+        source.execute = lambda kwargs: g.add_node(added) or 1
+
+        assert engine() == {source.id: 1}
+        assert engine() == {source.id: 1, added.id: 2}
+
+    def test_cancel_between_batches(self):
+        g = Graph()
+        sink = SumSinkNode.create_node()
+        chain(g, BatchSourceNode.create_node(), sink)
+        engine = Engine(g, batch_size=3)
+        engine.batchEvent.add(lambda batch_number: engine.cancel())
+
+        with pytest.raises(ExecutionCancelled):
+            engine()
+        assert sink.batches == [3]
+
+    def test_profiler(self, tmp_path):
+        g = Graph()
+        source = ArrayNode.create_node()
+        double = DoubleNode.create_node()
+        chain(g, source, double)
+        profiler = Profiler(trace_memory=True)
+        Engine(g, profiler=profiler)()
+
+        assert [r.node_id for r in profiler.records] == [source.id, double.id]
+        record = profiler.records[1]
+        assert record.output_bytes == np.arange(1000).nbytes
+        assert record.wall_time >= 0 and record.cpu_time >= 0
+        assert record.peak_memory is not None
+
+        path = tmp_path / "trace.json"
+        profiler.export_chrome_trace(path)
+        events = json.loads(path.read_text())["traceEvents"]
+        assert [e["args"]["node_id"] for e in events] == [source.id, double.id]
+        assert all(e["ph"] == "X" for e in events)
+        assert profiler.summary().row_count == 2
+
+    def test_profiler_without_peak_reset(self, monkeypatch):
+        monkeypatch.setattr(profiler_module, "CAN_TRACE_PEAK", False)
+        g = Graph()
+        chain(g, ArrayNode.create_node(), DoubleNode.create_node())
+        profiler = Profiler(trace_memory=True)
+        Engine(g, profiler=profiler)()
+        assert all(r.peak_memory is None for r in profiler.records)
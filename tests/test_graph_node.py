@@ -6,7 +6,7 @@ import pytest
 from scaflow import model
 from scaflow.model import Input
 from scaflow.model.node import Spacing
-from scaflow.graph_nodes.controls import FileControl
+from scaflow.graph_nodes.controls import BooleanControl, FileControl, NumberControl
 from scaflow.model.dispatcher import dispatcher
 
 
@@ -139,6 +139,19 @@ class TestGraphNode:
         n.remove_control(ctrl)
         assert len(n.controls) == 0
 
+    def test_value_controls(self):
+        n = ExampleNode("Test")
+        n.add_control(BooleanControl("flag", "Flag", value=True))
+        n.add_control(NumberControl("count", "Count", value=3))
+        copy = json.loads(
+            json.dumps(n, default=dispatcher.encoder_default),
+            object_hook=dispatcher.decoder_hook,
+        )
+        assert isinstance(copy.controls["flag"], BooleanControl)
+        assert copy.control_value("flag") is True
+        assert copy.control_value("count") == 3
+        assert copy.control_value("missing", 5) == 5
+
     def test_serialization(self):
         model.Node._last_node_id = 0
         n = ExampleNode("Test")
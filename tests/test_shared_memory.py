@@ -0,0 +1,38 @@
+import estraces
+import numpy as np
+
+from scaflow.engine import shared_memory
+from scaflow.engine.shared_memory import SharedArray, SharedTraceHeaderSet
+
+
+class TestSharedMemory:
+    def test_array_round_trip(self):
+        array = np.random.random((10, 20))
+        shared = shared_memory.share(array, min_bytes=0)
+        assert isinstance(shared, SharedArray)
+        assert np.array_equal(shared_memory.restore(shared), array)
+
+    def test_small_arrays_not_shared(self):
+        array = np.arange(4)
+        assert shared_memory.share(array, min_bytes=1024) is array
+
+    def test_containers(self):
+        value = {"a": [np.arange(10), 1], "b": (np.ones(3), "text")}
+        shared = shared_memory.share(value, min_bytes=0)
+        assert isinstance(shared["a"][0], SharedArray)
+        restored = shared_memory.restore(shared)
+        assert np.array_equal(restored["a"][0], np.arange(10))
+        assert restored["a"][1] == 1
+        assert isinstance(restored["b"], tuple)
+        assert restored["b"][1] == "text"
+
+    def test_trace_header_set_round_trip(self):
+        samples = np.random.random((5, 8)).astype("float32")
+        plaintext = np.random.randint(0, 256, (5, 16), dtype="uint8")
+        ths = estraces.read_ths_from_ram(samples=samples, plaintext=plaintext)
+
+        shared = shared_memory.share(ths, min_bytes=0)
+        assert isinstance(shared, SharedTraceHeaderSet)
+        restored = shared_memory.restore(shared)
+        assert np.array_equal(restored.samples[:], samples)
+        assert np.array_equal(restored.plaintext, plaintext)